@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:31:12 2026
+
+Time the hot paths of PyLoopKit over the example issue reports and over
+synthetic inputs of increasing size, and write the results to JSON
+
+Usage (from the root of the repository):
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --compare baseline.json
+"""
+# pylint: disable=R0913, R0914
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime, time, timedelta, timezone
+
+import numpy
+
+from benchmarks.synthetic_data import (EXAMPLE_PATH, EXAMPLE_REPORTS,
+                                       load_template, synthetic_input)
+from pyloopkit.carb_math import dynamic_glucose_effects, map_
+from pyloopkit.compiled_schedule import CompiledSchedule
+from pyloopkit.dose_effect_cache import DoseEffectCache
+from pyloopkit.dose_math import (glucose_correction, recommend_grid,
+                                 recommended_bolus, recommended_temp_basal)
+from pyloopkit.dose_store import (get_glucose_effects, prepare_doses,
+                                  prepare_dose_timeline)
+from pyloopkit.dose_timeline import DoseTimeline
+from pyloopkit.glucose_math import counteraction_effects
+from pyloopkit.glucose_store import get_counteraction_effects
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
+from pyloopkit.insulin_math import glucose_effects, insulin_on_board
+from pyloopkit.loop_data_manager import update
+from pyloopkit.loop_math import predict_glucose
+from pyloopkit.pyloop_parser import parse_report_and_run_with_name
+from pyloopkit import vectorized_insulin_math
+
+# the size of the synthetic inputs when another parameter is being swept
+DEFAULTS = {"hours": 24, "dose_count": 50, "carb_count": 5, "delta": 5}
+
+SWEEPS = {
+    "hours": [6, 24, 48],
+    "dose_count": [10, 50, 200],
+    "carb_count": [1, 5, 20],
+    "delta": [1, 5, 10],
+}
+QUICK_SWEEPS = {
+    "hours": [6, 24],
+    "dose_count": [10, 50],
+    "carb_count": [1, 5],
+    "delta": [5],
+}
+
+# where the results are written if no output path is given (ignored by git,
+# since the timings are specific to the machine)
+DEFAULT_OUTPUT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json"
+)
+
+# ways of calculating the insulin effects: (engine, use curve tables)
+INSULIN_ENGINES = [("python", False), ("python", True), ("numpy", False)]
+
+
+def sweep(sweeps, *names):
+    """ Vary each of the named parameters in turn, keeping the others at
+        their defaults
+
+    Output:
+    List of parameter dictionaries
+    """
+    cases = []
+    for name in names:
+        for value in sweeps[name]:
+            parameters = dict(DEFAULTS)
+            parameters[name] = value
+            if parameters not in cases:
+                cases.append(parameters)
+
+    return cases
+
+
+def prepared_input(template, parameters):
+    """ Generate a synthetic input and the data the lower-level functions
+        need: prepared doses, insulin effects, and counteraction effects
+
+    Output:
+    Dictionary of the synthetic input and the derived data
+    """
+    input_dict = synthetic_input(
+        template,
+        hours=parameters["hours"],
+        dose_count=parameters["dose_count"],
+        carb_count=parameters["carb_count"],
+        delta=parameters["delta"]
+    )
+    settings = input_dict["settings_dictionary"]
+    start = input_dict["glucose_dates"][0]
+
+    doses = prepare_doses(
+        input_dict["dose_types"], input_dict["dose_start_times"],
+        input_dict["dose_end_times"], input_dict["dose_values"],
+        input_dict["dose_delivered_units"],
+        start,
+        input_dict["basal_rate_start_times"],
+        input_dict["basal_rate_values"],
+        input_dict["basal_rate_minutes"],
+        settings["model"]
+    )
+    sensitivities = (
+        input_dict["sensitivity_ratio_start_times"],
+        input_dict["sensitivity_ratio_end_times"],
+        input_dict["sensitivity_ratio_values"]
+    )
+    insulin_effects = get_glucose_effects(
+        input_dict["dose_types"], input_dict["dose_start_times"],
+        input_dict["dose_end_times"], input_dict["dose_values"],
+        input_dict["dose_delivered_units"],
+        start,
+        input_dict["basal_rate_start_times"],
+        input_dict["basal_rate_values"],
+        input_dict["basal_rate_minutes"],
+        *sensitivities,
+        settings["model"]
+    )
+    counteractions = get_counteraction_effects(
+        input_dict["glucose_dates"], input_dict["glucose_values"],
+        start,
+        *insulin_effects
+    )
+
+    return {
+        "input": input_dict,
+        "settings": settings,
+        "doses": doses,
+        "sensitivities": sensitivities,
+        "carb_ratios": (
+            input_dict["carb_ratio_start_times"],
+            input_dict["carb_ratio_values"]
+        ),
+        "insulin_effects": insulin_effects,
+        "counteractions": counteractions,
+    }
+
+
+def update_case(data, engine, use_curve_tables):
+    input_dict = dict(data["input"])
+    input_dict["settings_dictionary"] = dict(data["settings"])
+    input_dict["settings_dictionary"]["insulin_effect_engine"] = engine
+    input_dict["settings_dictionary"]["use_insulin_curve_tables"] = (
+        use_curve_tables
+    )
+
+    return lambda: update(input_dict)
+
+
+def glucose_effects_case(data, engine, use_curve_tables, delta):
+    model = data["settings"]["model"]
+    function = (
+        vectorized_insulin_math.glucose_effects if engine == "numpy"
+        else glucose_effects
+    )
+    curve_table = (
+        get_insulin_curve_table(model, 10, delta) if use_curve_tables
+        else None
+    )
+
+    return lambda: function(
+        *data["doses"],
+        model,
+        *data["sensitivities"],
+        delta=delta,
+        curve_table=curve_table
+    )
+
+
+def cached_glucose_effects_case(data, warm_cache):
+    """ The effects of doses that are all in the effect cache (like the
+        next cycle's doses), or that all have to be added to it
+    """
+    model = data["settings"]["model"]
+    warm = DoseEffectCache()
+    if warm_cache:
+        glucose_effects(
+            *data["doses"], model, *data["sensitivities"], effect_cache=warm
+        )
+
+    return lambda: glucose_effects(
+        *data["doses"],
+        model,
+        *data["sensitivities"],
+        effect_cache=warm if warm_cache else DoseEffectCache()
+    )
+
+
+def prepare_doses_case(data, use_dose_timeline):
+    input_dict = data["input"]
+    doses = (
+        input_dict["dose_types"], input_dict["dose_start_times"],
+        input_dict["dose_end_times"], input_dict["dose_values"],
+        input_dict["dose_delivered_units"]
+    )
+    other_inputs = (
+        input_dict["glucose_dates"][0],
+        input_dict["basal_rate_start_times"],
+        input_dict["basal_rate_values"],
+        input_dict["basal_rate_minutes"],
+        data["settings"]["model"]
+    )
+
+    if use_dose_timeline:
+        timeline = DoseTimeline.from_lists(
+            *doses[0:4], delivered_units=doses[4]
+        )
+        return lambda: prepare_dose_timeline(timeline, *other_inputs)
+
+    return lambda: prepare_doses(*doses, *other_inputs)
+
+
+def insulin_on_board_case(data, engine, use_curve_tables, delta):
+    model = data["settings"]["model"]
+    function = (
+        vectorized_insulin_math.insulin_on_board if engine == "numpy"
+        else insulin_on_board
+    )
+    curve_table = (
+        get_insulin_curve_table(model, 10, delta) if use_curve_tables
+        else None
+    )
+
+    return lambda: function(
+        *data["doses"],
+        model,
+        delta=delta,
+        curve_table=curve_table
+    )
+
+
+def iob_at_case(data, delta):
+    """ The IOB at the last glucose date and the next hour """
+    now = data["input"]["glucose_dates"][-1]
+    times = [now + timedelta(minutes=minutes) for minutes in range(0, 61, 15)]
+
+    return lambda: vectorized_insulin_math.iob_at(
+        *data["doses"],
+        data["settings"]["model"],
+        times,
+        delta=delta
+    )
+
+
+def above_range_prediction(data):
+    """ A prediction that stays above the target range for the whole
+        insulin duration (so every point is checked)
+    """
+    model = data["settings"]["model"]
+    now = data["input"]["glucose_dates"][-1]
+    minutes = model[0] * 60 if len(model) == 1 else model[0]
+    dates = [
+        now + timedelta(minutes=minute)
+        for minute in range(0, int(minutes) + 1, 5)
+    ]
+
+    return (
+        dates,
+        [180 + 20 * numpy.sin(i / 10) for i in range(0, len(dates))]
+    )
+
+
+def insulin_correction_case(data, engine, use_curve_tables):
+    input_dict = data["input"]
+    settings = data["settings"]
+    model = settings["model"]
+    (dates, values) = above_range_prediction(data)
+
+    return lambda: glucose_correction(
+        dates, values,
+        input_dict["target_range_start_times"],
+        input_dict["target_range_end_times"],
+        input_dict["target_range_minimum_values"],
+        input_dict["target_range_maximum_values"],
+        dates[0],
+        settings.get("suspend_threshold"),
+        *data["sensitivities"],
+        model,
+        get_insulin_curve_table(model) if use_curve_tables else None,
+        engine=engine
+    )
+
+
+def recommend_grid_case(data, variant_count, batched):
+    """ Temp basal and bolus recommendations for variants of the
+        sensitivity, target range, and max basal rate
+    """
+    model = data["settings"]["model"]
+    (dates, values) = above_range_prediction(data)
+    variants = [
+        {"sensitivity": 20 + i % 10 * 10,
+         "target_min": 80 + i // 10 % 5 * 10,
+         "target_max": 120 + i // 10 % 5 * 10,
+         "max_basal_rate": 2 + i // 50,
+         "max_bolus": 10}
+        for i in range(0, variant_count)
+    ]
+
+    if batched:
+        return lambda: recommend_grid(
+            dates, values, dates[0], model, variants, 1
+        )
+
+    def recommend_each():
+        for variant in variants:
+            arguments = (
+                dates, values,
+                [time(0)], [time(0)],
+                [variant["target_min"]], [variant["target_max"]],
+                dates[0],
+                None,
+                [time(0)], [time(0)],
+                [variant["sensitivity"]],
+                model
+            )
+            recommended_temp_basal(
+                *arguments,
+                [time(0)], [1], [24 * 60],
+                variant["max_basal_rate"],
+                None
+            )
+            recommended_bolus(*arguments, 0, variant["max_bolus"])
+
+    return recommend_each
+
+
+def carb_absorption(data):
+    """ The inputs of carb_math.map_ for a synthetic input """
+    input_dict = data["input"]
+    default_absorption_times = data["settings"]["default_absorption_times"]
+
+    return (
+        input_dict["carb_dates"], input_dict["carb_values"],
+        input_dict["carb_absorption_times"],
+        *data["counteractions"],
+        *data["carb_ratios"],
+        *data["sensitivities"],
+        1.5,
+        default_absorption_times[1],
+        10
+    )
+
+
+def map_case(data):
+    inputs = carb_absorption(data)
+
+    return lambda: map_(*inputs)
+
+
+def dynamic_glucose_effects_case(data):
+    input_dict = data["input"]
+    (absorptions, timelines) = map_(*carb_absorption(data))[0:2]
+
+    return lambda: dynamic_glucose_effects(
+        input_dict["carb_dates"], input_dict["carb_values"],
+        input_dict["carb_absorption_times"],
+        absorptions, timelines,
+        *data["carb_ratios"],
+        *data["sensitivities"],
+        data["settings"]["default_absorption_times"][1],
+        start=input_dict["glucose_dates"][0],
+        scaler=1.7,
+        carb_ratio_schedule=CompiledSchedule(
+            data["carb_ratios"][0], [], data["carb_ratios"][1]
+        ),
+        sensitivity_schedule=CompiledSchedule(*data["sensitivities"])
+    )
+
+
+def predict_glucose_case(data):
+    input_dict = data["input"]
+    (effect_dates, effect_values) = data["insulin_effects"]
+    counteraction_values = [
+        value * 5 for value in data["counteractions"][2]
+    ]
+
+    return lambda: predict_glucose(
+        input_dict["glucose_dates"][0], input_dict["glucose_values"][0],
+        [], None,
+        data["counteractions"][0], counteraction_values,
+        effect_dates, effect_values,
+        effect_dates, effect_values
+    )
+
+
+def counteraction_effects_case(data):
+    input_dict = data["input"]
+    dates = input_dict["glucose_dates"]
+
+    return lambda: counteraction_effects(
+        dates, input_dict["glucose_values"],
+        [False for date in dates], ["PyLoop" for date in dates],
+        *data["insulin_effects"]
+    )
+
+
+def benchmark_cases(template, sweeps):
+    """ Generate the benchmarks to run
+
+    Output:
+    Generator of (name, parameters, function to time)
+    """
+    for report in EXAMPLE_REPORTS:
+        path = os.path.join(EXAMPLE_PATH, report)
+        yield (
+            "parse_report_and_run_with_name",
+            {"report": report},
+            lambda path=path: parse_report_and_run_with_name(path)
+        )
+
+    data_cache = {}
+
+    def data_for(parameters):
+        key = tuple(sorted(parameters.items()))
+        if key not in data_cache:
+            data_cache[key] = prepared_input(template, parameters)
+        return data_cache[key]
+
+    for parameters in sweep(sweeps, "dose_count", "carb_count", "hours"):
+        for (engine, use_curve_tables) in INSULIN_ENGINES:
+            yield (
+                "update",
+                dict(parameters, engine=engine,
+                     curve_tables=use_curve_tables),
+                update_case(data_for(parameters), engine, use_curve_tables)
+            )
+
+    for parameters in sweep(sweeps, "dose_count", "hours", "delta"):
+        for (engine, use_curve_tables) in INSULIN_ENGINES:
+            yield (
+                "glucose_effects",
+                dict(parameters, engine=engine,
+                     curve_tables=use_curve_tables),
+                glucose_effects_case(
+                    data_for(parameters), engine, use_curve_tables,
+                    parameters["delta"]
+                )
+            )
+
+        for warm_cache in [False, True]:
+            yield (
+                "cached_glucose_effects",
+                dict(parameters, warm_cache=warm_cache),
+                cached_glucose_effects_case(data_for(parameters), warm_cache)
+            )
+
+        for use_dose_timeline in [False, True]:
+            yield (
+                "prepare_doses",
+                dict(parameters, dose_timeline=use_dose_timeline),
+                prepare_doses_case(data_for(parameters), use_dose_timeline)
+            )
+
+        for (engine, use_curve_tables) in INSULIN_ENGINES:
+            yield (
+                "insulin_on_board",
+                dict(parameters, engine=engine,
+                     curve_tables=use_curve_tables),
+                insulin_on_board_case(
+                    data_for(parameters), engine, use_curve_tables,
+                    parameters["delta"]
+                )
+            )
+        yield (
+            "iob_at",
+            parameters,
+            iob_at_case(data_for(parameters), parameters["delta"])
+        )
+
+    for parameters in sweep(sweeps, "carb_count", "hours"):
+        yield ("map_", parameters, map_case(data_for(parameters)))
+        yield (
+            "dynamic_glucose_effects",
+            parameters,
+            dynamic_glucose_effects_case(data_for(parameters))
+        )
+
+    for parameters in sweep(sweeps, "hours", "delta"):
+        yield (
+            "predict_glucose",
+            parameters,
+            predict_glucose_case(data_for(parameters))
+        )
+        yield (
+            "counteraction_effects",
+            parameters,
+            counteraction_effects_case(data_for(parameters))
+        )
+
+    # the prediction is as long as the insulin duration, whatever the input
+    parameters = dict(DEFAULTS)
+    for (engine, use_curve_tables) in INSULIN_ENGINES:
+        yield (
+            "insulin_correction",
+            dict(parameters, engine=engine, curve_tables=use_curve_tables),
+            insulin_correction_case(
+                data_for(parameters), engine, use_curve_tables
+            )
+        )
+    for variant_count in [10, 100]:
+        for batched in [False, True]:
+            yield (
+                "recommend_grid",
+                dict(parameters, variants=variant_count, batched=batched),
+                recommend_grid_case(
+                    data_for(parameters), variant_count, batched
+                )
+            )
+
+
+def time_function(function, repeat):
+    """ Time a function, calling it enough times per repeat to get a stable
+        measurement
+
+    Output:
+    Tuple of (calls per repeat, list of seconds per call for each repeat)
+    """
+    timer = timeit.Timer(function)
+    (number, total) = timer.autorange()
+    times = [total / number] + [
+        time_ / number for time_ in timer.repeat(repeat - 1, number)
+    ]
+
+    return (number, times)
+
+
+def run_benchmarks(sweeps=None, repeat=5, name_filter=None, verbose=True):
+    """ Run the benchmarks
+
+    Arguments:
+    sweeps -- values of each parameter to sweep (see SWEEPS)
+    repeat -- number of timed repeats of each benchmark
+    name_filter -- only run the benchmarks whose name contains this string
+    verbose -- whether to print each result as it's measured
+
+    Output:
+    Dictionary with the metadata of the run and the list of results
+    """
+    template = load_template()
+    results = []
+
+    for (name, parameters, function) in benchmark_cases(
+            template, sweeps or SWEEPS
+        ):
+        if name_filter and name_filter not in name:
+            continue
+
+        (number, times) = time_function(function, repeat)
+        result = {
+            "name": name,
+            "parameters": parameters,
+            "number": number,
+            "times": times,
+            "best": min(times),
+            "median": statistics.median(times),
+        }
+        results.append(result)
+
+        if verbose:
+            print("{:32} {:10.3f} ms  {}".format(
+                name, result["best"] * 1000, json.dumps(parameters)
+            ))
+
+    return {
+        "metadata": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def result_key(result):
+    return (result["name"], json.dumps(result["parameters"], sort_keys=True))
+
+
+def compare_results(baseline, current, threshold=1.25):
+    """ Compare the best times of two runs
+
+    Arguments:
+    baseline -- output of run_benchmarks to compare against
+    current -- output of run_benchmarks to check
+    threshold -- ratio of current to baseline time that counts as a
+                 regression
+
+    Output:
+    List of (name, parameters, ratio of current to baseline time) of the
+    regressions
+    """
+    baseline_times = {
+        result_key(result): result["best"] for result in baseline["results"]
+    }
+
+    regressions = []
+    for result in current["results"]:
+        key = result_key(result)
+        if key not in baseline_times:
+            continue
+
+        ratio = result["best"] / baseline_times[key]
+        print("{:32} {:6.2f}x  {}".format(key[0], ratio, key[1]))
+        if ratio > threshold:
+            regressions.append((result["name"], result["parameters"], ratio))
+
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--output", default=DEFAULT_OUTPUT,
+        help="path of the JSON file to write the results to"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="number of timed repeats of each benchmark"
+    )
+    parser.add_argument(
+        "--quick", action="store_true",
+        help="sweep fewer sizes, for a fast check"
+    )
+    parser.add_argument(
+        "--filter", dest="name_filter",
+        help="only run the benchmarks whose name contains this string"
+    )
+    parser.add_argument(
+        "--compare",
+        help="path of a previous JSON output to compare the results to"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=1.25,
+        help="slowdown (current / baseline) that counts as a regression"
+    )
+    arguments = parser.parse_args(arguments)
+
+    output = run_benchmarks(
+        QUICK_SWEEPS if arguments.quick else SWEEPS,
+        arguments.repeat,
+        arguments.name_filter
+    )
+
+    with open(arguments.output, "w") as file:
+        json.dump(output, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare, "r") as file:
+            baseline = json.load(file)
+
+        regressions = compare_results(baseline, output, arguments.threshold)
+        for (name, parameters, ratio) in regressions:
+            print("REGRESSION {} {:.2f}x {}".format(
+                name, ratio, json.dumps(parameters)
+            ))
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:02:44 2026
+
+Generate synthetic inputs for the benchmarks, with settings and schedules
+taken from one of the example issue reports
+"""
+# pylint: disable=R0913, R0914
+import math
+import os
+import random
+from datetime import timedelta
+
+from pyloopkit.dose import DoseType
+from pyloopkit.pyloop_parser import parse_report_and_run
+
+EXAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "pyloopkit", "example_files"
+)
+EXAMPLE_REPORTS = [
+    "example_issue_report_1.json",
+    "example_issue_report_2.json",
+    "example_issue_report_3.json",
+    "example_issue_report_4.json",
+]
+
+DATA_KEYS = [
+    "glucose_dates", "glucose_values",
+    "dose_types", "dose_start_times", "dose_end_times", "dose_values",
+    "dose_delivered_units",
+    "carb_dates", "carb_values", "carb_absorption_times",
+]
+
+
+def load_template(name=EXAMPLE_REPORTS[0]):
+    """ Load the input dictionary of an example issue report
+
+    Arguments:
+    name -- name of the example issue report
+
+    Output:
+    Input dictionary in the format expected by loop_data_manager.update
+    """
+    return parse_report_and_run(EXAMPLE_PATH, name)["input_data"]
+
+
+def synthetic_glucose(end_date, hours, delta=5, seed=0):
+    """ Generate a smooth, noisy glucose trace
+
+    Arguments:
+    end_date -- date of the last glucose value (datetime)
+    hours -- hours of glucose history
+    delta -- minutes between glucose values
+    seed -- seed of the random number generator
+
+    Output:
+    Glucose in format (glucose_dates, glucose_values)
+    """
+    generator = random.Random(seed)
+    count = int(hours * 60 / delta) + 1
+
+    dates = [
+        end_date - timedelta(minutes=delta * (count - 1 - i))
+        for i in range(0, count)
+    ]
+    values = [
+        140 + 50 * math.sin(i * delta / 180) + generator.uniform(-3, 3)
+        for i in range(0, count)
+    ]
+
+    return (dates, values)
+
+
+def synthetic_doses(end_date, hours, dose_count, seed=0):
+    """ Generate alternating 30-minute temp basals and boluses spread evenly
+        over the history
+
+    Arguments:
+    end_date -- date the history ends (datetime)
+    hours -- hours of dose history
+    dose_count -- number of doses
+    seed -- seed of the random number generator
+
+    Output:
+    Doses in format (types, start dates, end dates, values, delivered units)
+    """
+    generator = random.Random(seed)
+    spacing = hours * 60 / (dose_count + 1)
+
+    (types, starts, ends, values, delivered_units) = ([], [], [], [], [])
+    for i in range(0, dose_count):
+        start = end_date - timedelta(minutes=hours * 60 - spacing * (i + 1))
+
+        if i % 2:
+            types.append(DoseType.bolus)
+            ends.append(start + timedelta(minutes=2))
+            values.append(round(generator.uniform(0.5, 4), 2))
+        else:
+            types.append(DoseType.tempbasal)
+            ends.append(start + timedelta(minutes=min(30, spacing)))
+            values.append(round(generator.uniform(0, 2), 2))
+
+        starts.append(start)
+        delivered_units.append(None)
+
+    return (types, starts, ends, values, delivered_units)
+
+
+def synthetic_carbs(end_date, hours, carb_count, seed=0):
+    """ Generate carb entries spread evenly over the history
+
+    Arguments:
+    end_date -- date the history ends (datetime)
+    hours -- hours of carb history
+    carb_count -- number of carb entries
+    seed -- seed of the random number generator
+
+    Output:
+    Carbs in format (carb_dates, carb_values, carb_absorption_times)
+    """
+    generator = random.Random(seed)
+    spacing = hours * 60 / (carb_count + 1)
+
+    dates = [
+        end_date - timedelta(minutes=hours * 60 - spacing * (i + 1))
+        for i in range(0, carb_count)
+    ]
+    values = [generator.randint(10, 60) for date in dates]
+    absorption_times = [generator.choice([120, 180, 240]) for date in dates]
+
+    return (dates, values, absorption_times)
+
+
+def synthetic_input(
+        template,
+        hours=24,
+        dose_count=50,
+        carb_count=5,
+        delta=5,
+        seed=0
+        ):
+    """ Generate an input dictionary for loop_data_manager.update, using the
+        settings and schedules of a template
+
+    Arguments:
+    template -- input dictionary to take the settings and schedules from
+    hours -- hours of glucose, dose, and carb history
+    dose_count -- number of doses
+    carb_count -- number of carb entries
+    delta -- minutes between glucose values
+    seed -- seed of the random number generators
+
+    Output:
+    Input dictionary in the format expected by loop_data_manager.update
+    """
+    input_dict = {
+        key: value for (key, value) in template.items()
+        if key not in DATA_KEYS
+    }
+    input_dict["settings_dictionary"] = dict(template["settings_dictionary"])
+    now = template["time_to_calculate_at"]
+
+    (input_dict["glucose_dates"],
+     input_dict["glucose_values"]
+     ) = synthetic_glucose(now, hours, delta, seed)
+
+    (input_dict["dose_types"],
+     input_dict["dose_start_times"],
+     input_dict["dose_end_times"],
+     input_dict["dose_values"],
+     input_dict["dose_delivered_units"]
+     ) = synthetic_doses(now, hours, dose_count, seed)
+
+    (input_dict["carb_dates"],
+     input_dict["carb_values"],
+     input_dict["carb_absorption_times"]
+     ) = synthetic_carbs(now, hours, carb_count, seed)
+
+    return input_dict
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 20:14:38 2026
+
+Run many issue reports (or input dictionaries) through the Loop algorithm
+in parallel worker processes
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import traceback
+
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
+from pyloopkit.loop_data_manager import update
+from pyloopkit.pyloop_parser import parse_report_and_run_with_name
+
+
+def warm_worker(curve_tables):
+    """ Prepare a worker process: build the insulin curve tables the tasks
+        will use, so they are built once per worker instead of once per task
+
+    Arguments:
+    curve_tables -- list of (insulin model, insulin delay) pairs to build
+                    curve tables for
+    """
+    for (model, insulin_delay) in curve_tables:
+        get_insulin_curve_table(model, insulin_delay)
+
+
+def curve_tables_used(input_dicts):
+    """ Find the insulin curve tables that input dictionaries will use
+
+    Arguments:
+    input_dicts -- list of dictionaries in the format expected by
+                   loop_data_manager.update
+
+    Output:
+    List of (insulin model, insulin delay) pairs, for the inputs whose
+    settings turn on "use_insulin_curve_tables"
+    """
+    curve_tables = []
+    for input_dict in input_dicts:
+        settings = (input_dict or {}).get("settings_dictionary") or {}
+        if not settings.get("use_insulin_curve_tables")\
+                or not settings.get("model"):
+            continue
+
+        curve_table = (
+            tuple(settings.get("model")), settings.get("insulin_delay") or 10
+        )
+        if curve_table not in curve_tables:
+            curve_tables.append(curve_table)
+
+    return curve_tables
+
+
+def run_tasks(function, items):
+    """ Run a function on each item of a chunk, collecting errors instead of
+        raising them
+
+    Arguments:
+    function -- function to run on each item
+    items -- list of (key, item) pairs
+
+    Output:
+    List of (key, output, error) for each item; error is the formatted
+    traceback if the function raised an exception, otherwise None
+    """
+    results = []
+    for (key, item) in items:
+        try:
+            results.append((key, function(item), None))
+        except Exception:  # pylint: disable=W0703
+            results.append((key, None, traceback.format_exc()))
+
+    return results
+
+
+def run_many(
+        function, keyed_items,
+        workers=None,
+        chunksize=4,
+        curve_tables=None
+        ):
+    """ Run a function on many items in worker processes
+
+    Arguments:
+    function -- module-level function to run on each item
+    keyed_items -- list of (key, item) pairs
+    workers -- number of worker processes; if 0, the items are run in
+               this process
+    chunksize -- number of items sent to a worker at a time
+    curve_tables -- (insulin model, insulin delay) pairs to build curve
+                    tables for when each worker starts
+
+    Output:
+    Generator of (key, output, error), in the order the items finish
+    (see run_tasks); if a worker process dies, the items of its chunk (and
+    of the chunks that hadn't finished) are reported with the error
+    """
+    assert chunksize > 0, "expected a positive chunk size"
+
+    chunks = [
+        keyed_items[i:i + chunksize]
+        for i in range(0, len(keyed_items), chunksize)
+    ]
+
+    if workers == 0:
+        for chunk in chunks:
+            yield from run_tasks(function, chunk)
+        return
+
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=warm_worker,
+            initargs=(curve_tables or [],)
+        ) as executor:
+        futures = {
+            executor.submit(run_tasks, function, chunk): chunk
+            for chunk in chunks
+        }
+
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except BrokenProcessPool:
+                error = traceback.format_exc()
+                results = [(key, None, error) for (key, _) in futures[future]]
+
+            yield from results
+
+
+def run_reports(paths, workers=None, chunksize=4):
+    """ Run issue reports through the Loop algorithm in worker processes
+
+    Arguments:
+    paths -- paths to the issue reports
+    workers -- number of worker processes (defaults to the number of CPUs);
+               if 0, the reports are run in this process
+    chunksize -- number of reports sent to a worker at a time
+
+    Output:
+    Generator of (path, output of parse_report_and_run_with_name, error),
+    in the order the reports finish; if a report fails, its output is
+    None and error is the formatted traceback
+    """
+    return run_many(
+        parse_report_and_run_with_name,
+        [(path, path) for path in paths],
+        workers,
+        chunksize
+    )
+
+
+def update_many(input_dicts, workers=None, chunksize=4):
+    """ Run input dictionaries through the Loop algorithm in worker processes
+
+    Arguments:
+    input_dicts -- list of dictionaries in the format expected by
+                   loop_data_manager.update
+    workers -- number of worker processes (defaults to the number of CPUs);
+               if 0, the inputs are run in this process
+    chunksize -- number of inputs sent to a worker at a time
+
+    Output:
+    Generator of (index of the input, output of update, error), in the
+    order the inputs finish; if an input fails, its output is None and
+    error is the formatted traceback
+    """
+    return run_many(
+        update,
+        list(enumerate(input_dicts)),
+        workers,
+        chunksize,
+        curve_tables_used(input_dicts)
+    )
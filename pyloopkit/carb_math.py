@@ -8,6 +8,8 @@ https://github.com/tidepool-org/LoopKit/blob/
 57a9f2ba65ae3765ef7baafe66b883e654e08391/LoopKit/CarbKit/CarbMath.swift
 """
 # pylint: disable=R0913, C0200, C0301, R0914, R0915, C0302
+from bisect import bisect_left, insort
+import heapq
 import sys
 from datetime import timedelta
 
@@ -26,7 +28,9 @@ def map_(
         absorption_time_overrun,
         default_absorption_time,
         delay,
-        delta=5
+        delta=5,
+        carb_ratio_schedule=None,
+        sensitivity_schedule=None
         ):
     """
     Maps a sorted timeline of carb entries to the observed absorbed
@@ -62,6 +66,8 @@ def map_(
                                carb entries
     delay -- the time to delay the carb effect
     delta -- time interval between glucose values
+    carb_ratio_schedule -- optional CompiledSchedule of the carb ratios
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
 
     Output:
     3 lists in format (absorption_results, absorption_timelines, carb_entries)
@@ -112,18 +118,22 @@ def map_(
 
     # CSF is in mg/dL/g
     builder_carb_sensitivities = [
-        find_ratio_at_time(
-            sensitivity_starts,
-            sensitivity_ends,
-            sensitivity_values,
-            carb_entry_starts[i]
-            ) /
-        find_ratio_at_time(
-            carb_ratio_starts,
-            [],
-            carb_ratios,
-            carb_entry_starts[i]
-            )
+        (sensitivity_schedule.value_at(carb_entry_starts[i])
+         if sensitivity_schedule
+         else find_ratio_at_time(
+             sensitivity_starts,
+             sensitivity_ends,
+             sensitivity_values,
+             carb_entry_starts[i]
+             )) /
+        (carb_ratio_schedule.value_at(carb_entry_starts[i])
+         if carb_ratio_schedule
+         else find_ratio_at_time(
+             carb_ratio_starts,
+             [],
+             carb_ratios,
+             carb_entry_starts[i]
+             ))
         for i in builder_entry_indexes
         ]
 
@@ -157,6 +167,12 @@ def map_(
         for i in builder_entry_indexes
         ]
 
+    # the minimum absorption rates, used to split the effects between entries
+    builder_rate_increases = [
+        carb_entry_quantities[i] / builder_max_absorb_times[i]
+        for i in builder_entry_indexes
+        ]
+
     observed_effects = [0 for i in builder_entry_indexes]
     observed_completion_dates = [None for i in builder_entry_indexes]
 
@@ -191,54 +207,42 @@ def map_(
                 ):
                 observed_completion_dates[entry_index] = end
 
-    for index in range(0, len(effect_starts)):
+    # Select only the entries whose dates overlap each effect's date interval
+    # These are not always contiguous, as maxEndDate varies between entries
+    for (index, active_builders) in enumerate(
+            active_entries(
+                effect_starts, carb_entry_starts, builder_max_end_dates
+            )):
 
         if effect_starts[index] >= effect_ends[index]:
             continue
 
-        # Select only the entries whose dates overlap the current date interval
-        # These are not always contiguous, as maxEndDate varies between entries
-        active_builders = []
-
-        for j in builder_entry_indexes:
-            if (effect_starts[index] < builder_max_end_dates[j]
-                    and effect_starts[index] >= carb_entry_starts[j]):
-                active_builders.append(j)
-
         # Ignore velocities < 0 when estimating carb absorption.
         # These are most likely the result of insulin absorption increases
         # such as during activity
         effect_value = max(0, effect_values[index]) * delta
 
-        def rate_increase(index_):
-            return (carb_entry_quantities[index_]
-                    / builder_max_absorb_times[index_]
-                    )
         # Sum the minimum absorption rates of each active entry to
         # determine how to split the active effects
         total_rate = 0
 
         for i in active_builders:
-            total_rate += rate_increase(i)
+            total_rate += builder_rate_increases[i]
 
         for b_index in active_builders:
-            entry_effect = (carb_entry_quantities[b_index]
-                            * builder_carb_sensitivities[b_index]
-                           )
-            remaining_effect = max(entry_effect - observed_effects[b_index], 0)
+            remaining_effect = max(
+                entry_effects[b_index] - observed_effects[b_index], 0
+            )
 
             # Apply a portion of the effect to this entry
             partial_effect_value = min(remaining_effect,
-                                       (carb_entry_quantities[b_index]
-                                        / builder_max_absorb_times[b_index]
-                                        ) / total_rate * effect_value
+                                       builder_rate_increases[b_index]
+                                       / total_rate * effect_value
                                        if total_rate != 0 and effect_value != 0
                                        else 0
                                        )
 
-            total_rate -= (carb_entry_quantities[b_index]
-                           / builder_max_absorb_times[b_index]
-                           )
+            total_rate -= builder_rate_increases[b_index]
             effect_value -= partial_effect_value
 
             add_next_effect(
@@ -365,6 +369,61 @@ def map_(
     return (absorptions, timelines, entries)
 
 
+def active_entries(effect_starts, entry_starts, entry_end_dates):
+    """ Find the carb entries that are active at the start of each effect:
+        the entries that started at or before it and end after it
+
+        If the effect starts are sorted, the active entries are kept up to
+        date with a sweep over the entries (sorted by start and end dates),
+        rather than checking every entry against every effect.
+
+    Arguments:
+    effect_starts -- list of start times of the effects (datetime objects)
+    entry_starts -- list of start times of the entries (datetime objects)
+    entry_end_dates -- list of end times of the entries (datetime objects)
+
+    Output:
+    Generator of one list per effect of the indexes of the active entries,
+    in increasing order
+    """
+    assert len(entry_starts) == len(entry_end_dates),\
+        "expected input shapes to match"
+
+    if any(effect_starts[i] < effect_starts[i - 1]
+           for i in range(1, len(effect_starts))):
+        for effect_start in effect_starts:
+            yield [
+                j for j in range(0, len(entry_starts))
+                if entry_starts[j] <= effect_start < entry_end_dates[j]
+            ]
+        return
+
+    start_order = sorted(
+        range(0, len(entry_starts)),
+        key=lambda i: entry_starts[i]
+    )
+    next_entry = 0
+    active = []
+    # (end date, entry index) of the active entries
+    end_dates = []
+
+    for effect_start in effect_starts:
+        while (next_entry < len(start_order)
+               and entry_starts[start_order[next_entry]] <= effect_start):
+            entry_index = start_order[next_entry]
+            insort(active, entry_index)
+            heapq.heappush(
+                end_dates, (entry_end_dates[entry_index], entry_index)
+            )
+            next_entry += 1
+
+        while end_dates and end_dates[0][0] <= effect_start:
+            entry_index = heapq.heappop(end_dates)[1]
+            del active[bisect_left(active, entry_index)]
+
+        yield list(active)
+
+
 def linearly_absorbed_carbs(total, time, absorption_time):
     """
     Find absorbed carbs using a linear model
@@ -700,6 +759,11 @@ def dynamic_carbs_on_board(
     cob_dates = []
     cob_values = []
 
+    observed_sums = [
+        carb_status.observed_absorption_sums(timeline)
+        for timeline in timelines
+        ]
+
     def find_partial_cob(i):
         return carb_status.dynamic_carbs_on_board_helper(
             carb_starts[i],
@@ -710,7 +774,8 @@ def dynamic_carbs_on_board(
             default_absorption_time,
             delay,
             delta,
-            carb_absorptions[i]
+            carb_absorptions[i],
+            observed_sums=observed_sums[i]
             )
 
     while date <= end:
@@ -736,7 +801,9 @@ def carb_glucose_effects(
         delta=5,
         start=None,
         end=None,
-        scaler=1
+        scaler=1,
+        carb_ratio_schedule=None,
+        sensitivity_schedule=None
         ):
     """
     Find the expected effects of carbohydate consumption on blood glucose
@@ -763,6 +830,8 @@ def carb_glucose_effects(
     end -- datetime to stop calculation of glucose effects
     scaler -- the factor to extend carb absorption by when calculating the
               end time for the COB timeline
+    carb_ratio_schedule -- optional CompiledSchedule of the carb ratios
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
 
     Output:
     Two lists in format (effect_start_dates, effect_values)
@@ -799,17 +868,25 @@ def carb_glucose_effects(
     effect_values = []
 
     def find_partial_effect(i):
-        insulin_sensitivity = find_ratio_at_time(
-            sensitivity_starts,
-            sensitivity_ends,
-            sensitivity_values,
-            carb_starts[i]
+        insulin_sensitivity = (
+            sensitivity_schedule.value_at(carb_starts[i])
+            if sensitivity_schedule
+            else find_ratio_at_time(
+                sensitivity_starts,
+                sensitivity_ends,
+                sensitivity_values,
+                carb_starts[i]
+                )
             )
-        carb_ratio = find_ratio_at_time(
-            carb_ratio_starts,
-            [],
-            carb_ratios,
-            carb_starts[i]
+        carb_ratio = (
+            carb_ratio_schedule.value_at(carb_starts[i])
+            if carb_ratio_schedule
+            else find_ratio_at_time(
+                carb_ratio_starts,
+                [],
+                carb_ratios,
+                carb_starts[i]
+                )
             )
         return carb_glucose_effect(
             carb_starts[i],
@@ -886,7 +963,9 @@ def dynamic_glucose_effects(
         delta=5,
         start=None,
         end=None,
-        scaler=1
+        scaler=1,
+        carb_ratio_schedule=None,
+        sensitivity_schedule=None
         ):
     """
     Find the expected effects of carbohydate consumption on blood glucose
@@ -920,6 +999,8 @@ def dynamic_glucose_effects(
     end -- datetime to stop calculation of glucose effects
     scaler -- the factor to extend carb absorption by when calculating the
               end time for the COB timeline
+    carb_ratio_schedule -- optional CompiledSchedule of the carb ratios
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
 
     Output:
     Two lists in format (effect_start_dates, effect_values)
@@ -959,20 +1040,32 @@ def dynamic_glucose_effects(
     effect_start_dates = []
     effect_values = []
 
+    # CSF is in mg/dL/g
+    carb_sensitivities = [
+        (sensitivity_schedule.value_at(carb_start)
+         if sensitivity_schedule
+         else find_ratio_at_time(
+             sensitivity_starts,
+             sensitivity_ends,
+             sensitivity_values,
+             carb_start
+             )) /
+        (carb_ratio_schedule.value_at(carb_start)
+         if carb_ratio_schedule
+         else find_ratio_at_time(
+             carb_ratio_starts,
+             [],
+             carb_ratios,
+             carb_start
+             ))
+        for carb_start in carb_starts
+        ]
+    observed_sums = [
+        carb_status.observed_absorption_sums(timeline)
+        for timeline in timelines
+        ]
+
     def find_partial_effect(i):
-        insulin_sensitivity = find_ratio_at_time(
-            sensitivity_starts,
-            sensitivity_ends,
-            sensitivity_values,
-            carb_starts[i]
-            )
-        carb_ratio = find_ratio_at_time(
-            carb_ratio_starts,
-            [],
-            carb_ratios,
-            carb_starts[i]
-            )
-        csf = insulin_sensitivity / carb_ratio
         partial_carbs_absorbed = carb_status.dynamic_absorbed_carbs(
             carb_starts[i],
             carb_quantities[i],
@@ -982,9 +1075,10 @@ def dynamic_glucose_effects(
             carb_absorptions[i] or default_absorption_time,
             delay,
             delta,
+            observed_sums=observed_sums[i]
         )
 
-        return csf * partial_carbs_absorbed
+        return carb_sensitivities[i] * partial_carbs_absorbed
 
     while date <= end:
         effect_sum = 0
@@ -9,7 +9,9 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 57a9f2ba65ae3765ef7baafe66b883e654e08391/LoopKit/CarbKit/CarbStatus.swift
 """
 # pylint: disable=R0913, R0914
+from bisect import bisect_right
 from datetime import timedelta
+from itertools import accumulate
 
 from pyloopkit.date import time_interval_since
 from pyloopkit import carb_math
@@ -24,7 +26,8 @@ def dynamic_carbs_on_board_helper(
         default_absorption_time,
         delay,
         delta,
-        carb_absorption_time=None
+        carb_absorption_time=None,
+        observed_sums=None
         ):
     """
     Find partial COB for a particular carb entry *dynamically*
@@ -45,6 +48,9 @@ def dynamic_carbs_on_board_helper(
 
     delay -- the time to delay the carb effect
     carb_absorption_time -- time carbs will take to absorb (mins)
+    observed_sums -- optional observed_absorption_sums of the
+                     observed_timeline, to look up the observed absorption
+                     instead of summing the timeline
 
     Output:
     Carbohydrate value (g)
@@ -95,6 +101,13 @@ def dynamic_carbs_on_board_helper(
         )
 
     # There was observed absorption
+    if observed_sums:
+        (_, _, end_dates, end_sums) = observed_sums
+        return max(
+            carb_value - end_sums[bisect_right(end_dates, at_date)],
+            0
+            )
+
     total = carb_value
     def partial_absorption(dict_):
         if dict_[1] > at_date:
@@ -119,6 +132,7 @@ def dynamic_absorbed_carbs(
         carb_absorption_time,
         delay,
         delta,
+        observed_sums=None
         ):
     """
     Find partial absorbed carbs for a particular carb entry *dynamically*
@@ -138,6 +152,10 @@ def dynamic_absorbed_carbs(
 
     delay -- the time to delay the carb effect
 
+    observed_sums -- optional observed_absorption_sums of the
+                     observed_timeline, to look up the observed absorption
+                     instead of summing the timeline
+
     Output:
     Carbohydrate value (g)
     """
@@ -184,9 +202,18 @@ def dynamic_absorbed_carbs(
             absorption_time
         )
 
+    # There was observed absorption
+    if observed_sums:
+        (start_dates, start_sums, _, _) = observed_sums
+        return min(
+            start_sums[
+                bisect_right(start_dates, at_date - timedelta(minutes=delta))
+            ],
+            absorption_dict[0]
+            )
+
     sum_ = 0
 
-    # There was observed absorption
     def filter_dates(sub_timeline):
         return sub_timeline[0] + timedelta(minutes=delta) <= at_date
 
@@ -216,3 +243,37 @@ def dynamic_absorbed_carbs(
         sum_,
         absorption_dict[0]
         )
+
+
+def observed_absorption_sums(observed_timeline):
+    """
+    Index an observed absorption timeline for the lookups of
+    dynamic_absorbed_carbs and dynamic_carbs_on_board_helper
+
+    Arguments:
+    observed_timeline -- list of carb absorption info at various times
+                         (computed via map_)
+
+    Output:
+    Tuple in format (sorted observation start dates, cumulative grams
+    absorbed by the observations in start date order, sorted observation
+    end dates, cumulative grams absorbed by the observations in end date
+    order), where the cumulative lists start with 0; or None if there isn't
+    any observed absorption, or an observation doesn't have a positive
+    length
+    """
+    if (not observed_timeline
+            or any(None in dict_ or dict_[1] <= dict_[0]
+                   for dict_ in observed_timeline)
+       ):
+        return None
+
+    by_start = sorted(observed_timeline, key=lambda dict_: dict_[0])
+    by_end = sorted(observed_timeline, key=lambda dict_: dict_[1])
+
+    return (
+        [dict_[0] for dict_ in by_start],
+        [0] + list(accumulate(dict_[2] for dict_ in by_start)),
+        [dict_[1] for dict_ in by_end],
+        [0] + list(accumulate(dict_[2] for dict_ in by_end))
+    )
@@ -16,6 +16,74 @@ from pyloopkit.carb_math import (filter_date_range_for_carbs, map_, carb_glucose
                        carbs_on_board)
 
 
+class CarbAbsorptionState:
+    """ The observed absorption of carb entries (the output of carb_math.map_),
+        calculated once per set of inputs and shared between
+        get_carb_glucose_effects and get_carbs_on_board
+
+        Carb entries are keyed by value, and the counteraction effects and
+        schedules by identity (they are kept alive by the state), so a state
+        should only be used while those lists aren't modified, like during one
+        loop cycle.
+    """
+    def __init__(self):
+        self.absorptions = {}
+
+    def absorption(
+            self,
+            carb_dates, carb_values, absorption_times,
+            effect_starts, effect_ends, effect_values,
+            carb_ratio_starts, carb_ratios,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            absorption_time_overrun,
+            default_absorption_time,
+            delay,
+            delta,
+            carb_ratio_schedule=None,
+            sensitivity_schedule=None
+        ):
+        """ Get the absorption of carb entries, calling carb_math.map_ only if
+            it hasn't been called with the same inputs
+
+        Arguments:
+        the same as carb_math.map_
+
+        Output:
+        2 lists in format (absorption_results, absorption_timelines)
+        (see carb_math.map_)
+        """
+        inputs = (
+            effect_starts, effect_ends, effect_values,
+            carb_ratio_starts, carb_ratios,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            carb_ratio_schedule, sensitivity_schedule
+        )
+        key = (
+            tuple(carb_dates), tuple(carb_values), tuple(absorption_times),
+            tuple(id(input_) for input_ in inputs),
+            absorption_time_overrun, default_absorption_time, delay, delta
+        )
+
+        if key not in self.absorptions:
+            self.absorptions[key] = (
+                map_(
+                    carb_dates, carb_values, absorption_times,
+                    effect_starts, effect_ends, effect_values,
+                    carb_ratio_starts, carb_ratios,
+                    sensitivity_starts, sensitivity_ends, sensitivity_values,
+                    absorption_time_overrun,
+                    default_absorption_time,
+                    delay,
+                    delta,
+                    carb_ratio_schedule=carb_ratio_schedule,
+                    sensitivity_schedule=sensitivity_schedule
+                )[0:2],
+                inputs
+            )
+
+        return self.absorptions[key][0]
+
+
 def get_carb_glucose_effects(
         carb_dates, carb_values, absorption_times,
         at_date,
@@ -26,7 +94,10 @@ def get_carb_glucose_effects(
         absorption_time_overrun=1.5,
         delay=10,
         delta=5,
-        end_date=None
+        end_date=None,
+        carb_ratio_schedule=None,
+        sensitivity_schedule=None,
+        absorption_state=None
         ):
     """ Retrieve a timeline of effect on blood glucose from carbohydrates
 
@@ -61,6 +132,11 @@ def get_carb_glucose_effects(
 
     end_date -- date to end calculation of glucose effects
 
+    carb_ratio_schedule -- optional CompiledSchedule of the carb ratios
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    absorption_state -- optional CarbAbsorptionState to share the carb
+                        absorption with other calls
+
     Output:
     An array of effects in chronological order
     """
@@ -90,7 +166,7 @@ def get_carb_glucose_effects(
     if effect_starts and effect_starts[0]:
         (absorption_results,
          timelines
-         ) = map_(
+         ) = (absorption_state.absorption if absorption_state else map_)(
              *filtered_carbs,
              effect_starts, effect_ends, effect_values,
              carb_ratio_starts, carb_ratios,
@@ -98,7 +174,9 @@ def get_carb_glucose_effects(
              absorption_time_overrun,
              default_absorption_times[1],
              delay,
-             delta
+             delta,
+             carb_ratio_schedule=carb_ratio_schedule,
+             sensitivity_schedule=sensitivity_schedule
              )[0:2]
 
         effects = dynamic_glucose_effects(
@@ -111,7 +189,9 @@ def get_carb_glucose_effects(
             delta,
             start=at_date,
             end=end_date,
-            scaler=1.7
+            scaler=1.7,
+            carb_ratio_schedule=carb_ratio_schedule,
+            sensitivity_schedule=sensitivity_schedule
             )
     # otherwise, use a static model
     else:
@@ -123,7 +203,9 @@ def get_carb_glucose_effects(
             delay,
             delta,
             at_date,
-            end_date
+            end_date,
+            carb_ratio_schedule=carb_ratio_schedule,
+            sensitivity_schedule=sensitivity_schedule
             )
 
     assert len(effects[0]) == len(effects[1]), "expected output shape to match"
@@ -141,7 +223,10 @@ def get_carbs_on_board(
         absorption_time_overrun=1.5,
         delay=10,
         delta=5,
-        end_date=None
+        end_date=None,
+        carb_ratio_schedule=None,
+        sensitivity_schedule=None,
+        absorption_state=None
         ):
     """ Retrieves the COB at a time, or a timeline of COB
 
@@ -176,6 +261,11 @@ def get_carbs_on_board(
 
     end_date -- date to end calculation of COB
 
+    carb_ratio_schedule -- optional CompiledSchedule of the carb ratios
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    absorption_state -- optional CarbAbsorptionState to share the carb
+                        absorption with other calls
+
     Output:
     COB timeline
     """
@@ -211,7 +301,7 @@ def get_carbs_on_board(
        ):
         (absorption_results,
          timelines
-         ) = map_(
+         ) = (absorption_state.absorption if absorption_state else map_)(
              *filtered_carbs,
              effect_starts, effect_ends, effect_values,
              carb_ratio_starts, carb_ratios,
@@ -219,7 +309,9 @@ def get_carbs_on_board(
              absorption_time_overrun,
              default_absorption_times[1],
              delay,
-             delta
+             delta,
+             carb_ratio_schedule=carb_ratio_schedule,
+             sensitivity_schedule=sensitivity_schedule
              )[0:2]
 
         cob_data = dynamic_carbs_on_board(
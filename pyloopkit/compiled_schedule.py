@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 15:20:08 2026
+
+Daily schedules (insulin sensitivities, carb ratios, correction ranges)
+compiled into sorted boundaries, so the value at a time can be found with
+a binary search instead of checking every entry of the schedule.
+"""
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+
+import numpy
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+# number of compiled schedules kept in memory
+COMPILED_SCHEDULE_CACHE_SIZE = 64
+
+
+def microseconds_of_day(time_):
+    """ Microseconds since midnight of a time (or the wall-clock time of
+        a datetime)
+    """
+    if isinstance(time_, datetime):
+        time_ = time_.time()
+
+    return (
+        ((time_.hour * 60 + time_.minute) * 60 + time_.second) * 1000000
+        + time_.microsecond
+    )
+
+
+class CompiledSchedule:
+    """ A daily schedule that returns the same values as
+        insulin_math.find_ratio_at_time
+
+    Arguments:
+    start_times -- list of time objects of start times of the schedule
+                   values
+    end_times -- list of time objects of end times of the schedule values;
+                 if empty, each value lasts until the next start time
+                 (and the last value until the first start time)
+    values -- list of schedule values
+    """
+    def __init__(self, start_times, end_times, values):
+        assert len(start_times) == len(values),\
+            "expected input shapes to match"
+
+        # like is_time_between, intervals include both their start and end,
+        # and wrap around midnight if they don't end after they start
+        starts = [microseconds_of_day(start) for start in start_times]
+        if end_times:
+            ends = [microseconds_of_day(end) for end in end_times]
+        else:
+            ends = [
+                starts[i+1] if i+1 < len(starts) else starts[0]
+                for i in range(0, len(starts))
+            ]
+
+        # the matching entry can only change where an interval starts or
+        # just after one ends
+        boundaries = sorted(
+            set([0] + starts + [end + 1 for end in ends])
+            - set([MICROSECONDS_PER_DAY])
+        )
+
+        def first_matching_value(time_):
+            for i in range(0, len(starts)):
+                if starts[i] < ends[i]:
+                    if starts[i] <= time_ <= ends[i]:
+                        return values[i]
+                elif time_ >= starts[i] or time_ <= ends[i]:
+                    return values[i]
+            return 0
+
+        self.boundaries = boundaries
+        self.values = [first_matching_value(time_) for time_ in boundaries]
+        self.boundary_array = numpy.array(boundaries, dtype=numpy.int64)
+        self.value_array = numpy.array(self.values)
+
+    def value_at(self, time_to_check):
+        """ Find the schedule value at a time
+
+        Arguments:
+        time_to_check -- finding the value at this (date)time
+
+        Output:
+        Value at time_to_check
+        """
+        return self.values[
+            bisect_right(self.boundaries, microseconds_of_day(time_to_check))
+            - 1
+        ]
+
+    def values_at(self, times):
+        """ Find the schedule values at many times
+
+        Arguments:
+        times -- list of times (or datetimes)
+
+        Output:
+        numpy array of the values at the times
+        """
+        return self.values_at_microseconds(
+            numpy.array(
+                [microseconds_of_day(time_) for time_ in times],
+                dtype=numpy.int64
+            )
+        )
+
+    def values_at_microseconds(self, microseconds):
+        """ Find the schedule values at many times of day
+
+        Arguments:
+        microseconds -- numpy array of microseconds since midnight
+
+        Output:
+        numpy array of the values at the times
+        """
+        indexes = numpy.searchsorted(
+            self.boundary_array, microseconds, side="right"
+        ) - 1
+
+        return self.value_array[indexes]
+
+
+@lru_cache(maxsize=COMPILED_SCHEDULE_CACHE_SIZE)
+def cached_compiled_schedule(start_times, end_times, values):
+    """ Build (or reuse) the compiled schedule for hashable schedule tuples """
+    return CompiledSchedule(start_times, end_times, values)
+
+
+def get_compiled_schedule(start_times, end_times, values):
+    """ Get the compiled schedule for a daily schedule, compiling it if it
+        isn't among the most recently used schedules
+
+    Arguments:
+    start_times -- list of time objects of start times of the schedule
+                   values
+    end_times -- list of time objects of end times of the schedule values
+                 (can be empty)
+    values -- list of schedule values
+
+    Output:
+    CompiledSchedule
+    """
+    return cached_compiled_schedule(
+        tuple(start_times), tuple(end_times), tuple(values)
+    )
+
+
+def clear_compiled_schedules():
+    """ Drop all cached compiled schedules """
+    cached_compiled_schedule.cache_clear()
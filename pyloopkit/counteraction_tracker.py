@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 23:41:07 2026
+
+Counteraction effects calculated as CGM samples and insulin effects arrive,
+instead of from the start of the glucose history every cycle.
+"""
+from bisect import bisect_left
+from collections import deque
+
+from pyloopkit.date import time_interval_since
+
+# number of used insulin effects to keep before they are dropped
+EFFECT_BUFFER_SIZE = 1024
+
+
+class CounteractionTracker:
+    """ Keeps the counteraction effects (glucose velocities) of a stream of
+        glucose samples up to date
+
+        Each sample is compared to the glucose effect timeline once, and the
+        effect timeline is only scanned forward, so every sample takes
+        constant amortized time. A sample that is newer than the last
+        insulin effect waits until the effects reach it. Feeding the tracker
+        all of the effects and samples gives the same output as
+        glucose_math.counteraction_effects.
+
+        The insulin effects are a single timeline that is added to as time
+        passes; effects that have already been added aren't recalculated.
+    """
+    def __init__(self):
+        self.effect_dates = []
+        self.effect_values = []
+        # position in the effect timeline that the next scan starts from
+        self.effect_index = 0
+
+        # the sample that the next velocity starts at, as
+        # (date, glucose value, display only, provenance)
+        self.start_sample = None
+        # the effect matched to start_sample by an unfinished scan
+        self.start_effect_value = None
+        # samples that are waiting for effects
+        self.pending_samples = deque()
+
+        self.start_dates = []
+        self.end_dates = []
+        self.velocities = []
+
+    def add_effects(self, effect_dates, effect_values):
+        """ Add glucose effects that follow the existing ones
+
+        Arguments:
+        effect_dates -- list of datetime objects associated with a glucose
+                        effect
+        effect_values -- list of values associated with a glucose effect
+
+        Output:
+        The counteraction effects of the samples that were waiting for
+        these effects, in the format (start dates, end dates, velocities)
+        """
+        assert len(effect_dates) == len(effect_values),\
+            "expected input shapes to match"
+        assert not effect_dates or not self.effect_dates\
+            or effect_dates[0] >= self.effect_dates[-1],\
+            "expected effects to be added in chronological order"
+
+        self.effect_dates.extend(effect_dates)
+        self.effect_values.extend(effect_values)
+
+        return self.process_pending_samples()
+
+    def add_glucose(
+            self, dates, glucose_values,
+            displays=None,
+            provenances=None
+        ):
+        """ Add glucose samples taken at or after the existing ones
+
+        Arguments:
+        dates -- list of datetime objects of dates of glucose values
+        glucose_values -- list of glucose values (unit: mg/dL)
+        displays -- list of display_only booleans (all False if not given)
+        provenances -- list of provenances (Strings); all "PyLoop" if not
+                       given
+
+        Output:
+        The counteraction effects that were added, in the format
+        (start dates, end dates, velocities)
+        """
+        displays = displays or [False for date in dates]
+        provenances = provenances or ["PyLoop" for date in dates]
+
+        assert len(dates) == len(glucose_values) == len(displays)\
+            == len(provenances), "expected input shapes to match"
+
+        last_date = (
+            self.pending_samples[-1][0] if self.pending_samples
+            else self.start_sample[0] if self.start_sample
+            else None
+        )
+        assert not dates or last_date is None or dates[0] >= last_date,\
+            "expected glucose to be added in chronological order"
+
+        self.pending_samples.extend(
+            zip(dates, glucose_values, displays, provenances)
+        )
+
+        return self.process_pending_samples()
+
+    def process_pending_samples(self):
+        """ Compare the waiting samples to the glucose effects, in order,
+            until one needs effects that haven't been added yet
+
+        Output:
+        The counteraction effects that were added, in the format
+        (start dates, end dates, velocities)
+        """
+        first_new = len(self.velocities)
+
+        while self.pending_samples:
+            sample = self.pending_samples[0]
+            if self.start_sample is None:
+                self.start_sample = sample
+                self.pending_samples.popleft()
+                continue
+
+            if not self.process_sample(sample):
+                break
+            self.pending_samples.popleft()
+
+        self.drop_used_effects()
+
+        return (
+            self.start_dates[first_new:],
+            self.end_dates[first_new:],
+            self.velocities[first_new:]
+        )
+
+    def process_sample(self, sample):
+        """ Find the counteraction effect ending at a sample, if there is one
+
+        Arguments:
+        sample -- tuple in format (date, glucose value, display only,
+                  provenance)
+
+        Output:
+        False if the sample needs effects that haven't been added yet,
+        otherwise True
+        """
+        (date, glucose_value, display, provenance) = sample
+        (start_date,
+         start_glucose,
+         start_display,
+         start_provenance
+         ) = self.start_sample
+
+        # Find a valid change in glucose, requiring identical
+        # provenance and no calibration
+        time_interval = time_interval_since(date, start_date)
+
+        if time_interval <= 4 * 60:
+            return True
+
+        if (not start_provenance == provenance
+                or start_display
+                or display
+           ):
+            self.start_sample = sample
+            return True
+
+        end_effect_value = None
+
+        while self.effect_index < len(self.effect_dates):
+            effect_date = self.effect_dates[self.effect_index]
+
+            if (self.start_effect_value is None
+                    and effect_date >= start_date
+               ):
+                self.start_effect_value = self.effect_values[self.effect_index]
+
+            elif (self.start_effect_value is not None
+                  and effect_date >= date
+                 ):
+                end_effect_value = self.effect_values[self.effect_index]
+                break
+
+            self.effect_index += 1
+
+        if end_effect_value is None:
+            return False
+
+        effect_change = end_effect_value - self.start_effect_value
+        discrepancy = glucose_value - start_glucose - effect_change
+
+        self.start_dates.append(start_date)
+        self.end_dates.append(date)
+        self.velocities.append(discrepancy / time_interval * 60)
+
+        self.start_sample = sample
+        self.start_effect_value = None
+        return True
+
+    def drop_used_effects(self):
+        """ Forget the effects that the scan has passed, once there are
+            enough of them
+        """
+        if self.effect_index > EFFECT_BUFFER_SIZE:
+            del self.effect_dates[:self.effect_index]
+            del self.effect_values[:self.effect_index]
+            self.effect_index = 0
+
+    def counteraction_effects(self, start_date=None):
+        """ Get the counteraction effects found so far, in the format used
+            by loop_data_manager.update
+
+        Arguments:
+        start_date -- if given, only the effects that start at or after this
+                      date are returned
+
+        Output:
+        Tuple in format (start dates, end dates, velocities (mg/dL/min))
+        """
+        first = (
+            bisect_left(self.start_dates, start_date)
+            if start_date is not None else 0
+        )
+
+        return (
+            self.start_dates[first:],
+            self.end_dates[first:],
+            self.velocities[first:]
+        )
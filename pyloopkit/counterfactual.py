@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 01:12:36 2026
+
+"What if" recommendations: add the effects of hypothetical doses and carbs
+to the output of loop_data_manager.update, instead of running the whole
+cycle again with them.
+"""
+from datetime import timedelta
+
+from pyloopkit.carb_store import get_carb_glucose_effects, get_carbs_on_board
+from pyloopkit.compiled_schedule import get_compiled_schedule
+from pyloopkit.dose_store import get_glucose_effects
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
+from pyloopkit.loop_data_manager import (
+    closest_prior_to_date,
+    update_predicted_glucose_and_recommended_basal_and_bolus)
+from pyloopkit.loop_math import summed_effects
+
+
+def counterfactual_update(
+        recommendations,
+        dose_types=None, dose_start_times=None, dose_end_times=None,
+        dose_values=None,
+        carb_dates=None, carb_values=None, carb_absorption_times=None
+        ):
+    """ Get the prediction and recommendations of a loop cycle as if some
+        doses or carbs had been added to it
+
+        The insulin effect and the (static model) carb effect are sums over
+        the doses and carb entries, so only the effects of the hypothetical
+        ones are calculated and added to the cycle's effects; the prediction
+        and recommendations are then made from the summed effects.
+
+        Hypothetical doses are added to the existing ones (they don't
+        replace or cut short existing temp basals). The glucose history
+        doesn't change, so the counteraction effects, momentum, and
+        retrospective correction stay as they were, and doses at or after
+        the time of the cycle get the same prediction as running update()
+        with them. Hypothetical carbs are absorbed with the static model;
+        with dynamic carb absorption, a real entry would also change how
+        the observed absorption is split between the entries, so their
+        effect is an estimate.
+
+    Arguments:
+    recommendations -- the output of loop_data_manager.update
+
+    dose_types -- types of the hypothetical doses (bolus, tempBasal, etc)
+    dose_start_times -- start times of the hypothetical doses (datetime)
+    dose_end_times -- end times of the hypothetical doses (datetime)
+    dose_values -- amounts of insulin (U/hr if a basal, U if a bolus)
+
+    carb_dates -- times of the hypothetical carb entries (datetime)
+    carb_values -- grams of carbs of the hypothetical carb entries
+    carb_absorption_times -- absorption times of the hypothetical carb
+                             entries (mins)
+
+    Output:
+    A copy of the recommendations, with the insulin and carb effects, COB,
+    predicted glucose, and recommended temp basal, bolus, and autobolus
+    of the counterfactual cycle
+    """
+    assert recommendations, "expected the output of a loop cycle"
+
+    dose_types = dose_types or []
+    dose_start_times = dose_start_times or []
+    dose_end_times = dose_end_times or []
+    dose_values = dose_values or []
+    carb_dates = carb_dates or []
+    carb_values = carb_values or []
+    carb_absorption_times = carb_absorption_times or []
+
+    assert len(dose_types) == len(dose_start_times) == len(dose_end_times)\
+        == len(dose_values), "expected input shapes to match"
+    assert len(carb_dates) == len(carb_values)\
+        == len(carb_absorption_times), "expected input shapes to match"
+
+    input_dict = recommendations["input_data"]
+    settings_dictionary = input_dict.get("settings_dictionary")
+    time_to_calculate_at = input_dict.get("time_to_calculate_at")
+    glucose_dates = input_dict.get("glucose_dates")
+    model = settings_dictionary.get("model")
+
+    sensitivities = (
+        input_dict.get("sensitivity_ratio_start_times"),
+        input_dict.get("sensitivity_ratio_end_times"),
+        input_dict.get("sensitivity_ratio_values")
+    )
+    basal_schedule = (
+        input_dict.get("basal_rate_start_times"),
+        input_dict.get("basal_rate_values"),
+        input_dict.get("basal_rate_minutes")
+    )
+    target_range = (
+        input_dict.get("target_range_start_times"),
+        input_dict.get("target_range_end_times"),
+        input_dict.get("target_range_minimum_values") or [],
+        input_dict.get("target_range_maximum_values")
+    )
+    carb_ratios = (
+        input_dict.get("carb_ratio_start_times"),
+        input_dict.get("carb_ratio_values")
+    )
+
+    sensitivity_schedule = get_compiled_schedule(*sensitivities)
+    insulin_delay = settings_dictionary.get("insulin_delay") or 10
+    curve_table = (
+        get_insulin_curve_table(model, insulin_delay)
+        if settings_dictionary.get("use_insulin_curve_tables") else None
+    )
+
+    counterfactual = dict(recommendations)
+
+    if dose_types:
+        added_insulin_effects = get_glucose_effects(
+            dose_types, dose_start_times, dose_end_times, dose_values,
+            [None for type_ in dose_types],
+            time_to_calculate_at,
+            *basal_schedule,
+            *sensitivities,
+            model,
+            delay=insulin_delay,
+            engine=settings_dictionary.get("insulin_effect_engine")
+            or "python",
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule
+            )
+        (counterfactual["insulin_effect_dates"],
+         counterfactual["insulin_effect_values"]
+         ) = summed_effects(
+             recommendations["insulin_effect_dates"],
+             recommendations["insulin_effect_values"],
+             *added_insulin_effects
+             )
+
+    if carb_dates:
+        carb_ratio_schedule = get_compiled_schedule(
+            carb_ratios[0], [], carb_ratios[1]
+        )
+        retrospective_start = (
+            glucose_dates[-1]
+            - timedelta(minutes=settings_dictionary.get(
+                "retrospective_correction_integration_interval") or 30)
+        )
+
+        # without counteraction effects, the carbs are absorbed with the
+        # static model
+        added_carb_effects = get_carb_glucose_effects(
+            carb_dates, carb_values, carb_absorption_times,
+            retrospective_start,
+            [], [], [],
+            *carb_ratios,
+            *sensitivities,
+            settings_dictionary.get("default_absorption_times"),
+            delay=settings_dictionary.get("carb_delay") or 10,
+            carb_ratio_schedule=carb_ratio_schedule,
+            sensitivity_schedule=sensitivity_schedule
+            )
+        (counterfactual["carb_effect_dates"],
+         counterfactual["carb_effect_values"]
+         ) = summed_effects(
+             recommendations["carb_effect_dates"],
+             recommendations["carb_effect_values"],
+             *added_carb_effects
+             )
+
+        added_cob = get_carbs_on_board(
+            carb_dates, carb_values, carb_absorption_times,
+            time_to_calculate_at,
+            [], [], [],
+            *carb_ratios,
+            *sensitivities,
+            settings_dictionary.get("default_absorption_times"),
+            delay=settings_dictionary.get("carb_delay") or 10,
+            carb_ratio_schedule=carb_ratio_schedule,
+            sensitivity_schedule=sensitivity_schedule
+            )
+        (cob_dates,
+         cob_values
+         ) = summed_effects(
+             recommendations["cob_timeline_dates"],
+             recommendations["cob_timeline_values"],
+             *added_cob
+             )
+        counterfactual["cob_timeline_dates"] = cob_dates
+        counterfactual["cob_timeline_values"] = cob_values
+        counterfactual["carbs_on_board"] = cob_values[
+            closest_prior_to_date(time_to_calculate_at, cob_dates)
+        ] if cob_dates else 0
+
+    counterfactual.update(
+        update_predicted_glucose_and_recommended_basal_and_bolus(
+            time_to_calculate_at,
+            glucose_dates, input_dict.get("glucose_values"),
+            recommendations["momentum_effect_dates"],
+            recommendations["momentum_effect_values"],
+            counterfactual["carb_effect_dates"],
+            counterfactual["carb_effect_values"],
+            counterfactual["insulin_effect_dates"],
+            counterfactual["insulin_effect_values"],
+            recommendations["retrospective_effect_dates"] or [],
+            recommendations["retrospective_effect_values"] or [],
+            *target_range,
+            settings_dictionary.get("suspend_threshold"),
+            *sensitivities,
+            model,
+            *basal_schedule,
+            settings_dictionary.get("max_basal_rate"),
+            settings_dictionary.get("max_bolus"),
+            input_dict.get("last_temporary_basal"),
+            minimum_autobolus=settings_dictionary.get("minimum_autobolus"),
+            maximum_autobolus=settings_dictionary.get("maximum_autobolus"),
+            partial_application_factor=settings_dictionary.get(
+                "partial_application_factor"
+            ),
+            rate_rounder=settings_dictionary.get("rate_rounder"),
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule,
+            target_min_schedule=get_compiled_schedule(
+                *target_range[0:3]
+            ),
+            target_max_schedule=get_compiled_schedule(
+                target_range[0], target_range[1], target_range[3]
+            ),
+            correction_engine=(
+                settings_dictionary.get("insulin_effect_engine") or "python"
+            )
+            )
+        )
+
+    return counterfactual
@@ -11,6 +11,8 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 import datetime
 import math
 
+import numpy
+
 REF_TIME = datetime.datetime.fromisoformat("2001-01-01T00:00:00")
 TIMEZONE_REF_TIME = datetime.datetime.strptime(
     "2001-01-01 00:00:00 +0000",
@@ -33,6 +35,119 @@ def time_interval_since_reference_date(actual_time):
     return abs(actual_time - REF_TIME).total_seconds()
 
 
+def seconds_since_reference_date(dates):
+    """ Convert datetimes to whole seconds since January, 1st, 2001 @ 12:00 AM
+
+    Arguments:
+    dates -- list of datetime objects (either all naive or all tz-aware)
+
+    Output:
+    numpy int64 array of seconds since Jan 1st, 2001 @ 12:00 AM (with a sign);
+    sub-second precision is dropped
+    """
+    one_second = datetime.timedelta(seconds=1)
+
+    return numpy.array(
+        [
+            (date - (TIMEZONE_REF_TIME if date.tzinfo else REF_TIME))
+            // one_second
+            for date in dates
+        ],
+        dtype=numpy.int64
+    )
+
+
+def dates_from_seconds_since_reference_date(seconds, tzinfo=None):
+    """ Convert seconds since January, 1st, 2001 @ 12:00 AM back to datetimes
+        (the inverse of seconds_since_reference_date)
+
+    Arguments:
+    seconds -- list or numpy array of seconds since Jan 1st, 2001 @ 12:00 AM
+    tzinfo -- timezone of the output datetimes, or None for naive datetimes
+
+    Output:
+    List of datetime objects
+    """
+    if tzinfo is None or tzinfo is TIMEZONE_REF_TIME.tzinfo:
+        reference = REF_TIME if tzinfo is None else TIMEZONE_REF_TIME
+        return [
+            reference + datetime.timedelta(seconds=second)
+            for second in numpy.asarray(seconds).tolist()
+        ]
+
+    return [
+        (TIMEZONE_REF_TIME + datetime.timedelta(seconds=second))
+        .astimezone(tzinfo)
+        for second in numpy.asarray(seconds).tolist()
+    ]
+
+
+def seconds_floored_to_time_interval(seconds, interval):
+    """ Floor times in seconds since the reference date to a minute interval
+        (like date_floored_to_time_interval, for whole seconds)
+
+    Arguments:
+    seconds -- int or numpy int64 array of seconds since the reference date
+    interval -- interval to floor the times to, measured in minutes
+
+    Output:
+    Floored seconds, in the same form as the input
+    """
+    if interval == 0:
+        return seconds
+
+    return seconds // (interval * 60) * (interval * 60)
+
+
+def seconds_ceiled_to_time_interval(seconds, interval):
+    """ Ceil times in seconds since the reference date to a minute interval
+        (like date_ceiled_to_time_interval, for whole seconds)
+
+    Arguments:
+    seconds -- int or numpy int64 array of seconds since the reference date
+    interval -- interval to ceil the times to, measured in minutes
+
+    Output:
+    Ceiled seconds, in the same form as the input
+    """
+    if interval == 0:
+        return seconds
+
+    return -(-seconds // (interval * 60)) * (interval * 60)
+
+
+def seconds_offset(seconds, minutes):
+    """ Offset times in seconds since the reference date by some minutes
+
+    Arguments:
+    seconds -- int or numpy int64 array of seconds since the reference date
+    minutes -- number (or numpy array) of minutes to offset the times by;
+               offsets are rounded to whole seconds
+
+    Output:
+    numpy int64 seconds since the reference date
+    """
+    return numpy.add(
+        seconds,
+        numpy.rint(numpy.multiply(minutes, 60)).astype(numpy.int64)
+    )
+
+
+def seconds_timeline(start, end, delta):
+    """ Times every delta minutes from start through end
+
+    Arguments:
+    start -- first time (seconds since the reference date)
+    end -- latest time (seconds since the reference date)
+    delta -- minutes between the times
+
+    Output:
+    numpy int64 array of seconds since the reference date
+    """
+    step = int(round(delta * 60))
+    return numpy.arange(start, end + 1, step, dtype=numpy.int64)
+
+
 def time_interval_since(date_1, date_2):
     """ Calculate seconds between two times
 
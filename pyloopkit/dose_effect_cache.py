@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 17:42:36 2026
+
+Glucose effects of individual doses, kept between calls to
+insulin_math.glucose_effects so that each dose's effect at each timeline
+time is only calculated once.
+"""
+from collections import OrderedDict
+
+# number of doses whose effects are kept before the least recently used
+# ones are dropped
+DOSE_EFFECT_CACHE_SIZE = 2048
+
+
+class DoseEffectCache:
+    """ The glucose effect (mg/dL) of each prepared dose at the timeline
+        times it has been evaluated at
+
+        Doses are keyed by everything their effect depends on (the dose
+        itself, the sensitivity, and the insulin model parameters), so a
+        dose that is trimmed differently is a different entry. The effects
+        are keyed by absolute time, so a dose's effects can be reused by
+        timelines that start at different times.
+
+    Arguments:
+    max_doses -- number of doses to keep; once there are more, the least
+                 recently used doses are dropped (None to keep every dose)
+    """
+    def __init__(self, max_doses=DOSE_EFFECT_CACHE_SIZE):
+        self.max_doses = max_doses
+        self.effects = OrderedDict()
+        self.used_keys = set()
+
+    def __len__(self):
+        return len(self.effects)
+
+    def dose_effects(self, key):
+        """ Get the effects of a dose
+
+        Arguments:
+        key -- tuple describing the dose and how its effect is calculated
+
+        Output:
+        Dictionary of time (seconds since the reference date) -> glucose
+        effect (mg/dL) for the dose, which the caller fills in
+        """
+        self.used_keys.add(key)
+
+        if key in self.effects:
+            self.effects.move_to_end(key)
+            return self.effects[key]
+
+        effects = self.effects[key] = {}
+        if self.max_doses is not None and len(self.effects) > self.max_doses:
+            (dropped_key, _) = self.effects.popitem(last=False)
+            self.used_keys.discard(dropped_key)
+
+        return effects
+
+    def retain_used(self):
+        """ Forget the doses that haven't been used since the last call;
+            doses leave the cache once they fall out of the effect window
+        """
+        self.effects = OrderedDict(
+            (key, effects) for (key, effects) in self.effects.items()
+            if key in self.used_keys
+        )
+        self.used_keys = set()
@@ -11,6 +11,10 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 from pyloopkit.date import time_interval_since
 from pyloopkit.dose import DoseType
 
+# the scheduled basal units are rounded to this fraction of a unit, like a
+# Minimed pump would deliver them
+MINIMUM_MINIMED_INCREMENT = 20
+
 
 def net_basal_units(type_, value, start, end, scheduled_basal_rate, delivered_units):
     """ Find the units of insulin delivered, net of any scheduled basal rate
@@ -29,8 +33,6 @@ def net_basal_units(type_, value, start, end, scheduled_basal_rate, delivered_un
     Bolus amount (if a bolus), or basal units given, net of whatever the
     scheduled basal is
     """
-    MINIMUM_MINIMED_INCREMENT = 20
-
     if type_ == DoseType.bolus:
         return delivered_units if delivered_units is not None else value
 
@@ -13,11 +13,20 @@ from datetime import timedelta
 from enum import Enum
 import sys
 
+import numpy
+
+from pyloopkit.compiled_schedule import (MICROSECONDS_PER_DAY,
+                                         get_compiled_schedule,
+                                         microseconds_of_day)
 from pyloopkit.insulin_math import is_time_between, find_ratio_at_time
 from pyloopkit.date import time_interval_since
 from pyloopkit.dose import DoseType
 from pyloopkit.walsh_insulin_model import walsh_percent_effect_remaining
 from pyloopkit.exponential_insulin_model import percent_effect_remaining
+from pyloopkit.vectorized_insulin_math import (
+    percent_effect_remaining_for_model)
+
+ONE_MICROSECOND = timedelta(microseconds=1)
 
 
 class Correction(Enum):
@@ -207,7 +216,10 @@ def insulin_correction(
         at_date,
         suspend_threshold_value,
         sensitivity_value,
-        model
+        model,
+        curve_table=None,
+        target_min_schedule=None,
+        target_max_schedule=None
         ):
     """ Computes a total insulin amount necessary to correct a glucose
         differential at a given sensitivity
@@ -225,6 +237,10 @@ def insulin_correction(
     sensitivity_value -- the sensitivity (mg/dL/U)
     model -- list of insulin model parameters in format [DIA, peak_time] if
              exponential model, or [DIA] if Walsh model
+    curve_table -- optional InsulinCurveTable for the model, used instead of
+                   evaluating the model directly
+    target_min_schedule -- optional CompiledSchedule of the target minimums
+    target_max_schedule -- optional CompiledSchedule of the target maximums
 
     Output:
     A list of insulin correction information. All lists have the type as the
@@ -255,6 +271,18 @@ def insulin_correction(
      min_correction_units
      ) = ([], None, None, None)
 
+    def target_min_at(date):
+        if target_min_schedule:
+            return target_min_schedule.value_at(date)
+        return find_ratio_at_time(target_starts, target_ends, target_mins, date)
+
+    def target_max_at(date):
+        if target_max_schedule:
+            return target_max_schedule.value_at(date)
+        return find_ratio_at_time(
+            target_starts, target_ends, target_maxes, date
+        )
+
     # only calculate a correction if the prediction is between
     # "now" and now + DIA
     if len(model) == 1:  # if Walsh model
@@ -269,12 +297,7 @@ def insulin_correction(
     # if we don't know the suspend threshold, it defaults to the lower
     # bound of the correction range at the time the "loop" is being run at
     if not suspend_threshold_value:
-        suspend_threshold_value = find_ratio_at_time(
-            target_starts,
-            target_ends,
-            target_mins,
-            at_date
-            )
+        suspend_threshold_value = target_min_at(at_date)
 
     # For each prediction above target, determine the amount of insulin
     # necessary to correct glucose based on the modeled effectiveness of
@@ -304,18 +327,8 @@ def insulin_correction(
             ) / 60
 
         average_target = (
-            find_ratio_at_time(
-                target_starts,
-                target_ends,
-                target_maxes,
-                prediction_dates[i]
-                ) +
-            find_ratio_at_time(
-                target_starts,
-                target_ends,
-                target_mins,
-                prediction_dates[i]
-                )
+            target_max_at(prediction_dates[i])
+            + target_min_at(prediction_dates[i])
             ) / 2
         # Compute the target value as a function of time since the dose started
         target_value = target_glucose_value(
@@ -331,7 +344,12 @@ def insulin_correction(
 
         # Compute the dose required to bring this prediction to target:
         # dose = (Glucose delta) / (% effect × sensitivity)
-        if len(model) == 1:  # if Walsh model
+        if curve_table:
+            # the table is shifted by its delay, which isn't applied here
+            percent_effected = 1 - curve_table.percent_effect_remaining(
+                (time + curve_table.delay) * 60
+            )
+        elif len(model) == 1:  # if Walsh model
             percent_effected = 1 - walsh_percent_effect_remaining(
                 time,
                 model[0]
@@ -366,35 +384,380 @@ def insulin_correction(
         return None
 
     # Choose either the minimum glucose or eventual glucose as correction delta
-    min_glucose_targets = [
-        find_ratio_at_time(
-            target_starts,
-            target_ends,
-            target_mins,
-            min_glucose[0]
-        ),
-        find_ratio_at_time(
-            target_starts,
-            target_ends,
-            target_maxes,
-            min_glucose[0]
+    return range_correction(
+        min_glucose,
+        eventual_glucose,
+        correcting_glucose,
+        min_correction_units,
+        [target_min_at(min_glucose[0]), target_max_at(min_glucose[0])],
+        [target_min_at(eventual_glucose[0]),
+         target_max_at(eventual_glucose[0])],
+        at_date,
+        sensitivity_value,
+        model,
+        curve_table
         )
-    ]
-    eventual_glucose_targets = [
-        find_ratio_at_time(
-            target_starts,
-            target_ends,
-            target_mins,
-            eventual_glucose[0]
-            ),
-        find_ratio_at_time(
-            target_starts,
-            target_ends,
-            target_maxes,
-            eventual_glucose[0]
+
+
+def prediction_window(prediction_dates, at_date, model):
+    """ Find the predictions that are corrected for: like is_time_between,
+        only the times of day of the predictions are compared to "now" and
+        now + DIA
+
+    Arguments:
+    prediction_dates -- dates glucose values were predicted (datetime)
+    at_date -- date to calculate correction
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+
+    Output:
+    Tuple of numpy arrays of (indexes of the predictions in the window,
+    their minutes since at_date, their times of day (microseconds))
+    """
+    duration = (60 * model[0]) if len(model) == 1 else model[0]
+    end_date = at_date + timedelta(minutes=duration)
+
+    # the times of day are offset from now's, unless the dates are in
+    # another timezone
+    offsets = numpy.array(
+        [(date - at_date) // ONE_MICROSECOND for date in prediction_dates],
+        dtype=numpy.int64
+    )
+    if not prediction_dates or prediction_dates[0].tzinfo is at_date.tzinfo:
+        times_of_day = (
+            (microseconds_of_day(at_date) + offsets) % MICROSECONDS_PER_DAY
+        )
+    else:
+        times_of_day = numpy.array(
+            [microseconds_of_day(date) for date in prediction_dates],
+            dtype=numpy.int64
+        )
+
+    (range_start, range_end) = (
+        microseconds_of_day(at_date), microseconds_of_day(end_date)
+    )
+    if range_start < range_end:
+        in_range = (times_of_day >= range_start) & (times_of_day <= range_end)
+    else:
+        in_range = (times_of_day >= range_start) | (times_of_day <= range_end)
+
+    indexes = numpy.flatnonzero(in_range)
+
+    return (indexes, offsets[indexes] / 1e6 / 60, times_of_day[indexes])
+
+
+def target_glucose_values(
+        percent_effect_durations,
+        min_values,
+        max_values
+        ):
+    """ Array version of target_glucose_value; the arguments broadcast """
+    use_min_value_until_percent = 0.5
+
+    return numpy.where(
+        percent_effect_durations <= use_min_value_until_percent,
+        min_values,
+        numpy.where(
+            percent_effect_durations >= 1,
+            max_values,
+            min_values
+            + (max_values - min_values) / (1 - use_min_value_until_percent)
+            * (percent_effect_durations - use_min_value_until_percent)
+        )
+    )
+
+
+def percent_effected_at(minutes, model, curve_table=None):
+    """ Percent of insulin effect that has happened at times after now,
+        without the insulin delay
+
+    Arguments:
+    minutes -- numpy array of minutes since now
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    curve_table -- optional InsulinCurveTable for the model
+
+    Output:
+    numpy array of percent effected
+    """
+    if curve_table:
+        # the table is shifted by its delay, which isn't applied here
+        return 1 - curve_table.percent_effect_remaining(
+            (minutes + curve_table.delay) * 60
+        )
+
+    return 1 - percent_effect_remaining_for_model(minutes, model)
+
+
+def vectorized_insulin_correction(
+        prediction_dates, prediction_values,
+        target_starts, target_ends, target_mins, target_maxes,
+        at_date,
+        suspend_threshold_value,
+        sensitivity_value,
+        model,
+        curve_table=None,
+        target_min_schedule=None,
+        target_max_schedule=None
+        ):
+    """ Array version of insulin_correction: the targets, insulin effect, and
+        correction units of the whole prediction are computed at once
+
+    Arguments and output are the same as insulin_correction's.
+    """
+    assert len(prediction_dates) == len(prediction_values),\
+        "expected input shapes to match"
+
+    assert len(target_starts) == len(target_ends) == len(target_mins)\
+        == len(target_maxes), "expected input shapes to match"
+
+    if target_min_schedule is None:
+        target_min_schedule = get_compiled_schedule(
+            target_starts, target_ends, target_mins
         )
+    if target_max_schedule is None:
+        target_max_schedule = get_compiled_schedule(
+            target_starts, target_ends, target_maxes
+        )
+
+    if not suspend_threshold_value:
+        suspend_threshold_value = target_min_schedule.value_at(at_date)
+
+    (indexes, minutes, times_of_day) = prediction_window(
+        prediction_dates, at_date, model
+    )
+    if not len(indexes):
+        return None
+
+    values = numpy.array(prediction_values, dtype=numpy.float64)[indexes]
+
+    # If any predicted value is below the suspend threshold, return the
+    # first one
+    below_threshold = numpy.flatnonzero(values < suspend_threshold_value)
+    if len(below_threshold):
+        return [
+            Correction.suspend,
+            prediction_values[indexes[below_threshold[0]]]
+        ]
+
+    average_targets = (
+        target_max_schedule.values_at_microseconds(times_of_day)
+        + target_min_schedule.values_at_microseconds(times_of_day)
+    ) / 2
+    target_values = target_glucose_values(
+        minutes / ((60 * model[0]) if len(model) == 1 else model[0]),
+        suspend_threshold_value,
+        average_targets
+    )
+
+    effected_sensitivities = percent_effected_at(
+        minutes, model, curve_table
+    ) * sensitivity_value
+
+    has_sensitivity = effected_sensitivities > 0
+    correction_units = (values - target_values) / numpy.where(
+        has_sensitivity, effected_sensitivities, 1
+    )
+    corrects = has_sensitivity & (correction_units > 0)
+
+    min_index = indexes[numpy.argmin(values)]
+    eventual_index = indexes[-1]
+    (correcting_glucose, min_correction_units) = (None, None)
+    if numpy.any(corrects):
+        correcting = numpy.flatnonzero(corrects)[
+            numpy.argmin(correction_units[corrects])
+        ]
+        correcting_glucose = [
+            prediction_dates[indexes[correcting]],
+            prediction_values[indexes[correcting]]
+        ]
+        min_correction_units = correction_units[correcting].item()
+
+    (min_date, eventual_date) = (
+        prediction_dates[min_index], prediction_dates[eventual_index]
+    )
+
+    # Choose either the minimum glucose or eventual glucose as correction delta
+    return range_correction(
+        [min_date, prediction_values[min_index]],
+        [eventual_date, prediction_values[eventual_index]],
+        correcting_glucose,
+        min_correction_units,
+        [target_min_schedule.value_at(min_date),
+         target_max_schedule.value_at(min_date)],
+        [target_min_schedule.value_at(eventual_date),
+         target_max_schedule.value_at(eventual_date)],
+        at_date,
+        sensitivity_value,
+        model,
+        curve_table
+        )
+
+
+def grid_insulin_corrections(
+        prediction_dates, prediction_values,
+        at_date,
+        suspend_thresholds,
+        sensitivities,
+        target_mins, target_maxes,
+        model,
+        curve_table=None
+        ):
+    """ Computes the insulin corrections of one glucose prediction for many
+        settings at once; the insulin effect is evaluated once, and the
+        targets and correction units of every setting are a matrix
+
+    Arguments:
+    prediction_dates -- dates glucose values were predicted (datetime)
+    prediction_values -- predicted glucose values (mg/dL)
+    at_date -- date to calculate the corrections
+
+    suspend_thresholds -- value to suspend all insulin delivery at for each
+                          setting (mg/dL); the target minimum if None
+    sensitivities -- the sensitivity of each setting (mg/dL/U)
+    target_mins -- the lower bound of the target range of each setting,
+                   used at every time (mg/dL)
+    target_maxes -- the upper bound of the target range of each setting,
+                    used at every time (mg/dL)
+
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    curve_table -- optional InsulinCurveTable for the model
+
+    Output:
+    List of the insulin correction of each setting (see insulin_correction)
+    """
+    assert len(prediction_dates) == len(prediction_values),\
+        "expected input shapes to match"
+
+    assert len(suspend_thresholds) == len(sensitivities) == len(target_mins)\
+        == len(target_maxes), "expected input shapes to match"
+
+    (indexes, minutes, _) = prediction_window(
+        prediction_dates, at_date, model
+    )
+    if not len(indexes):
+        return [None for sensitivity in sensitivities]
+
+    values = numpy.array(prediction_values, dtype=numpy.float64)[indexes]
+    target_mins = numpy.array(target_mins, dtype=numpy.float64)
+    target_maxes = numpy.array(target_maxes, dtype=numpy.float64)
+    sensitivities = numpy.array(sensitivities, dtype=numpy.float64)
+    suspend_thresholds = numpy.array(
+        [
+            threshold or target_min
+            for (threshold, target_min)
+            in zip(suspend_thresholds, target_mins.tolist())
+        ],
+        dtype=numpy.float64
+    )
+
+    # the rows are the settings, and the columns the predictions
+    below_threshold = values < suspend_thresholds[:, None]
+    first_below_threshold = numpy.argmax(below_threshold, axis=1)
+    suspends = below_threshold[
+        numpy.arange(len(sensitivities)), first_below_threshold
+    ]
+
+    target_values = target_glucose_values(
+        minutes / ((60 * model[0]) if len(model) == 1 else model[0]),
+        suspend_thresholds[:, None],
+        ((target_maxes + target_mins) / 2)[:, None]
+    )
+    effected_sensitivities = (
+        percent_effected_at(minutes, model, curve_table)
+        * sensitivities[:, None]
+    )
+
+    has_sensitivity = effected_sensitivities > 0
+    correction_units = (values - target_values) / numpy.where(
+        has_sensitivity, effected_sensitivities, 1
+    )
+    corrects = has_sensitivity & (correction_units > 0)
+    correctings = numpy.argmin(
+        numpy.where(corrects, correction_units, numpy.inf), axis=1
+    )
+
+    min_index = indexes[numpy.argmin(values)]
+    eventual_index = indexes[-1]
+    min_glucose = [prediction_dates[min_index], prediction_values[min_index]]
+    eventual_glucose = [
+        prediction_dates[eventual_index], prediction_values[eventual_index]
     ]
 
+    corrections = []
+    for i in range(0, len(sensitivities)):
+        if suspends[i]:
+            corrections.append([
+                Correction.suspend,
+                prediction_values[indexes[first_below_threshold[i]]]
+            ])
+            continue
+
+        (correcting_glucose, min_correction_units) = (None, None)
+        if corrects[i, correctings[i]]:
+            correcting_index = indexes[correctings[i]]
+            correcting_glucose = [
+                prediction_dates[correcting_index],
+                prediction_values[correcting_index]
+            ]
+            min_correction_units = correction_units[i, correctings[i]].item()
+
+        targets = [target_mins[i].item(), target_maxes[i].item()]
+        corrections.append(
+            range_correction(
+                min_glucose,
+                eventual_glucose,
+                correcting_glucose,
+                min_correction_units,
+                targets,
+                targets,
+                at_date,
+                sensitivities[i].item(),
+                model,
+                curve_table
+            )
+        )
+
+    return corrections
+
+
+def range_correction(
+        min_glucose,
+        eventual_glucose,
+        correcting_glucose,
+        min_correction_units,
+        min_glucose_targets,
+        eventual_glucose_targets,
+        at_date,
+        sensitivity_value,
+        model,
+        curve_table=None
+        ):
+    """ Chooses the correction from the range statistics of a prediction
+        (see insulin_correction)
+
+    Arguments:
+    min_glucose -- the minimum predicted glucose, in format [date, value]
+    eventual_glucose -- the last predicted glucose, in format [date, value]
+    correcting_glucose -- the predicted glucose that needs the least
+                          correction insulin, in format [date, value]
+                          (None if no glucose needs correcting)
+    min_correction_units -- the units of correction insulin it needs
+    min_glucose_targets -- the target range at the minimum glucose,
+                           in format [min, max]
+    eventual_glucose_targets -- the target range at the eventual glucose,
+                                in format [min, max]
+
+    at_date -- date to calculate correction
+    sensitivity_value -- the sensitivity (mg/dL/U)
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    curve_table -- optional InsulinCurveTable for the model
+
+    Output:
+    A list of insulin correction information (see insulin_correction)
+    """
     # Treat the mininum glucose when both are below range
     if (min_glucose[1] < min_glucose_targets[0]
             and eventual_glucose[1] < min_glucose_targets[0]
@@ -403,7 +766,14 @@ def insulin_correction(
         # For time = 0, assume a small amount effected.
         # This will result in large (negative) unit recommendation
         # rather than no recommendation at all.
-        if len(model) == 1:
+        if curve_table:
+            percent_effected = max(
+                sys.float_info.epsilon,
+                1 - curve_table.percent_effect_remaining(
+                    (time + curve_table.delay) * 60
+                    )
+                )
+        elif len(model) == 1:
             percent_effected = max(
                 sys.float_info.epsilon,
                 1 - walsh_percent_effect_remaining(time, model[0])
@@ -543,6 +913,91 @@ def as_bolus(
     return [units, pending_insulin, recommendation]
 
 
+# implementations of insulin_correction, selected by name
+INSULIN_CORRECTION_ENGINES = {
+    "python": insulin_correction,
+    "numpy": vectorized_insulin_correction,
+}
+
+
+def glucose_correction(
+        glucose_dates, glucose_values,
+        target_starts, target_ends, target_mins, target_maxes,
+        at_date,
+        suspend_threshold,
+        sensitivity_starts, sensitivity_ends, sensitivity_values,
+        model,
+        curve_table=None,
+        sensitivity_schedule=None,
+        target_min_schedule=None,
+        target_max_schedule=None,
+        engine="python"
+        ):
+    """ Computes the insulin correction of a glucose prediction timeline at
+    the sensitivity at a given date; the temp basal, bolus, and autobolus
+    recommendations of a prediction can all be derived from it
+
+    Arguments:
+    glucose_dates -- dates of glucose values (datetime)
+    glucose_values -- glucose values (in mg/dL)
+
+    target_starts -- start times for given target ranges (datetime)
+    target_ends -- stop times for given target ranges (datetime)
+    target_mins -- the lower bounds of target ranges (mg/dL)
+    target_maxes -- the upper bounds of target ranges (mg/dL)
+
+    at_date -- date to calculate the correction at
+    suspend_threshold -- value to suspend all insulin delivery at (mg/dL)
+
+    sensitivity_starts -- list of time objects of start times of
+                          given insulin sensitivity values
+    sensitivity_ends -- list of time objects of start times of
+                        given insulin sensitivity values
+    sensitivity_values -- list of sensitivities (mg/dL/U)
+
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    curve_table -- optional InsulinCurveTable for the model
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    target_min_schedule -- optional CompiledSchedule of the target minimums
+    target_max_schedule -- optional CompiledSchedule of the target maximums
+    engine -- name of the insulin correction implementation to use
+              (see INSULIN_CORRECTION_ENGINES)
+
+    Output:
+    The insulin correction (see insulin_correction), or None if there
+    aren't any glucose values, targets, or sensitivities
+    """
+    if (not glucose_dates
+            or not target_starts
+            or not sensitivity_starts
+       ):
+        return None
+
+    if engine not in INSULIN_CORRECTION_ENGINES:
+        raise NotImplementedError(engine, "not recognized")
+
+    sensitivity_value = (
+        sensitivity_schedule.value_at(at_date) if sensitivity_schedule
+        else find_ratio_at_time(
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            at_date
+            )
+        )
+
+    return INSULIN_CORRECTION_ENGINES[engine](
+        glucose_dates, glucose_values,
+        target_starts, target_ends, target_mins, target_maxes,
+        at_date,
+        suspend_threshold,
+        sensitivity_value,
+        model,
+        curve_table,
+        target_min_schedule,
+        target_max_schedule
+        )
+
+
 def recommended_temp_basal(
         glucose_dates, glucose_values,
         target_starts, target_ends, target_mins, target_maxes,
@@ -555,7 +1010,12 @@ def recommended_temp_basal(
         last_temp_basal,
         duration=30,
         continuation_interval=11,
-        rate_rounder=None
+        rate_rounder=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        target_min_schedule=None,
+        target_max_schedule=None,
+        correction=None
         ):
     """ Recommends a temporary basal rate to conform a glucose prediction
     timeline to a correction range
@@ -596,6 +1056,12 @@ def recommended_temp_basal(
                              should be continued with a new command (mins)
     rate_rounder -- the smallest fraction of a unit supported in basal
                     delivery; if None, no rounding is performed
+    curve_table -- optional InsulinCurveTable for the model
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    target_min_schedule -- optional CompiledSchedule of the target minimums
+    target_max_schedule -- optional CompiledSchedule of the target maximums
+    correction -- the glucose_correction of the glucose values, if it has
+                  already been computed
 
     Output:
     The recommended temporary basal in the format [rate, duration]
@@ -619,19 +1085,19 @@ def recommended_temp_basal(
        ):
         return None
 
-    sensitivity_value = find_ratio_at_time(
-        sensitivity_starts, sensitivity_ends, sensitivity_values,
-        at_date
-        )
-
-    correction = insulin_correction(
-        glucose_dates, glucose_values,
-        target_starts, target_ends, target_mins, target_maxes,
-        at_date,
-        suspend_threshold,
-        sensitivity_value,
-        model
-        )
+    if correction is None:
+        correction = glucose_correction(
+            glucose_dates, glucose_values,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            curve_table,
+            sensitivity_schedule,
+            target_min_schedule,
+            target_max_schedule
+            )
 
     scheduled_basal_rate = find_ratio_at_time(
         basal_starts, [], basal_rates,
@@ -674,7 +1140,12 @@ def recommended_bolus(
         model,
         pending_insulin,
         max_bolus,
-        volume_rounder=None
+        volume_rounder=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        target_min_schedule=None,
+        target_max_schedule=None,
+        correction=None
         ):
     """ Recommends a temporary basal rate to conform a glucose prediction
     timeline to a correction range
@@ -708,6 +1179,12 @@ def recommended_bolus(
     max_bolus -- the maximum allowable bolus value in Units
     volume_rounder -- the smallest fraction of a unit supported in insulin
                       delivery; if None, no rounding is performed
+    curve_table -- optional InsulinCurveTable for the model
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    target_min_schedule -- optional CompiledSchedule of the target minimums
+    target_max_schedule -- optional CompiledSchedule of the target maximums
+    correction -- the glucose_correction of the glucose values, if it has
+                  already been computed
 
     Output:
     A bolus recommendation
@@ -727,19 +1204,19 @@ def recommended_bolus(
        ):
         return [0, 0, None]
 
-    sensitivity_value = find_ratio_at_time(
-        sensitivity_starts, sensitivity_ends, sensitivity_values,
-        at_date
-        )
-
-    correction = insulin_correction(
-        glucose_dates, glucose_values,
-        target_starts, target_ends, target_mins, target_maxes,
-        at_date,
-        suspend_threshold,
-        sensitivity_value,
-        model
-        )
+    if correction is None:
+        correction = glucose_correction(
+            glucose_dates, glucose_values,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            curve_table,
+            sensitivity_schedule,
+            target_min_schedule,
+            target_max_schedule
+            )
 
     bolus = as_bolus(
         correction,
@@ -766,9 +1243,17 @@ def recommended_autobolus(
         minimum_autobolus=None,
         maximum_autobolus=None,
         partial_application_factor=None,
-        volume_rounder=None
+        volume_rounder=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        target_min_schedule=None,
+        target_max_schedule=None,
+        correction=None
         ):
     
+    if partial_application_factor is None or partial_application_factor == 0:
+        return None
+
     bolus = recommended_bolus(
         glucose_dates, glucose_values,
         target_starts, target_ends, target_mins, target_maxes,
@@ -778,16 +1263,134 @@ def recommended_autobolus(
         model,
         pending_insulin,
         max_bolus,
-        volume_rounder=None
+        volume_rounder=None,
+        curve_table=curve_table,
+        sensitivity_schedule=sensitivity_schedule,
+        target_min_schedule=target_min_schedule,
+        target_max_schedule=target_max_schedule,
+        correction=correction
         )
     
-    if partial_application_factor is None or partial_application_factor == 0:
-        return None
-    
     if bolus:
         bolus[0] = bolus[0] * partial_application_factor
         
         return bolus
             
     return 0.0
-    
\ No newline at end of file
+
+
+def recommend_grid(
+        prediction_dates, prediction_values,
+        at_date,
+        model,
+        settings_variants,
+        scheduled_basal_rate,
+        last_temp_basal=None,
+        pending_insulin=0,
+        duration=30,
+        continuation_interval=11,
+        rate_rounder=None,
+        volume_rounder=None,
+        curve_table=None
+        ):
+    """ Recommends a temporary basal and a bolus for each of many variants
+        of the settings, given the same glucose prediction (see
+        recommended_temp_basal and recommended_bolus)
+
+        The corrections of all the variants are computed together (see
+        grid_insulin_corrections). The carb ratios only change the
+        prediction, so each carb ratio needs its own prediction and grid.
+
+    Arguments:
+    prediction_dates -- dates glucose values were predicted (datetime)
+    prediction_values -- predicted glucose values (mg/dL)
+    at_date -- date to calculate the recommendations at
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+
+    settings_variants -- list of dictionaries of settings, each with:
+        "sensitivity" -- the sensitivity (mg/dL/U)
+        "target_min" -- the lower bound of the target range (mg/dL)
+        "target_max" -- the upper bound of the target range (mg/dL)
+        "max_basal_rate" -- max basal rate that Loop can give (U/hr)
+        "max_bolus" -- the maximum allowable bolus value (U)
+        "suspend_threshold" -- value to suspend all insulin delivery at
+                               (mg/dL); optional, the target minimum if
+                               not given
+
+    scheduled_basal_rate -- basal rate scheduled at at_date (U/hr)
+    last_temp_basal -- list of last temporary basal information in format
+                       [type, start time, end time, basal rate]
+    pending_insulin -- number of units expected to be delivered, but not yet
+                       reflected in the correction
+    duration -- length of the temp basal (mins)
+    continuation_interval -- length of time before an ongoing temp basal
+                             should be continued with a new command (mins)
+    rate_rounder -- the smallest fraction of a unit supported in basal
+                    delivery; if None, no rounding is performed
+    volume_rounder -- the smallest fraction of a unit supported in insulin
+                      delivery; if None, no rounding is performed
+    curve_table -- optional InsulinCurveTable for the model
+
+    Output:
+    Dictionary of lists that are index-matched with the settings variants:
+        "corrections" -- insulin corrections (see insulin_correction)
+        "recommended_temp_basals" -- temporary basal recommendations
+                                     (see recommended_temp_basal)
+        "recommended_boluses" -- bolus recommendations
+                                 (see recommended_bolus)
+    """
+    corrections = grid_insulin_corrections(
+        prediction_dates, prediction_values,
+        at_date,
+        [variant.get("suspend_threshold") for variant in settings_variants],
+        [variant["sensitivity"] for variant in settings_variants],
+        [variant["target_min"] for variant in settings_variants],
+        [variant["target_max"] for variant in settings_variants],
+        model,
+        curve_table
+        )
+
+    (temp_basals, boluses) = ([], [])
+    for (variant, correction) in zip(settings_variants, corrections):
+        if correction is None:
+            temp_basals.append(None)
+            boluses.append([0, 0, None])
+            continue
+
+        max_basal_rate = variant["max_basal_rate"]
+        if (correction[0] == Correction.above_range
+                and correction[1] < correction[3]):
+            max_basal_rate = scheduled_basal_rate
+
+        recommendation = if_necessary(
+            as_temp_basal(
+                correction,
+                scheduled_basal_rate,
+                max_basal_rate,
+                duration,
+                rate_rounder
+                ),
+            at_date,
+            scheduled_basal_rate,
+            last_temp_basal,
+            continuation_interval
+            )
+        # convert a "cancel" into zero-temp, zero-duration basal
+        temp_basals.append(
+            [0, 0] if recommendation == Correction.cancel else recommendation
+        )
+
+        bolus = as_bolus(
+            correction,
+            pending_insulin,
+            variant["max_bolus"],
+            volume_rounder
+            )
+        boluses.append(0 if bolus[0] < 0 else bolus)
+
+    return {
+        "corrections": corrections,
+        "recommended_temp_basals": temp_basals,
+        "recommended_boluses": boluses,
+    }
@@ -9,12 +9,30 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 57a9f2ba65ae3765ef7baafe66b883e654e08391/LoopKit/InsulinKit/DoseStore.swift
 """
 # pylint: disable=R0913, R0914, C0200
-from datetime import timedelta
+from datetime import timedelta, timezone
 
+import numpy
+
+from pyloopkit import vectorized_insulin_math
+from pyloopkit.date import seconds_since_reference_date
+from pyloopkit.dose import DoseType
 from pyloopkit.dose_math import filter_date_range_for_doses
-from pyloopkit.insulin_math import (annotated, trim, glucose_effects, reconciled)
+from pyloopkit.dose_timeline import DOSE_TYPES, DoseTimeline
+from pyloopkit.insulin_math import (annotated, annotate_individual_dose, trim,
+                                    glucose_effects, reconciled)
 from pyloopkit.loop_math import filter_date_range, sort_dose_lists
 
+# implementations of insulin_math.glucose_effects, selected by name
+GLUCOSE_EFFECT_ENGINES = {
+    "python": glucose_effects,
+    "numpy": vectorized_insulin_math.glucose_effects,
+}
+
+# dose types that are annotated with the scheduled basal rates
+BASAL_TYPE_CODES = [
+    DoseType.basal.value, DoseType.tempbasal.value, DoseType.suspend.value
+]
+
 
 def get_glucose_effects(
         types, starts, ends, values, delivered_units,
@@ -23,7 +41,12 @@ def get_glucose_effects(
         sensitivity_starts, sensitivity_ends, sensitivity_values,
         insulin_model,
         delay=10,
-        end_date=None
+        end_date=None,
+        engine="python",
+        curve_table=None,
+        sensitivity_schedule=None,
+        effect_cache=None,
+        history_start_date=None
         ):
     """ Get the glucose effects at a particular time, given a list of
     doses and a time interval
@@ -53,26 +76,122 @@ def get_glucose_effects(
 
     end_date -- date to stop calculating glucose effects
 
+    engine -- name of the glucose effect implementation to use
+              (see GLUCOSE_EFFECT_ENGINES)
+    curve_table -- optional InsulinCurveTable for the insulin model and delay
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    effect_cache -- optional DoseEffectCache to reuse dose effects between
+                    calls
+    history_start_date -- optional date (before start_date) to prepare the
+                          dose history from, so the effects are the ones
+                          of a timeline starting at that date
+
     Output:
     Glucose effects in the format (effect_date, effect_value)
     """
     assert len(types) == len(starts) == len(ends) == len(values) == len(delivered_units),\
         "expected input shapes to match"
 
+    if engine not in GLUCOSE_EFFECT_ENGINES:
+        raise NotImplementedError(engine, "not recognized")
+
+    (a_types,
+     a_starts,
+     a_ends,
+     a_values,
+     a_scheduled_rates,
+     a_delivered_units
+     ) = prepare_doses(
+         types, starts, ends, values, delivered_units,
+         history_start_date or start_date,
+         basal_starts, basal_rates, basal_minutes,
+         insulin_model,
+         end_date=end_date
+     )
+
+    # get the glucose effects using the prepared dose data
+    glucose_effect = GLUCOSE_EFFECT_ENGINES[engine](
+        a_types, a_starts, a_ends, a_values, a_scheduled_rates, a_delivered_units,
+        insulin_model,
+        sensitivity_starts, sensitivity_ends, sensitivity_values,
+        delay=delay,
+        start=start_date,
+        end=end_date,
+        curve_table=curve_table,
+        sensitivity_schedule=sensitivity_schedule,
+        effect_cache=effect_cache
+        )
+
+    # don't return effects that are less than the start date or greater than
+    # the end date (if there is one)
+    (filtered_starts,
+     ends,
+     filtered_effect_values) = filter_date_range(
+         glucose_effect[0],
+         [],
+         glucose_effect[1],
+         start_date,
+         end_date
+         )
+
+    return (filtered_starts, filtered_effect_values)
+
+
+def dose_history_start(start_date, insulin_model):
+    """ Find the earliest date of the doses that affect glucose at a date
+
+    Arguments:
+    start_date -- date the glucose effects will be calculated from
+    insulin_model -- list in format [DIA (in hours)] if Walsh model, or
+                     [DIA (minutes), peak (minutes)] if exponential model
+
+    Output:
+    The date one duration of insulin action before start_date
+    """
     # to properly know glucose effects at start_date,
     # we need to go back another DIA hours
     if len(insulin_model) == 1:  # if using Walsh model
-        dose_start = (start_date
-                      - timedelta(
-                          hours=insulin_model[0]
-                          )
-                      )
-    else:
-        dose_start = (start_date
-                      - timedelta(
-                          minutes=insulin_model[0]
-                          )
-                      )
+        return start_date - timedelta(hours=insulin_model[0])
+
+    return start_date - timedelta(minutes=insulin_model[0])
+
+
+def prepare_doses(
+        types, starts, ends, values, delivered_units,
+        start_date,
+        basal_starts, basal_rates, basal_minutes,
+        insulin_model,
+        end_date=None
+        ):
+    """ Prepare doses for calculating their glucose effects from a particular
+        time: filter them to the ones that could still have an effect,
+        reconcile them, annotate them with the scheduled basal rates, and trim
+        them to the interval
+
+    Arguments:
+    types -- list of types of dose (basal, bolus, etc)
+    starts -- start dates of the doses (datetime obj)
+    ends -- end dates of the doses (datetime obj)
+    values -- actual basal rates of doses in U/hr (if a basal)
+             or the value of the boluses if in U
+    delivered_units -- net Units of insulin actually delivered by a dose
+
+    start_date -- date the glucose effects will be calculated from
+
+    basal_starts -- list of times the basal rates start at
+    basal_rates -- list of basal rates(U/hr)
+    basal_minutes -- list of basal lengths (in mins)
+
+    insulin_model -- list in format [DIA (in hours)] if Walsh model, or
+                     [DIA (minutes), peak (minutes)] if exponential model
+
+    end_date -- date the glucose effects will be calculated until
+
+    Output:
+    Prepared doses in the format (types, start dates, end dates, values,
+    scheduled basal rates, delivered units)
+    """
+    dose_start = dose_history_start(start_date, insulin_model)
 
     filtered_doses = filter_date_range_for_doses(
         types, starts, ends, values, delivered_units,
@@ -115,18 +234,70 @@ def get_glucose_effects(
         a_ends[i] = result[2]
         a_delivered_units[i] = result[5]
 
-    # get the glucose effects using the prepared dose data
-    glucose_effect = glucose_effects(
-        a_types, a_starts, a_ends, a_values, a_scheduled_rates, a_delivered_units,
-        insulin_model,
+    return (a_types, a_starts, a_ends, a_values, a_scheduled_rates,
+            a_delivered_units)
+
+
+def get_timeline_glucose_effects(
+        timeline,
+        start_date,
+        basal_starts, basal_rates, basal_minutes,
         sensitivity_starts, sensitivity_ends, sensitivity_values,
-        delay=delay,
-        start=start_date,
-        end=end_date
-        )
+        insulin_model,
+        delay=10,
+        end_date=None,
+        engine="python",
+        curve_table=None,
+        sensitivity_schedule=None,
+        effect_cache=None
+        ):
+    """ Get the glucose effects of a DoseTimeline of doses; the same as
+        get_glucose_effects, but the doses stay in arrays until the
+        effects are calculated
+
+    Arguments:
+    timeline -- DoseTimeline of the doses
+
+    (the other arguments are the same as get_glucose_effects)
+
+    Output:
+    Glucose effects in the format (effect_date, effect_value)
+    """
+    if engine not in GLUCOSE_EFFECT_ENGINES:
+        raise NotImplementedError(engine, "not recognized")
+
+    prepared_timeline = prepare_dose_timeline(
+        timeline,
+        start_date,
+        basal_starts, basal_rates, basal_minutes,
+        insulin_model,
+        end_date=end_date
+    )
+
+    if engine == "numpy":
+        glucose_effect = vectorized_insulin_math.timeline_glucose_effects(
+            prepared_timeline,
+            insulin_model,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            delay=delay,
+            start=start_date,
+            end=end_date,
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule
+            )
+    else:
+        glucose_effect = GLUCOSE_EFFECT_ENGINES[engine](
+            *prepared_timeline.to_lists(),
+            insulin_model,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            delay=delay,
+            start=start_date,
+            end=end_date,
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule,
+            effect_cache=effect_cache
+            )
 
-    # don't return effects that are less than the start date or greater than
-    # the end date (if there is one)
     (filtered_starts,
      ends,
      filtered_effect_values) = filter_date_range(
@@ -138,3 +309,267 @@ def get_glucose_effects(
          )
 
     return (filtered_starts, filtered_effect_values)
+
+
+def prepare_dose_timeline(
+        timeline,
+        start_date,
+        basal_starts, basal_rates, basal_minutes,
+        insulin_model,
+        end_date=None
+        ):
+    """ Prepare a DoseTimeline of doses for calculating their glucose effects
+        from a particular time; the same steps as prepare_doses, with the
+        filtering, sorting, and trimming done on the arrays
+
+    Arguments:
+    timeline -- DoseTimeline of the doses
+
+    start_date -- date the glucose effects will be calculated from
+
+    basal_starts -- list of times the basal rates start at
+    basal_rates -- list of basal rates(U/hr)
+    basal_minutes -- list of basal lengths (in mins)
+
+    insulin_model -- list in format [DIA (in hours)] if Walsh model, or
+                     [DIA (minutes), peak (minutes)] if exponential model
+
+    end_date -- date the glucose effects will be calculated until
+
+    Output:
+    DoseTimeline of the prepared doses
+    """
+    interval_start = seconds_since_reference_date(
+        [dose_history_start(start_date, insulin_model)]
+    )[0]
+    interval_end = (
+        seconds_since_reference_date([end_date])[0] if end_date else None
+    )
+
+    filtered_timeline = timeline.between(interval_start, interval_end)
+
+    # reconciling only compares the dose times, so it can use the seconds
+    reconciled_doses = reconciled(
+        filtered_timeline.dose_types(),
+        filtered_timeline.starts.tolist(),
+        filtered_timeline.ends.tolist(),
+        filtered_timeline.values.tolist(),
+        filtered_timeline.delivered_units.tolist()
+    )
+    reconciled_timeline = DoseTimeline(
+        [type_.value for type_ in reconciled_doses[0]],
+        *reconciled_doses[1:4],
+        delivered_units=reconciled_doses[4],
+        tzinfo=timeline.tzinfo
+    ).sorted()
+
+    return annotated_timeline(
+        reconciled_timeline,
+        basal_starts, basal_rates, basal_minutes
+    ).trimmed(interval_start, interval_end)
+
+
+def annotated_timeline(
+        timeline,
+        basal_starts, basal_rates, basal_minutes
+        ):
+    """ Annotate a DoseTimeline with the scheduled basal rates (like
+        insulin_math.annotated, without converting to U/hr); basals that
+        cross a schedule boundary are split into a dose per basal rate
+
+    Arguments:
+    timeline -- DoseTimeline of the doses
+
+    basal_starts -- list of times the basal rates start at
+    basal_rates -- list of basal rates(U/hr)
+    basal_minutes -- list of basal lengths (in mins)
+
+    Output:
+    DoseTimeline of the annotated doses
+    """
+    assert len(basal_starts) == len(basal_rates) == len(basal_minutes),\
+        "expected input shapes to match"
+
+    if not len(timeline) or not basal_starts:
+        return timeline[0:0]
+
+    # only the basals need the schedule; everything else is scheduled at 0
+    is_basal = numpy.isin(timeline.types, BASAL_TYPE_CODES)
+    basal_timeline = timeline[is_basal]
+
+    schedule_seconds = [
+        start.hour * 3600 + start.minute * 60 + start.second
+        for start in basal_starts
+    ]
+    # the schedule can be split with the seconds unless the dose dates are
+    # in a timezone with changing UTC offsets (or the schedule is unsorted)
+    if ((timeline.tzinfo is None or isinstance(timeline.tzinfo, timezone))
+            and all(
+                schedule_seconds[i] < schedule_seconds[i+1]
+                for i in range(0, len(schedule_seconds) - 1)
+            )):
+        (counts,
+         starts,
+         ends,
+         scheduled_rates,
+         delivered_units
+         ) = split_by_schedule(basal_timeline, schedule_seconds, basal_rates)
+    else:
+        (counts,
+         starts,
+         ends,
+         scheduled_rates,
+         delivered_units
+         ) = split_by_schedule_dates(
+             basal_timeline, basal_starts, basal_rates, basal_minutes
+         )
+
+    dose_counts = numpy.ones(len(timeline), dtype=numpy.int64)
+    dose_counts[is_basal] = counts
+    output = timeline[numpy.repeat(numpy.arange(len(timeline)), dose_counts)]
+    output.scheduled_rates[:] = 0
+
+    is_annotated = numpy.repeat(is_basal, dose_counts)
+    output.starts[is_annotated] = starts
+    output.ends[is_annotated] = ends
+    output.scheduled_rates[is_annotated] = scheduled_rates
+    output.delivered_units[is_annotated] = delivered_units
+
+    return output
+
+
+def split_by_schedule(
+        timeline,
+        schedule_seconds, basal_rates,
+        repeat_interval=24
+        ):
+    """ Split basals where the scheduled basal rate changes, with the same
+        results as insulin_math.annotate_individual_dose
+
+    Arguments:
+    timeline -- DoseTimeline of the basals
+    schedule_seconds -- increasing start times of the basal rates (seconds
+                        since midnight)
+    basal_rates -- list of basal rates(U/hr)
+    repeat_interval -- the duration over which the rates repeat themselves
+                       (24 hours by default)
+
+    Output:
+    Tuple in format (number of doses each basal is split into, start times,
+    end times, scheduled basal rates, delivered units) of the split doses
+    """
+    day = repeat_interval * 3600
+    boundaries = numpy.array(schedule_seconds, dtype=numpy.int64)
+    # the schedule repeats from the start of its first entry
+    reference = boundaries[0]
+
+    def segment(times):
+        """ Index of the schedule entry at each time, counting every entry
+            of every day
+        """
+        days = (times - reference) // day
+        return (
+            days * len(boundaries)
+            + numpy.searchsorted(boundaries, times - days * day, "right") - 1
+        )
+
+    def segment_start(segments):
+        return (
+            segments // len(boundaries) * day
+            + boundaries[segments % len(boundaries)]
+        )
+
+    durations = timeline.ends - timeline.starts
+    first_segments = segment(timeline.starts)
+    # a basal that ends where a rate starts gets a zero-length dose at that
+    # rate, unless the rate is the first one of the day
+    last_segments = segment(timeline.ends) - (
+        ((timeline.ends - reference) % day == 0) & (durations > 0)
+    )
+    counts = numpy.where(
+        durations >= 0, last_segments - first_segments + 1, 0
+    )
+
+    doses = numpy.repeat(numpy.arange(len(timeline)), counts)
+    pieces = (
+        numpy.arange(len(doses))
+        - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    )
+    segments = first_segments[doses] + pieces
+
+    starts = numpy.where(
+        pieces == 0, timeline.starts[doses], segment_start(segments)
+    )
+    ends = numpy.where(
+        pieces == counts[doses] - 1,
+        timeline.ends[doses],
+        segment_start(segments + 1)
+    )
+
+    # each piece's delivered units are a fraction of the previous piece's
+    fractions = (ends - starts) / numpy.where(
+        durations > 0, durations, 1
+    )[doses]
+    delivered_units = timeline.delivered_units[doses] * fractions
+    for piece in range(1, max(counts, default=0)):
+        rows = numpy.flatnonzero(pieces == piece)
+        delivered_units[rows] = delivered_units[rows - 1] * fractions[rows]
+
+    return (
+        counts,
+        starts,
+        ends,
+        numpy.asarray(basal_rates, dtype=numpy.float64)[
+            segments % len(boundaries)
+        ],
+        delivered_units
+    )
+
+
+def split_by_schedule_dates(
+        timeline,
+        basal_starts, basal_rates, basal_minutes
+        ):
+    """ Split basals where the scheduled basal rate changes, using
+        insulin_math.annotate_individual_dose on the dates of each basal
+
+    Arguments:
+    timeline -- DoseTimeline of the basals
+    basal_starts -- list of times the basal rates start at
+    basal_rates -- list of basal rates(U/hr)
+    basal_minutes -- list of basal lengths (in mins)
+
+    Output:
+    Tuple in format (number of doses each basal is split into, start times,
+    end times, scheduled basal rates, delivered units) of the split doses
+    """
+    annotations = [
+        annotate_individual_dose(
+            DOSE_TYPES[type_], start, end, value, delivered_unit,
+            basal_starts, basal_rates, basal_minutes,
+            convert_to_units_hr=False
+        ) for (type_, start, end, value, delivered_unit) in zip(
+            timeline.types.tolist(),
+            timeline.start_dates(),
+            timeline.end_dates(),
+            timeline.values.tolist(),
+            timeline.delivered_unit_list()
+        )
+    ]
+
+    (starts,
+     ends,
+     scheduled_rates,
+     delivered_units
+     ) = [
+         [item for annotation in annotations for item in annotation[column]]
+         for column in [1, 2, 4, 5]
+     ]
+
+    return (
+        [len(annotation[0]) for annotation in annotations],
+        seconds_since_reference_date(starts),
+        seconds_since_reference_date(ends),
+        scheduled_rates,
+        [numpy.nan if unit is None else unit for unit in delivered_units]
+    )
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 22:58:14 2026
+
+Doses stored as a struct of arrays instead of parallel lists of DoseTypes
+and datetimes: int8 dose type codes, int64 start and end times (seconds
+since the reference date), and float64 values, scheduled basal rates, and
+delivered units (NaN where the delivered units aren't known).
+"""
+import numpy
+
+from pyloopkit.date import (seconds_since_reference_date,
+                            dates_from_seconds_since_reference_date)
+from pyloopkit.dose import DoseType
+from pyloopkit.dose_entry import MINIMUM_MINIMED_INCREMENT
+
+# dose types, indexed by their codes
+DOSE_TYPES = sorted(DoseType, key=lambda type_: type_.value)
+
+
+class DoseTimeline:
+    """ A collection of doses with one array per dose property
+
+        Slicing a timeline returns a timeline of views of the same arrays;
+        indexing it with a mask or an array of indexes returns a copy.
+
+    Arguments:
+    types -- dose type codes (DoseType values)
+    starts -- start times of the doses (seconds since the reference date)
+    ends -- end times of the doses (seconds since the reference date)
+    values -- basal rates of the doses in U/hr (if a basal) or the value
+              of the boluses in U
+    scheduled_rates -- basal rates scheduled during the doses (U/hr), or
+                       None if they haven't been annotated (all 0)
+    delivered_units -- units actually delivered by the doses (NaN if
+                       unknown), or None if none are known
+    tzinfo -- timezone of the dose dates (None if they are naive)
+    """
+    def __init__(
+            self, types, starts, ends, values,
+            scheduled_rates=None,
+            delivered_units=None,
+            tzinfo=None
+        ):
+        self.types = numpy.asarray(types, dtype=numpy.int8)
+        self.starts = numpy.asarray(starts, dtype=numpy.int64)
+        self.ends = numpy.asarray(ends, dtype=numpy.int64)
+        self.values = numpy.asarray(values, dtype=numpy.float64)
+        self.scheduled_rates = (
+            numpy.zeros(len(self.types)) if scheduled_rates is None
+            else numpy.asarray(scheduled_rates, dtype=numpy.float64)
+        )
+        self.delivered_units = (
+            numpy.full(len(self.types), numpy.nan) if delivered_units is None
+            else numpy.asarray(delivered_units, dtype=numpy.float64)
+        )
+        self.tzinfo = tzinfo
+
+        assert len(self.types) == len(self.starts) == len(self.ends)\
+            == len(self.values) == len(self.scheduled_rates)\
+            == len(self.delivered_units),\
+            "expected input shapes to match"
+
+    @classmethod
+    def from_lists(
+            cls, types, starts, ends, values,
+            scheduled_rates=None,
+            delivered_units=None
+        ):
+        """ Create a timeline from the lists used by the rest of pyloopkit
+
+        Arguments:
+        types -- list of types of dose (basal, bolus, etc)
+        starts -- start dates of the doses (datetime obj)
+        ends -- end dates of the doses (datetime obj)
+        values -- actual basal rates of doses in U/hr (if a basal)
+                  or the value of the boluses in U
+        scheduled_rates -- basal rates scheduled during the doses (optional)
+        delivered_units -- units actually delivered by the doses, None if
+                           unknown (optional)
+
+        Output:
+        DoseTimeline of the doses
+        """
+        assert len(types) == len(starts) == len(ends) == len(values),\
+            "expected input shapes to match"
+
+        return cls(
+            [type_.value for type_ in types],
+            seconds_since_reference_date(starts),
+            seconds_since_reference_date(ends),
+            values,
+            scheduled_rates,
+            None if delivered_units is None else [
+                numpy.nan if unit is None else unit
+                for unit in delivered_units
+            ],
+            tzinfo=starts[0].tzinfo if starts else None
+        )
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        """ Get the doses at a slice, mask, or array of indexes """
+        return DoseTimeline(
+            self.types[index],
+            self.starts[index],
+            self.ends[index],
+            self.values[index],
+            self.scheduled_rates[index],
+            self.delivered_units[index],
+            tzinfo=self.tzinfo
+        )
+
+    def dose_types(self):
+        """ Get the DoseTypes of the doses """
+        return [DOSE_TYPES[code] for code in self.types.tolist()]
+
+    def start_dates(self):
+        """ Get the start dates of the doses as datetimes """
+        return dates_from_seconds_since_reference_date(
+            self.starts, self.tzinfo
+        )
+
+    def end_dates(self):
+        """ Get the end dates of the doses as datetimes """
+        return dates_from_seconds_since_reference_date(
+            self.ends, self.tzinfo
+        )
+
+    def delivered_unit_list(self):
+        """ Get the delivered units of the doses, None where unknown """
+        return [
+            None if numpy.isnan(unit) else unit
+            for unit in self.delivered_units.tolist()
+        ]
+
+    def to_lists(self):
+        """ Get the doses as the lists used by the rest of pyloopkit
+
+        Output:
+        Tuple in format (types, start dates, end dates, values,
+        scheduled basal rates, delivered units)
+        """
+        return (
+            self.dose_types(),
+            self.start_dates(),
+            self.end_dates(),
+            self.values.tolist(),
+            self.scheduled_rates.tolist(),
+            self.delivered_unit_list()
+        )
+
+    def sorted(self):
+        """ Sort the doses by start time; doses with the same start time
+            keep their order, and a timeline that is already sorted is
+            returned as it is (without copying)
+        """
+        if numpy.all(self.starts[1:] >= self.starts[:-1]):
+            return self
+
+        return self[numpy.argsort(self.starts, kind="stable")]
+
+    def between(self, start=None, end=None):
+        """ Get the doses that end at or after start and start at or before
+            end (like dose_math.filter_date_range_for_doses)
+
+        Arguments:
+        start -- earliest time to include (seconds since the reference date)
+        end -- latest time to include (seconds since the reference date)
+
+        Output:
+        DoseTimeline of the doses in the range (this timeline, if every dose
+        is in the range)
+        """
+        included = numpy.ones(len(self), dtype=bool)
+        if start is not None:
+            included &= self.ends >= start
+        if end is not None:
+            included &= self.starts <= end
+
+        if numpy.all(included):
+            return self
+
+        return self[included]
+
+    def trimmed(self, start=None, end=None):
+        """ Trim the doses to be within an interval, scaling their delivered
+            units (like insulin_math.trim)
+
+        Arguments:
+        start -- start of the interval (seconds since the reference date)
+        end -- end of the interval (seconds since the reference date)
+
+        Output:
+        DoseTimeline of the trimmed doses
+        """
+        starts = (
+            self.starts if start is None
+            else numpy.maximum(self.starts, start)
+        )
+        ends = numpy.maximum(
+            starts,
+            self.ends if end is None else numpy.minimum(self.ends, end)
+        )
+
+        durations = self.ends - self.starts
+        has_duration = durations > 0
+        delivered_units = numpy.where(
+            has_duration,
+            self.delivered_units * (
+                (ends - starts) / numpy.where(has_duration, durations, 1)
+            ),
+            self.delivered_units
+        )
+
+        return DoseTimeline(
+            self.types, starts, ends, self.values,
+            self.scheduled_rates, delivered_units,
+            tzinfo=self.tzinfo
+        )
+
+    def net_basal_units(self):
+        """ Find the units of insulin delivered by each dose, net of the
+            scheduled basal rate (like dose_entry.net_basal_units)
+
+        Output:
+        numpy array of net units
+        """
+        hours = numpy.abs(self.ends - self.starts) / 3600
+        is_known = ~numpy.isnan(self.delivered_units)
+
+        scheduled_units = numpy.where(
+            self.types == DoseType.suspend.value,
+            -self.scheduled_rates * hours,
+            (self.values - self.scheduled_rates) * hours
+        )
+        units = numpy.where(
+            is_known & (self.delivered_units != 0),
+            self.delivered_units - self.scheduled_rates * hours,
+            numpy.round(scheduled_units * MINIMUM_MINIMED_INCREMENT)
+            / MINIMUM_MINIMED_INCREMENT
+        )
+        units = numpy.where(hours <= 0, 0, units)
+        units = numpy.where(self.types == DoseType.basal.value, 0, units)
+
+        return numpy.where(
+            self.types == DoseType.bolus.value,
+            numpy.where(is_known, self.delivered_units, self.values),
+            units
+        )
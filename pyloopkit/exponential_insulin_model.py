@@ -12,6 +12,8 @@ ExponentialInsulinModel.swift
 # pylint: disable=C0103
 import math
 
+import numpy
+
 
 def percent_effect_remaining(time, action_duration, peak_activity_time):
     """ Returns the percentage of total insulin effect remaining at a specified
@@ -43,3 +45,34 @@ def percent_effect_remaining(time, action_duration, peak_activity_time):
 
     return 1 - S * (1 - a) * ((pow(time, 2) / (tau * action_duration * (1 - a))
                                - time / tau - 1) * math.exp(-time / tau) + 1)
+
+
+def vectorized_percent_effect_remaining(
+        times, action_duration, peak_activity_time
+    ):
+    """ Array version of percent_effect_remaining
+
+    Arguments:
+    times -- array of the minutes after insulin delivery (can be negative)
+    action_duration -- the total duration on insulin activity (DIA)
+    peak_activity_time -- the time (in minutes) of the peak of insulin activity
+                          from dose
+
+    Output:
+    numpy array of the percentage of total insulin effect remaining at each
+    time
+    """
+    times = numpy.asarray(times, dtype=numpy.float64)
+
+    tau = (peak_activity_time * (1 - peak_activity_time / action_duration) /
+           (1 - 2 * peak_activity_time / action_duration)
+           )
+    a = 2 * tau / action_duration
+    S = 1 / (1 - a + (1 + a) * math.exp(-action_duration / tau))
+
+    remaining = 1 - S * (1 - a) * (
+        (numpy.power(times, 2) / (tau * action_duration * (1 - a))
+         - times / tau - 1) * numpy.exp(-times / tau) + 1)
+
+    remaining = numpy.where(times <= 0, 1.0, remaining)
+    return numpy.where(times > action_duration, 0.0, remaining)
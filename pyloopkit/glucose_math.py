@@ -44,16 +44,29 @@ def linear_regression(x_list, y_list):
         sum_x_squared += x * x
         sum_y_squared += y * y
 
-    try:
-        slope = (((count * sum_xy) - (sum_x * sum_y)) /
-                 ((count * sum_x_squared) - (sum_x * sum_x)))
+    # I didn't include the intercept because it was unused
+    return regression_slope(count, sum_x, sum_y, sum_xy, sum_x_squared)
+
+
+def regression_slope(count, sum_x, sum_y, sum_xy, sum_x_squared):
+    """ Calculates the slope of a linear regression from its sums
+
+    Arguments:
+    count -- number of (x, y) values
+    sum_x -- sum of the x values
+    sum_y -- sum of the y values
+    sum_xy -- sum of the products of the x and y values
+    sum_x_squared -- sum of the squares of the x values
 
-        # I didn't include the intercept because it was unused
+    Output:
+    The slope, or NaN if the x values are all the same
+    """
+    try:
+        return (((count * sum_xy) - (sum_x * sum_y)) /
+                ((count * sum_x_squared) - (sum_x * sum_x)))
     except ZeroDivisionError:
         return float('NaN')
 
-    return slope
-
 
 def is_calibrated(display_list):
     """ Checks if no calibration entries are present
@@ -145,9 +158,6 @@ def linear_momentum_effect(
 
     first_time = date_list[0]
     last_time = date_list[-1]
-    (start_date, end_date) = simulation_date_range_for_samples(
-        [last_time], [], duration, delta
-    )
 
     def create_times(time):
         return abs(time_interval_since(time, first_time))
@@ -156,6 +166,35 @@ def linear_momentum_effect(
         list(map(create_times, date_list)), glucose_value_list
     )
 
+    return momentum_effect_from_slope(
+        last_time, slope, duration, delta, settings_dictionary
+    )
+
+
+def momentum_effect_from_slope(
+        last_time, slope,
+        duration=30,
+        delta=5,
+        settings_dictionary=None
+    ):
+    """ Calculates the momentum effect of a glucose trend
+
+    Arguments:
+    last_time -- date of the last glucose value (datetime object)
+    slope -- the glucose trend (mg/dL/s)
+    duration -- the duration of the effects
+    delta -- the time differential for the returned values
+    settings_dictionary -- optional settings; the slope is clamped to the
+                           "max_physiologic_slope" (mg/dL/min), if there is
+                           one
+
+    Output:
+    tuple with format (date_of_glucose_effect, value_of_glucose_effect)
+    """
+    (start_date, end_date) = simulation_date_range_for_samples(
+        [last_time], [], duration, delta
+    )
+
     if settings_dictionary is not None and settings_dictionary.get("max_physiologic_slope"):
         slope_mgdL_min = slope * 60
         clamped_slope_mgdL_min = min(slope_mgdL_min, settings_dictionary.get("max_physiologic_slope"))
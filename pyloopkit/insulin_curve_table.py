@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:02:17 2026
+
+Precomputed insulin curves, so the percent of effect remaining for a dose
+can be looked up instead of recomputing the model on every call.
+"""
+from functools import lru_cache
+from math import ceil, floor
+
+import numpy
+
+from pyloopkit.vectorized_insulin_math import percent_effect_remaining_for_model
+
+# number of curve tables (one per model/delay/delta) kept in memory
+INSULIN_CURVE_TABLE_CACHE_SIZE = 64
+
+
+class InsulinCurveTable:
+    """ The percent of insulin effect remaining after a dose, sampled every
+        `resolution` seconds from the time the dose was delivered until the
+        end of its activity
+
+        The table also keeps running sums of the activity (1 - percent
+        effect remaining) over samples spaced `delta` apart, so the effect of
+        a continuous dose (split into delta-long segments in insulin_math)
+        can be found with a constant number of lookups
+
+    Arguments:
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    delay -- the time to delay the dose effect (mins)
+    delta -- the differential between timeline entries (mins)
+    resolution -- seconds between precomputed points of the curve
+    """
+    def __init__(self, model, delay=10, delta=5, resolution=1):
+        self.model = tuple(model)
+        self.delay = delay
+        self.delta = delta
+        self.resolution = resolution
+
+        # the model duration, in minutes
+        self.duration = model[0] * 60 if len(model) == 1 else model[0]
+
+        point_count = ceil((self.duration + delay) * 60 / resolution) + 1
+        self.values = percent_effect_remaining_for_model(
+            (numpy.arange(point_count) * resolution - delay * 60) / 60,
+            model
+        )
+        # Python floats are faster than numpy scalars for single lookups
+        self.value_list = self.values.tolist()
+        self.last_index = point_count - 1
+        self.positions = numpy.arange(point_count)
+
+        self.stride = delta * 60 / resolution
+        assert self.stride == int(self.stride),\
+            "expected the delta to be a multiple of the resolution"
+        self.stride = int(self.stride)
+
+        # the activity is 1 once the curve has ended; the extra stride of
+        # ones makes every point within a stride of the end a whole stride
+        # past the curve
+        activity = numpy.ones(
+            (ceil(point_count / self.stride) + 1) * self.stride
+        )
+        activity[:point_count] = 1 - self.values
+        self.activity_sums = numpy.cumsum(
+            activity.reshape(-1, self.stride),
+            axis=0
+        ).ravel()
+        self.activity_sum_list = self.activity_sums.tolist()
+        self.activity_sum_positions = numpy.arange(len(self.activity_sums))
+
+    def percent_effect_remaining(self, seconds):
+        """ Percent of insulin effect remaining
+
+        Arguments:
+        seconds -- seconds since the dose was delivered (the delay is
+                   applied by the table); a number or a numpy array
+
+        Output:
+        The percent of effect remaining; exact at multiples of the resolution
+        and linearly interpolated between them
+        """
+        if isinstance(seconds, numpy.ndarray):
+            return numpy.interp(
+                seconds / self.resolution,
+                self.positions,
+                self.values,
+                left=1.0,
+                right=0.0
+            )
+
+        position = seconds / self.resolution
+        if position <= 0:
+            return 1
+        if position > self.last_index:
+            return 0
+        if position == self.last_index:
+            return self.value_list[self.last_index]
+
+        index = int(position)
+        fraction = position - index
+        if fraction == 0:
+            return self.value_list[index]
+
+        return (self.value_list[index]
+                + (self.value_list[index + 1] - self.value_list[index])
+                * fraction)
+
+    def cumulative_activity(self, seconds):
+        """ The activity (1 - percent effect remaining) at a time, plus the
+            activity at every delta-spaced time before it
+
+        Arguments:
+        seconds -- seconds since the dose was delivered; a number or a
+                   numpy array
+
+        Output:
+        The summed activity
+        """
+        top = len(self.activity_sums) - 1
+
+        if isinstance(seconds, numpy.ndarray):
+            positions = seconds / self.resolution
+            # every stride past the table adds a fully-active sample
+            wraps = numpy.maximum(
+                numpy.ceil((positions - top) / self.stride),
+                0
+            )
+            return numpy.interp(
+                positions - wraps * self.stride,
+                self.activity_sum_positions,
+                self.activity_sums,
+                left=0.0
+            ) + wraps
+
+        position = seconds / self.resolution
+        if position <= 0:
+            return 0
+
+        wraps = 0
+        if position > top:
+            wraps = ceil((position - top) / self.stride)
+            position -= wraps * self.stride
+
+        index = int(position)
+        fraction = position - index
+        if fraction == 0:
+            return self.activity_sum_list[index] + wraps
+
+        return (self.activity_sum_list[index]
+                + (self.activity_sum_list[index + 1]
+                   - self.activity_sum_list[index])
+                * fraction
+                + wraps)
+
+    def continuous_delivery_effect(self, seconds, dose_duration):
+        """ The fraction of a continuous dose that has been delivered and
+            the fraction of its effect that has been applied; this is the
+            sum over delta-long segments computed by
+            insulin_math.continuous_delivery_glucose_effect, found in
+            constant time
+
+        Arguments:
+        seconds -- seconds since the dose started; a number or a numpy array
+        dose_duration -- length of the dose (seconds); must be positive
+
+        Output:
+        Tuple in format (fraction of the dose counted so far,
+                         fraction of the dose's effect applied)
+        """
+        delay = self.delay * 60
+        delta = self.delta * 60
+
+        if isinstance(seconds, numpy.ndarray):
+            full_segments = numpy.floor(dose_duration / delta)
+            reached_segments = numpy.floor((seconds + delay) / delta)
+            counts = numpy.maximum(
+                numpy.minimum(reached_segments, full_segments - 1) + 1,
+                0
+            )
+            remainders = numpy.where(
+                reached_segments >= full_segments,
+                dose_duration - full_segments * delta,
+                0
+            )
+
+            activity = delta * (
+                self.cumulative_activity(seconds)
+                - self.cumulative_activity(seconds - counts * delta)
+            ) + remainders * (1 - self.percent_effect_remaining(
+                seconds - full_segments * delta
+            ))
+
+            return (
+                (counts * delta + remainders) / dose_duration,
+                activity / dose_duration
+            )
+
+        full_segments = floor(dose_duration / delta)
+        reached_segments = floor((seconds + delay) / delta)
+        count = max(0, min(reached_segments, full_segments - 1) + 1)
+
+        delivered = count * delta
+        activity = delta * (
+            self.cumulative_activity(seconds)
+            - self.cumulative_activity(seconds - count * delta)
+        )
+
+        # the last segment may be shorter than the delta
+        if reached_segments >= full_segments:
+            remainder = dose_duration - full_segments * delta
+            delivered += remainder
+            activity += remainder * (1 - self.percent_effect_remaining(
+                seconds - full_segments * delta
+            ))
+
+        return (delivered / dose_duration, activity / dose_duration)
+
+
+@lru_cache(maxsize=INSULIN_CURVE_TABLE_CACHE_SIZE)
+def cached_insulin_curve_table(model, delay, delta, resolution):
+    """ Build (or reuse) the curve table for a hashable model tuple """
+    return InsulinCurveTable(model, delay, delta, resolution)
+
+
+def get_insulin_curve_table(model, delay=10, delta=5, resolution=1):
+    """ Get the curve table for an insulin model, building it if it isn't
+        among the most recently used tables
+
+    Arguments:
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    delay -- the time to delay the dose effect (mins)
+    delta -- the differential between timeline entries (mins)
+    resolution -- seconds between precomputed points of the curve
+
+    Output:
+    InsulinCurveTable
+    """
+    return cached_insulin_curve_table(tuple(model), delay, delta, resolution)
+
+
+def clear_insulin_curve_tables():
+    """ Drop all cached curve tables """
+    cached_insulin_curve_table.cache_clear()
@@ -13,9 +13,12 @@ from math import floor
 from datetime import timedelta, datetime
 import sys
 
-from pyloopkit.date import time_interval_since, time_interval_since_reference_date
+from pyloopkit.date import (time_interval_since,
+                            time_interval_since_reference_date,
+                            seconds_since_reference_date)
 from pyloopkit.dose import DoseType
-from pyloopkit.loop_math import simulation_date_range_for_samples
+from pyloopkit.loop_math import (simulation_date_range_for_samples,
+                                 simulation_timeline_for_samples)
 from pyloopkit.dose_entry import net_basal_units, total_units_given
 from pyloopkit.exponential_insulin_model import percent_effect_remaining
 from pyloopkit.walsh_insulin_model import walsh_percent_effect_remaining
@@ -641,7 +644,8 @@ def insulin_on_board(
         start=None,
         end=None,
         delay=10,
-        delta=5
+        delta=5,
+        curve_table=None
     ):
     """ Calculates the timeline of insulin remaining for a collection of doses
 
@@ -662,6 +666,8 @@ def insulin_on_board(
     end -- datetime object of time to end the IOB timeline
     delay -- the time to delay the dose effect
     delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable built for the same model, delay
+                   and delta, used instead of evaluating the model directly
 
     Output:
     Tuple in format (times_iob_was_calculated_at, iob_values (U of insulin))
@@ -670,6 +676,9 @@ def insulin_on_board(
         len(values) == len(scheduled_basal_rates) == len(delivered_units),\
         "expected input shapes to match"
 
+    assert is_matching_curve_table(curve_table, model, delay, delta),\
+        "expected curve table to match the model, delay, and delta"
+
     if not dose_types:
         return ([], [])
 
@@ -710,7 +719,8 @@ def insulin_on_board(
             date,
             model,
             delay,
-            delta
+            delta,
+            curve_table
             )
 
     while date <= end:
@@ -732,7 +742,8 @@ def insulin_on_board_calc(
         date,
         model,
         delay,
-        delta
+        delta,
+        curve_table=None
     ):
     """ Calculates the insulin on board for a specific dose at a specific time
 
@@ -748,6 +759,7 @@ def insulin_on_board_calc(
     model -- list of insulin model parameters in format [DIA, peak_time]
     delay -- the time to delay the dose effect
     delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
 
     Output:
     IOB at date
@@ -757,6 +769,33 @@ def insulin_on_board_calc(
     if start_date > end_date or time < 0:
         return 0
 
+    if curve_table:
+        if time_interval_since(end_date, start_date) <= 1.05 * delta * 60:
+            return net_basal_units(
+                type_,
+                value,
+                start_date,
+                end_date,
+                scheduled_basal_rate,
+                delivered_units
+                ) * curve_table.percent_effect_remaining(time)
+
+        return net_basal_units(
+            type_,
+            value,
+            start_date,
+            end_date,
+            scheduled_basal_rate,
+            delivered_units) * continuous_delivery_insulin_on_board(
+                start_date,
+                end_date,
+                date,
+                model,
+                delay,
+                delta,
+                curve_table
+                )
+
     if len(model) == 1:  # walsh model
         if time_interval_since(end_date, start_date) <= 1.05 * delta * 60:
             return net_basal_units(
@@ -824,7 +863,8 @@ def continuous_delivery_insulin_on_board(
         at_date,
         model,
         delay,
-        delta
+        delta,
+        curve_table=None
     ):
     """ Calculates the percent of original insulin that is still on board
          at a specific time for a dose given over a period greater than
@@ -837,6 +877,7 @@ def continuous_delivery_insulin_on_board(
     model -- list of insulin model parameters in format [DIA, peak_time]
     delay -- the time to delay the dose effect
     delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
 
     Output:
     Percentage of insulin remaining at the at_date
@@ -849,6 +890,13 @@ def continuous_delivery_insulin_on_board(
         return 0
 
     time = time_interval_since(at_date, start_date)
+
+    if curve_table and dose_duration > 0:
+        (delivered,
+         activity
+         ) = curve_table.continuous_delivery_effect(time, dose_duration)
+        return delivered - activity
+
     iob = 0
     dose_date = 0
 
@@ -863,7 +911,11 @@ def continuous_delivery_insulin_on_board(
                 - dose_date) / dose_duration)
         else:
             segment = 1
-        if len(model) == 1:  # if walsh model
+        if curve_table:
+            iob += segment * curve_table.percent_effect_remaining(
+                time - dose_date
+                )
+        elif len(model) == 1:  # if walsh model
             iob += segment * walsh_percent_effect_remaining(
                 (time - delay - dose_date) / 60,
                 model[0]
@@ -893,7 +945,10 @@ def glucose_effects(
         delay=10,
         delta=5,
         start=None,
-        end=None
+        end=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        effect_cache=None
         ):
     """ Calculates the timeline of glucose effects for a collection of doses
 
@@ -921,6 +976,12 @@ def glucose_effects(
     start -- datetime to start calculating the effects at
     end -- datetime to end calculation of effects
 
+    curve_table -- optional InsulinCurveTable built for the same model, delay
+                   and delta, used instead of evaluating the model directly
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    effect_cache -- optional DoseEffectCache to reuse the effects of doses
+                    from earlier calls
+
     Output:
     Tuple in format (times_glucose_effect_was_calculated_at,
                      glucose_effect_values (mg/dL))
@@ -929,63 +990,108 @@ def glucose_effects(
         == len(dose_values) == len(scheduled_basal_rates) == len(delivered_units),\
         "expected input shapes to match"
 
+    assert is_matching_curve_table(curve_table, model, delay, delta),\
+        "expected curve table to match the model, delay, and delta"
+
     if not dose_types and not (start is not None and end is not None):
         return ([], [])
 
-    if len(model) == 1:  # if using a Walsh model
-        start, end = simulation_date_range_for_samples(
-            start_times=dose_start_dates,
-            end_times=dose_end_dates,
-            duration=model[0] * 60,
-            delay=delay,
-            delta=delta,
-            start=start,
-            end=end
-        )
-    else:
-        start, end = simulation_date_range_for_samples(
-            start_times=dose_start_dates,
-            end_times=dose_end_dates,
-            duration=model[0],
-            delay=delay,
-            delta=delta,
-            start=start,
-            end=end
-        )
-
-    date = start
-    effect_dates = []
-    effect_values = []
+    # the timeline is in integer seconds since the reference date
+    (effect_dates,
+     effect_seconds
+     ) = simulation_timeline_for_samples(
+         start_times=dose_start_dates,
+         end_times=dose_end_dates,
+         duration=model[0] * 60 if len(model) == 1 else model[0],
+         delay=delay,
+         delta=delta,
+         start=start,
+         end=end
+         )
+    effect_seconds = effect_seconds.tolist()
 
-    def find_partial_effect(i):
-        sensitivity = find_ratio_at_time(
+    # everything about a dose except the time since it started is the same
+    # at every date of the timeline, so find it once per dose
+    sensitivities = [
+        sensitivity_schedule.value_at(dose_start_date) if sensitivity_schedule
+        else find_ratio_at_time(
             sensitivity_start_times,
             sensitivity_end_times,
             sensitivity_values,
-            dose_start_dates[i]
-        )
-        return glucose_effect(
+            dose_start_date
+        ) for dose_start_date in dose_start_dates
+    ]
+    net_units = [
+        net_basal_units(
             dose_types[i],
+            dose_values[i],
             dose_start_dates[i],
             dose_end_dates[i],
-            dose_values[i],
             scheduled_basal_rates[i],
-            delivered_units[i],
-            date,
+            delivered_units[i]
+        ) for i in range(0, len(dose_start_dates))
+    ]
+    dose_durations = [
+        time_interval_since(dose_end_dates[i], dose_start_dates[i])
+        for i in range(0, len(dose_start_dates))
+    ]
+
+    # doses that don't start on a whole second are timed with their
+    # datetimes
+    dose_seconds = [
+        seconds if dose_start_date.microsecond == 0 else None
+        for (seconds, dose_start_date) in zip(
+            seconds_since_reference_date(dose_start_dates).tolist(),
+            dose_start_dates
+        )
+    ]
+
+    def find_partial_effect(i, k):
+        return dose_glucose_effect(
+            net_units[i],
+            sensitivities[i],
+            float(effect_seconds[k] - dose_seconds[i])
+            if dose_seconds[i] is not None
+            else time_interval_since(effect_dates[k], dose_start_dates[i]),
+            dose_durations[i],
             model,
-            sensitivity,
             delay,
-            delta
+            delta,
+            curve_table
         )
 
-    while date <= end:
-        effect_sum = 0
+    if effect_cache is not None:
+        # each dose's effect curve is on the absolute-time grid, so only the
+        # times that a dose hasn't been evaluated at (all of them for a new
+        # dose) are calculated, and the timeline is the sum of the curves
+        dose_curves = []
         for i in range(0, len(dose_start_dates)):
-            effect_sum += find_partial_effect(i)
+            cached_effects = effect_cache.dose_effects((
+                dose_types[i], dose_start_dates[i], dose_end_dates[i],
+                dose_values[i], scheduled_basal_rates[i], delivered_units[i],
+                sensitivities[i],
+                tuple(model), delay, delta, curve_table
+            ))
+            for (k, seconds) in enumerate(effect_seconds):
+                if seconds not in cached_effects:
+                    cached_effects[seconds] = find_partial_effect(i, k)
+
+            dose_curves.append(
+                list(map(cached_effects.__getitem__, effect_seconds))
+            )
 
-        effect_dates.append(date)
-        effect_values.append(effect_sum)
-        date += timedelta(minutes=delta)
+        effect_values = (
+            [sum(effects) for effects in zip(*dose_curves)] if dose_curves
+            else [0 for seconds in effect_seconds]
+        )
+    else:
+        effect_values = []
+        for k in range(0, len(effect_seconds)):
+            effect_sum = 0
+            for i in range(0, len(dose_start_dates)):
+                effect_sum += find_partial_effect(i, k)
+
+            effect_values.append(effect_sum)
 
     assert len(effect_dates) == len(effect_values),\
         "expected output shapes to match"
@@ -1070,7 +1176,8 @@ def glucose_effect(
         model,
         insulin_sensitivity,
         delay,
-        delta
+        delta,
+        curve_table=None
     ):
     """ Calculates the timeline of glucose effects for a specific dose
 
@@ -1084,11 +1191,62 @@ def glucose_effect(
     insulin_sensitivity -- sensitivity (mg/dL/U)
     delay -- the time to delay the dose effect
     delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
 
     Output:
     Glucose effect (mg/dL)
     """
     time = time_interval_since(date, dose_start_date)
+
+    if time < 0:
+        return 0
+
+    return dose_glucose_effect(
+        net_basal_units(
+            dose_type,
+            dose_value,
+            dose_start_date,
+            dose_end_date,
+            scheduled_basal_rate,
+            delivered_units
+            ),
+        insulin_sensitivity,
+        time,
+        time_interval_since(dose_end_date, dose_start_date),
+        model,
+        delay,
+        delta,
+        curve_table
+    )
+
+
+def dose_glucose_effect(
+        net_units,
+        insulin_sensitivity,
+        time,
+        dose_duration,
+        model,
+        delay,
+        delta,
+        curve_table=None
+    ):
+    """ Calculates the glucose effect of a dose some time after it started
+
+    Arguments:
+    net_units -- units of insulin in the dose, net of the scheduled basal
+                 rate (see dose_entry.net_basal_units)
+    insulin_sensitivity -- sensitivity (mg/dL/U)
+    time -- seconds since the dose started
+    dose_duration -- length of the dose (seconds)
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    Glucose effect (mg/dL)
+    """
     delay *= 60
     delta *= 60
 
@@ -1097,51 +1255,34 @@ def glucose_effect(
 
     # Consider doses within the delta time window as momentary
     # This will normally be for boluses
-    if time_interval_since(
-                dose_end_date,
-                dose_start_date
-            ) <= 1.05 * delta:  # pylint: disable=C0330
+    if dose_duration <= 1.05 * delta:
+        if curve_table:
+            return net_units * -insulin_sensitivity * (
+                1 - curve_table.percent_effect_remaining(time)
+                )
 
         if len(model) == 1:  # walsh model
-            return net_basal_units(
-                dose_type, dose_value,
-                dose_start_date,
-                dose_end_date,
-                scheduled_basal_rate,
-                delivered_units
-                ) * -insulin_sensitivity * (1 - walsh_percent_effect_remaining(
+            return net_units * -insulin_sensitivity * (
+                1 - walsh_percent_effect_remaining(
                     (time - delay) / 60,
                     model[0]
                     ))
 
-        return net_basal_units(
-            dose_type,
-            dose_value,
-            dose_start_date,
-            dose_end_date,
-            scheduled_basal_rate,
-            delivered_units
-            ) * -insulin_sensitivity * (1 - percent_effect_remaining(
+        return net_units * -insulin_sensitivity * (
+            1 - percent_effect_remaining(
                 (time - delay) / 60,
                 model[0],
                 model[1]
                 ))
     # This will normally be for basals, and handles Walsh model automatically
-    return net_basal_units(
-        dose_type,
-        dose_value,
-        dose_start_date,
-        dose_end_date,
-        scheduled_basal_rate,
-        delivered_units
-        ) * -insulin_sensitivity * continuous_delivery_glucose_effect(
-            dose_start_date,
-            dose_end_date,
-            date,
-            model,
-            delay / 60,
-            delta / 60
-            )
+    return net_units * -insulin_sensitivity * continuous_delivery_effect(
+        time,
+        dose_duration,
+        model,
+        delay / 60,
+        delta / 60,
+        curve_table
+        )
 
 
 def continuous_delivery_glucose_effect(
@@ -1149,7 +1290,8 @@ def continuous_delivery_glucose_effect(
         at_date,
         model,
         delay,
-        delta
+        delta,
+        curve_table=None
     ):
     """ Calculates the percent of glucose effect at a specific time for
         a dose given over a period greater than 1.05x the delta
@@ -1162,24 +1304,58 @@ def continuous_delivery_glucose_effect(
     model -- list of insulin model parameters in format [DIA, peak_time]
     delay -- the time to delay the dose effect
     delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
 
     Output:
     Percentage of insulin remaining at the at_date
     """
-    dose_duration = time_interval_since(dose_end_date, dose_start_date)
+    return continuous_delivery_effect(
+        time_interval_since(at_date, dose_start_date),
+        time_interval_since(dose_end_date, dose_start_date),
+        model,
+        delay,
+        delta,
+        curve_table
+    )
+
+
+def continuous_delivery_effect(
+        time,
+        dose_duration,
+        model,
+        delay,
+        delta,
+        curve_table=None
+    ):
+    """ Calculates the percent of glucose effect of a continuous dose some
+        time after it started
+
+    Arguments:
+    time -- seconds since the dose started
+    dose_duration -- length of the dose (seconds)
+    model -- list of insulin model parameters in format [DIA, peak_time]
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    Percentage of insulin remaining at the time
+    """
     delay *= 60
     delta *= 60
 
     if dose_duration < 0:
         return 0
 
-    time = time_interval_since(at_date, dose_start_date)
+    if curve_table and dose_duration > 0:
+        return curve_table.continuous_delivery_effect(time, dose_duration)[1]
+
     activity = 0
     dose_date = 0
+    # the segments of the dose that have started by the time
+    last_dose_date = min(floor((time + delay) / delta) * delta, dose_duration)
 
-    while (dose_date <= min(
-            floor((time + delay) / delta) * delta,
-            dose_duration)):
+    while dose_date <= last_dose_date:
         if dose_duration > 0:
             segment = (max(0,
                            min(dose_date + delta,
@@ -1191,7 +1367,11 @@ def continuous_delivery_glucose_effect(
         else:
             segment = 1
 
-        if len(model) == 1:  # if walsh model
+        if curve_table:
+            activity += segment * (
+                1 - curve_table.percent_effect_remaining(time - dose_date)
+                )
+        elif len(model) == 1:  # if walsh model
             activity += segment * (1 - walsh_percent_effect_remaining(
                 (time - delay - dose_date) / 60,
                 model[0])
@@ -1209,6 +1389,18 @@ def continuous_delivery_glucose_effect(
     return activity
 
 
+def is_matching_curve_table(curve_table, model, delay, delta):
+    """ Check that an (optional) InsulinCurveTable was built for the
+        given model, delay, and delta
+    """
+    return (
+        curve_table is None
+        or (curve_table.model == tuple(model)
+            and curve_table.delay == delay
+            and curve_table.delta == delta)
+    )
+
+
 def trim(
         dose_type, start, end, value, scheduled_basal_rate, delivered_units,
         start_interval=None,
@@ -13,11 +13,16 @@ from datetime import timedelta
 import warnings
 
 from pyloopkit.insulin_math import find_ratio_at_time
-from pyloopkit.carb_store import get_carb_glucose_effects, get_carbs_on_board
+from pyloopkit.carb_store import (CarbAbsorptionState, get_carb_glucose_effects,
+                                  get_carbs_on_board)
+from pyloopkit.compiled_schedule import get_compiled_schedule
 from pyloopkit.date import time_interval_since
 from pyloopkit.dose import DoseType
-from pyloopkit.dose_math import recommended_temp_basal, recommended_bolus, recommended_autobolus
+from pyloopkit.dose_effect_cache import DoseEffectCache
+from pyloopkit.dose_math import (recommended_temp_basal, recommended_bolus,
+                                 recommended_autobolus, glucose_correction)
 from pyloopkit.dose_store import get_glucose_effects
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
 from pyloopkit.glucose_store import (get_recent_momentum_effects,
                            get_counteraction_effects)
 from pyloopkit.input_validation_tools import (
@@ -28,9 +33,10 @@ from pyloopkit.input_validation_tools import (
 from pyloopkit.insulin_math import find_ratio_at_time
 from pyloopkit.loop_math import (combined_sums, decay_effect, subtracting,
                        predict_glucose)
+from pyloopkit.stage_profiler import no_stage
 
 
-def update(input_dict):
+def update(input_dict, effect_cache=None, profiler=None):
     """ Run data through the Loop algorithm and return the predicted glucose
         values, recommended temporary basal, and recommended bolus
 
@@ -88,6 +94,15 @@ def update(input_dict):
                 - the maximum basal rate that Loop is allowed to give
             - "max_bolus"
                 - the maximum bolus that Loop is allowed to give or recommend
+            - "insulin_effect_engine"
+                - the insulin effect implementation to use; "python" (the
+                  default, reference implementation) or "numpy" (batched);
+                  also used for the insulin corrections of the dosing
+                  recommendations
+            - "use_insulin_curve_tables"
+                - whether to look up the insulin model in a precomputed
+                  (1-second resolution) table instead of evaluating it
+                - default is False
 
         "sensitivity_ratio_start_times" -- start times for sensitivity ratios
         "sensitivity_ratio_end_times" -- end times for sensitivity ratios
@@ -115,6 +130,11 @@ def update(input_dict):
         time_to_calculate_at -- the "now" time and the time at which to
             recommend the basal rate and bolus
 
+    effect_cache -- optional DoseEffectCache that keeps the insulin effects of
+        individual doses between runs (see loop_session.py)
+    profiler -- optional StageProfiler to time the stages of the run; its
+        report is added to the output under "profile"
+
     Output:
         Dictionary containing all of the calculated effects, the input
         dictionary, the predicted glucose values, and the recommended
@@ -155,34 +175,58 @@ def update(input_dict):
 
     time_to_calculate_at = input_dict.get("time_to_calculate_at")
 
+    if profiler:
+        profiler.start_cycle()
+    stage = profiler.stage if profiler else no_stage
+
     # check that the inputs make sense before doing math with them
-    if (
-            not are_settings_valid(settings_dictionary)
-            or not are_glucose_readings_valid(
+    with stage("validation"):
+        is_input_valid = (
+            are_settings_valid(settings_dictionary)
+            and are_glucose_readings_valid(
                 glucose_dates, glucose_values,
             )
-            or not are_carb_readings_valid(
+            and are_carb_readings_valid(
                 carb_dates, carb_values, carb_absorptions
             )
-
-            or not are_insulin_doses_valid(
+            and are_insulin_doses_valid(
                 dose_types, dose_starts, dose_ends, dose_values
             )
-            or not is_insulin_sensitivity_schedule_valid(
+            and is_insulin_sensitivity_schedule_valid(
                 sensitivity_starts, sensitivity_ends, sensitivity_values
             )
-            or not are_carb_ratios_valid(
+            and are_carb_ratios_valid(
                 carb_ratio_starts, carb_ratio_values
             )
-            or not are_basal_rates_valid(
+            and are_basal_rates_valid(
                 basal_starts, basal_rates, basal_minutes
             )
-            or not are_correction_ranges_valid(
+            and are_correction_ranges_valid(
                 target_range_starts, target_range_ends,
                 target_range_mins, target_range_maxes
-            )):
+            )
+        )
+
+    if not is_input_valid:
+        if profiler:
+            profiler.finish_cycle()
         return []
 
+    # compile the daily schedules once for all of the lookups in this run
+    # (and reuse them in later runs with the same schedules)
+    sensitivity_schedule = get_compiled_schedule(
+        sensitivity_starts, sensitivity_ends, sensitivity_values
+    )
+    carb_ratio_schedule = get_compiled_schedule(
+        carb_ratio_starts, [], carb_ratio_values
+    )
+    target_min_schedule = get_compiled_schedule(
+        target_range_starts, target_range_ends, target_range_mins
+    )
+    target_max_schedule = get_compiled_schedule(
+        target_range_starts, target_range_ends, target_range_maxes
+    )
+
     last_glucose_date = glucose_dates[-1]
 
     retrospective_start = (
@@ -207,29 +251,29 @@ def update(input_dict):
         momentum_effect_dates = input_dict.get("momentum_effect_dates")
         momentum_effect_values = input_dict.get("momentum_effect_values")
     else:
-        (momentum_effect_dates,
-         momentum_effect_values
-         ) = get_recent_momentum_effects(
-            glucose_dates, glucose_values,
-            next_effect_date,
-            time_to_calculate_at,
-            settings_dictionary.get("momentum_data_interval") or 15,
-            5,
-            settings_dictionary=settings_dictionary
-        )
+        with stage("momentum"):
+            (momentum_effect_dates,
+             momentum_effect_values
+             ) = get_recent_momentum_effects(
+                glucose_dates, glucose_values,
+                next_effect_date,
+                time_to_calculate_at,
+                settings_dictionary.get("momentum_data_interval") or 15,
+                5,
+                settings_dictionary=settings_dictionary
+            )
+
+    insulin_delay = settings_dictionary.get("insulin_delay") or 10
+    curve_table = (
+        get_insulin_curve_table(settings_dictionary.get("model"), insulin_delay)
+        if settings_dictionary.get("use_insulin_curve_tables") else None
+    )
 
-    # calculate previous insulin effects in order to later calculate the
-    # insulin counteraction effects
-    (insulin_effect_dates,
-     insulin_effect_values
-     ) = get_glucose_effects(
-         dose_types, dose_starts, dose_ends, dose_values, dose_delivered_units,
-         next_effect_date,
-         basal_starts, basal_rates, basal_minutes,
-         sensitivity_starts, sensitivity_ends, sensitivity_values,
-         settings_dictionary.get("model"),
-         delay=settings_dictionary.get("insulin_delay") or 10
-         )
+    # the counteraction and prediction effects come from overlapping
+    # timelines of mostly the same doses, so share the dose effects between
+    # them (and between cycles, if the caller keeps the cache)
+    if effect_cache is None:
+        effect_cache = DoseEffectCache()
 
     # calculate future insulin effects for the purposes of predicting glucose
     if (input_dict.get("now_to_dia_insulin_effect_dates") and 
@@ -237,16 +281,21 @@ def update(input_dict):
         now_to_dia_insulin_effect_dates = input_dict.get("now_to_dia_insulin_effect_dates")
         now_to_dia_insulin_effect_values = input_dict.get("now_to_dia_insulin_effect_values")
     else:
-        (now_to_dia_insulin_effect_dates,
-        now_to_dia_insulin_effect_values
-        ) = get_glucose_effects(
-            dose_types, dose_starts, dose_ends, dose_values, dose_delivered_units,
-            time_to_calculate_at,
-            basal_starts, basal_rates, basal_minutes,
-            sensitivity_starts, sensitivity_ends, sensitivity_values,
-            settings_dictionary.get("model"),
-            delay=settings_dictionary.get("insulin_delay") or 10
-            )
+        with stage("insulin_effects"):
+            (now_to_dia_insulin_effect_dates,
+            now_to_dia_insulin_effect_values
+            ) = get_glucose_effects(
+                dose_types, dose_starts, dose_ends, dose_values, dose_delivered_units,
+                time_to_calculate_at,
+                basal_starts, basal_rates, basal_minutes,
+                sensitivity_starts, sensitivity_ends, sensitivity_values,
+                settings_dictionary.get("model"),
+                delay=insulin_delay,
+                engine=settings_dictionary.get("insulin_effect_engine") or "python",
+                curve_table=curve_table,
+                sensitivity_schedule=sensitivity_schedule,
+                effect_cache=effect_cache
+                )
 
     
     if (input_dict.get("counteraction_starts") and 
@@ -257,55 +306,91 @@ def update(input_dict):
         counteraction_values = input_dict.get("counteraction_values")
         counteraction_effects = (counteraction_starts, counteraction_ends, counteraction_values)
 
-    # if our BG data is current and we know the expected insulin effects,
-    # calculate tbe counteraction effects
-    elif next_effect_date < last_glucose_date and insulin_effect_dates:
+    # if our BG data is current, calculate the previous insulin effects in
+    # order to calculate the insulin counteraction effects
+    elif next_effect_date < last_glucose_date:
+        with stage("insulin_effects"):
+            (insulin_effect_dates,
+             insulin_effect_values
+             ) = get_glucose_effects(
+                 dose_types, dose_starts, dose_ends, dose_values, dose_delivered_units,
+                 next_effect_date,
+                 basal_starts, basal_rates, basal_minutes,
+                 sensitivity_starts, sensitivity_ends, sensitivity_values,
+                 settings_dictionary.get("model"),
+                 delay=insulin_delay,
+                 engine=settings_dictionary.get("insulin_effect_engine") or "python",
+                 curve_table=curve_table,
+                 sensitivity_schedule=sensitivity_schedule,
+                 effect_cache=effect_cache
+                 )
+
+        # the counteraction effects need the expected insulin effects
         (counteraction_starts,
          counteraction_ends,
          counteraction_values
-         ) = counteraction_effects = get_counteraction_effects(
-             glucose_dates, glucose_values,
-             next_effect_date,
-             insulin_effect_dates, insulin_effect_values
-             )
+         ) = counteraction_effects = ([], [], [])
+        if insulin_effect_dates:
+            with stage("counteraction"):
+                (counteraction_starts,
+                 counteraction_ends,
+                 counteraction_values
+                 ) = counteraction_effects = get_counteraction_effects(
+                     glucose_dates, glucose_values,
+                     next_effect_date,
+                     insulin_effect_dates, insulin_effect_values
+                     )
     else:
         (counteraction_starts,
          counteraction_ends,
          counteraction_values
          ) = counteraction_effects = ([], [], [])
 
+    # the carb effects and COB are calculated from the absorption of mostly
+    # the same carb entries, so only map the entries to the counteraction
+    # effects once
+    carb_absorption_state = CarbAbsorptionState()
+
     if (input_dict.get("carb_effect_dates") and 
         input_dict.get("carb_effect_values")):
         carb_effect_dates = input_dict.get("carb_effect_dates")
         carb_effect_values = input_dict.get("carb_effect_values")
     else: 
-        (carb_effect_dates,
-        carb_effect_values
-        ) = get_carb_glucose_effects(
-            carb_dates, carb_values, carb_absorptions,
-            retrospective_start,
-            *counteraction_effects if
-            settings_dictionary.get("dynamic_carb_absorption_enabled")
-            is not False else ([], [], []),
-            carb_ratio_starts, carb_ratio_values,
-            sensitivity_starts, sensitivity_ends, sensitivity_values,
-            settings_dictionary.get("default_absorption_times"),
-            delay=settings_dictionary.get("carb_delay") or 10
-            )
+        with stage("carb_effects"):
+            (carb_effect_dates,
+            carb_effect_values
+            ) = get_carb_glucose_effects(
+                carb_dates, carb_values, carb_absorptions,
+                retrospective_start,
+                *counteraction_effects if
+                settings_dictionary.get("dynamic_carb_absorption_enabled")
+                is not False else ([], [], []),
+                carb_ratio_starts, carb_ratio_values,
+                sensitivity_starts, sensitivity_ends, sensitivity_values,
+                settings_dictionary.get("default_absorption_times"),
+                delay=settings_dictionary.get("carb_delay") or 10,
+                carb_ratio_schedule=carb_ratio_schedule,
+                sensitivity_schedule=sensitivity_schedule,
+                absorption_state=carb_absorption_state
+                )
 
-    (cob_dates,
-     cob_values
-     ) = get_carbs_on_board(
-         carb_dates, carb_values, carb_absorptions,
-         time_to_calculate_at,
-         *counteraction_effects if
-         settings_dictionary.get("dynamic_carb_absorption_enabled")
-         is not False else ([], [], []),
-         carb_ratio_starts, carb_ratio_values,
-         sensitivity_starts, sensitivity_ends, sensitivity_values,
-         settings_dictionary.get("default_absorption_times"),
-         delay=settings_dictionary.get("carb_delay") or 10
-         )
+    with stage("carbs_on_board"):
+        (cob_dates,
+         cob_values
+         ) = get_carbs_on_board(
+             carb_dates, carb_values, carb_absorptions,
+             time_to_calculate_at,
+             *counteraction_effects if
+             settings_dictionary.get("dynamic_carb_absorption_enabled")
+             is not False else ([], [], []),
+             carb_ratio_starts, carb_ratio_values,
+             sensitivity_starts, sensitivity_ends, sensitivity_values,
+             settings_dictionary.get("default_absorption_times"),
+             delay=settings_dictionary.get("carb_delay") or 10,
+             carb_ratio_schedule=carb_ratio_schedule,
+             sensitivity_schedule=sensitivity_schedule,
+             absorption_state=carb_absorption_state
+             )
 
     current_cob = cob_values[
         closest_prior_to_date(
@@ -315,18 +400,19 @@ def update(input_dict):
         ] if cob_dates else 0
 
     if settings_dictionary.get("retrospective_correction_enabled"):
-        (retrospective_effect_dates,
-         retrospective_effect_values
-         ) = update_retrospective_glucose_effect(
-            glucose_dates, glucose_values,
-            carb_effect_dates, carb_effect_values,
-            counteraction_starts, counteraction_ends, counteraction_values,
-            settings_dictionary.get("recency_interval") or 15,
-            settings_dictionary.get(
-                "retrospective_correction_grouping_interval"
-            ) or 30,
-            time_to_calculate_at
-            )
+        with stage("retrospective_correction"):
+            (retrospective_effect_dates,
+             retrospective_effect_values
+             ) = update_retrospective_glucose_effect(
+                glucose_dates, glucose_values,
+                carb_effect_dates, carb_effect_values,
+                counteraction_starts, counteraction_ends, counteraction_values,
+                settings_dictionary.get("recency_interval") or 15,
+                settings_dictionary.get(
+                    "retrospective_correction_grouping_interval"
+                ) or 30,
+                time_to_calculate_at
+                )
     else:
         (retrospective_effect_dates,
          retrospective_effect_values
@@ -350,7 +436,15 @@ def update(input_dict):
         minimum_autobolus=settings_dictionary.get("minimum_autobolus"),
         maximum_autobolus=settings_dictionary.get("maximum_autobolus"),
         partial_application_factor=settings_dictionary.get("partial_application_factor"),
-        rate_rounder=settings_dictionary.get("rate_rounder")
+        rate_rounder=settings_dictionary.get("rate_rounder"),
+        curve_table=curve_table,
+        sensitivity_schedule=sensitivity_schedule,
+        target_min_schedule=target_min_schedule,
+        target_max_schedule=target_max_schedule,
+        correction_engine=(
+            settings_dictionary.get("insulin_effect_engine") or "python"
+        ),
+        profiler=profiler
         )
 
     recommendations["insulin_effect_dates"] = now_to_dia_insulin_effect_dates
@@ -377,6 +471,9 @@ def update(input_dict):
     recommendations["cob_timeline_values"] = cob_values
     recommendations["input_data"] = input_dict
 
+    if profiler:
+        recommendations["profile"] = profiler.finish_cycle()
+
     return recommendations
 
 
@@ -559,7 +656,13 @@ def update_predicted_glucose_and_recommended_basal_and_bolus(
         minimum_autobolus=0,
         maximum_autobolus=None,
         partial_application_factor=0.4,
-        rate_rounder=None
+        rate_rounder=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        target_min_schedule=None,
+        target_max_schedule=None,
+        correction_engine="python",
+        profiler=None
         ):
     """ Generate glucose predictions, then use the predicted glucose along
         with settings and dose data to recommend a temporary basal rate and
@@ -613,6 +716,15 @@ def update_predicted_glucose_and_recommended_basal_and_bolus(
                              should be continued with a new command (mins)
     rate_rounder -- the smallest fraction of a unit supported in basal
                     delivery; if None, no rounding is performed
+    curve_table -- optional InsulinCurveTable for the model, used for the
+                   insulin correction
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    target_min_schedule -- optional CompiledSchedule of the target minimums
+    target_max_schedule -- optional CompiledSchedule of the target maximums
+    correction_engine -- name of the insulin correction implementation to
+                         use (see dose_math.INSULIN_CORRECTION_ENGINES)
+    profiler -- optional StageProfiler to time the predictions and
+                recommendations with
 
     Output:
     The predicted glucose values, recommended temporary basal, and
@@ -634,13 +746,16 @@ def update_predicted_glucose_and_recommended_basal_and_bolus(
         warnings.warn("Warning: expected to receive effect data")
         return (None, None, None)
 
-    predicted_glucoses_basal = predict_glucose(
-        glucose_dates[-1], glucose_values[-1],
-        momentum_dates, momentum_values,
-        carb_effect_dates, carb_effect_values,
-        insulin_effect_dates, insulin_effect_values,
-        retrospective_effect_dates, retrospective_effect_values
-        )
+    stage = profiler.stage if profiler else no_stage
+
+    with stage("prediction"):
+        predicted_glucoses_basal = predict_glucose(
+            glucose_dates[-1], glucose_values[-1],
+            momentum_dates, momentum_values,
+            carb_effect_dates, carb_effect_values,
+            insulin_effect_dates, insulin_effect_values,
+            retrospective_effect_dates, retrospective_effect_values
+            )
 
     # Dosing requires prediction entries at least as long as the insulin
     # model duration. If our prediction is shorter than that, extend it here.
@@ -659,21 +774,6 @@ def update_predicted_glucose_and_recommended_basal_and_bolus(
         last_temp_basal
     )
 
-    temp_basal = recommended_temp_basal(
-        *predicted_glucoses_basal,
-        target_starts, target_ends, target_mins, target_maxes,
-        at_date,
-        suspend_threshold,
-        sensitivity_starts, sensitivity_ends, sensitivity_values,
-        model,
-        basal_starts, basal_rates, basal_minutes,
-        max_basal_rate,
-        last_temp_basal,
-        duration,
-        continuation_interval,
-        rate_rounder
-        )
-
     # ======= CS Aug 6: Proposed Algorithm Changes from iCGM Analysis =========
     # ======= All positive RC and Momentum for bolus only are removed from predictions ========
     (retrospective_effect_dates_bolus, retrospective_effect_values_bolus) = (retrospective_effect_dates, retrospective_effect_values)
@@ -688,40 +788,101 @@ def update_predicted_glucose_and_recommended_basal_and_bolus(
          momentum_effect_values_bolus
          ) = ([], [])
 
-    predicted_glucoses_bolus = predict_glucose(
-        glucose_dates[-1], glucose_values[-1],
-        momentum_effect_dates_bolus, momentum_effect_values_bolus,
-        carb_effect_dates, carb_effect_values,
-        insulin_effect_dates, insulin_effect_values,
-        retrospective_effect_dates_bolus, retrospective_effect_values_bolus
-        )
+    with stage("prediction"):
+        predicted_glucoses_bolus = predict_glucose(
+            glucose_dates[-1], glucose_values[-1],
+            momentum_effect_dates_bolus, momentum_effect_values_bolus,
+            carb_effect_dates, carb_effect_values,
+            insulin_effect_dates, insulin_effect_values,
+            retrospective_effect_dates_bolus, retrospective_effect_values_bolus
+            )
 
-    bolus = recommended_bolus(
-        *predicted_glucoses_bolus,
-        target_starts, target_ends, target_mins, target_maxes,
-        at_date,
-        suspend_threshold,
-        sensitivity_starts, sensitivity_ends, sensitivity_values,
-        model,
-        pending_insulin,
-        max_bolus,
-        rate_rounder
-        )
+    # The temp basal, bolus, and autobolus are derived from the insulin
+    # corrections of the predictions, so each correction is only computed
+    # once; the temp basal shares the bolus prediction's correction when
+    # no effects were removed from it
+    def correction_of(predicted_glucoses):
+        return glucose_correction(
+            *predicted_glucoses,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            curve_table,
+            sensitivity_schedule,
+            target_min_schedule,
+            target_max_schedule,
+            engine=correction_engine
+            )
 
-    autobolus = recommended_autobolus(
-        *predicted_glucoses_bolus,
-        target_starts, target_ends, target_mins, target_maxes,
-        at_date,
-        suspend_threshold,
-        sensitivity_starts, sensitivity_ends, sensitivity_values,
-        model,
-        pending_insulin,
-        max_bolus,
-        minimum_autobolus,
-        maximum_autobolus,
-        partial_application_factor,
-        rate_rounder
+    with stage("correction"):
+        bolus_correction = correction_of(predicted_glucoses_bolus)
+        basal_correction = (
+            bolus_correction
+            if predicted_glucoses_basal == predicted_glucoses_bolus
+            else correction_of(predicted_glucoses_basal)
         )
+
+    with stage("temp_basal"):
+        temp_basal = recommended_temp_basal(
+            *predicted_glucoses_basal,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            basal_starts, basal_rates, basal_minutes,
+            max_basal_rate,
+            last_temp_basal,
+            duration,
+            continuation_interval,
+            rate_rounder,
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule,
+            target_min_schedule=target_min_schedule,
+            target_max_schedule=target_max_schedule,
+            correction=basal_correction
+            )
+
+    with stage("bolus"):
+        bolus = recommended_bolus(
+            *predicted_glucoses_bolus,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            pending_insulin,
+            max_bolus,
+            rate_rounder,
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule,
+            target_min_schedule=target_min_schedule,
+            target_max_schedule=target_max_schedule,
+            correction=bolus_correction
+            )
+
+    with stage("autobolus"):
+        autobolus = recommended_autobolus(
+            *predicted_glucoses_bolus,
+            target_starts, target_ends, target_mins, target_maxes,
+            at_date,
+            suspend_threshold,
+            sensitivity_starts, sensitivity_ends, sensitivity_values,
+            model,
+            pending_insulin,
+            max_bolus,
+            minimum_autobolus,
+            maximum_autobolus,
+            partial_application_factor,
+            rate_rounder,
+            curve_table=curve_table,
+            sensitivity_schedule=sensitivity_schedule,
+            target_min_schedule=target_min_schedule,
+            target_max_schedule=target_max_schedule,
+            correction=bolus_correction
+            )
     
     return {
         "predicted_glucose_dates": predicted_glucoses_basal[0],
@@ -16,7 +16,12 @@ from backports.datetime_fromisoformat import MonkeyPatch
 MonkeyPatch.patch_fromisoformat()
 
 from pyloopkit.date import (date_floored_to_time_interval,
-                  date_ceiled_to_time_interval, time_interval_since)
+                  date_ceiled_to_time_interval, time_interval_since,
+                  seconds_since_reference_date,
+                  dates_from_seconds_since_reference_date,
+                  seconds_floored_to_time_interval,
+                  seconds_ceiled_to_time_interval, seconds_offset,
+                  seconds_timeline, TIMEZONE_REF_TIME)
 
 
 def predict_glucose(
@@ -92,13 +97,16 @@ def predict_glucose(
 
     merged_values = [0 for i in merged_dates]
 
+    # look up the merged index of each effect date in constant time
+    merged_indexes = {date: i for (i, date) in enumerate(merged_dates)}
+
     if carb_effect_dates:
         previous_effect_value = carb_effect_values[0] or 0
         for i in range(0,
                        len(carb_effect_dates)
                        ):
             value = carb_effect_values[i]
-            list_index = merged_dates.index(carb_effect_dates[i])
+            list_index = merged_indexes[carb_effect_dates[i]]
             merged_values[list_index] = (
                 value
                 - previous_effect_value
@@ -112,7 +120,7 @@ def predict_glucose(
                        len(insulin_effect_dates)
                        ):
             value = insulin_effect_values[i]
-            list_index = merged_dates.index(insulin_effect_dates[i])
+            list_index = merged_indexes[insulin_effect_dates[i]]
             merged_values[list_index] = (
                 merged_values[list_index]
                 + value
@@ -127,7 +135,7 @@ def predict_glucose(
                        len(correction_effect_dates)
                        ):
             value = correction_effect_values[i]
-            list_index = merged_dates.index(correction_effect_dates[i])
+            list_index = merged_indexes[correction_effect_dates[i]]
             merged_values[list_index] = (
                 merged_values[list_index]
                 + value
@@ -164,7 +172,7 @@ def predict_glucose(
         for i in range(0, len(momentum_dates)):
             value = momentum_values[i]
             date = momentum_dates[i]
-            merge_index = merged_dates.index(date)
+            merge_index = merged_indexes[date]
 
             effect_value_change = value - previous_effect_value
 
@@ -325,6 +333,92 @@ def simulation_date_range_for_samples(
             )
 
 
+def simulation_timeline_for_samples(
+        start_times,
+        end_times,
+        duration,
+        delta,
+        start=None,
+        end=None,
+        delay=0
+        ):
+    """ Create the dates every delta minutes through the date range of
+        simulation_date_range_for_samples
+
+        The timeline is built in integer seconds since the reference date
+        (when all of the dates are on whole seconds, and delta and the
+        duration are whole seconds), instead of one datetime at a time
+
+    Arguments:
+    start_times -- list of datetime object(s) at start
+    end_times -- list of datetime object(s) at end
+    duration -- length of interval
+    delta -- minutes between the dates of the timeline
+    start -- specified start date
+    end -- specified end date
+    delay -- additional time added to interval in minutes
+
+    Output:
+    Tuple in format (list of datetime objects of the timeline,
+                     numpy int64 array of the same times in seconds since
+                     the reference date)
+    """
+    given_dates = [date for date in [start, end] if date is not None]
+    if ((delta * 60) % 1 or ((duration + delay) * 60) % 1
+            or any(date.microsecond for date in given_dates)
+            or any(date.microsecond for date in start_times)
+            or any(date.microsecond for date in end_times)
+       ):
+        (start_date,
+         end_date
+         ) = simulation_date_range_for_samples(
+             start_times, end_times, duration, delta,
+             start=start, end=end, delay=delay
+             )
+
+        dates = []
+        date = start_date
+        while date <= end_date:
+            dates.append(date)
+            date += timedelta(minutes=delta)
+
+        return (dates, seconds_since_reference_date(dates))
+
+    if (start is None or end is None) and not start_times:
+        raise ValueError
+
+    start_date = start if start is not None else min(start_times)
+    if end is not None:
+        end_seconds = seconds_since_reference_date([end])[0]
+    else:
+        # like simulation_date_range_for_samples, the range runs through the
+        # latest end (or the first start) plus the duration
+        latest_date = max(
+            [start_times[0]] + list(end_times[:len(start_times)])
+        )
+        end_seconds = seconds_offset(
+            seconds_since_reference_date([latest_date])[0], duration + delay
+        )
+
+    start_seconds = seconds_floored_to_time_interval(
+        int(seconds_since_reference_date([start_date])[0]), delta
+    )
+    end_seconds = seconds_ceiled_to_time_interval(int(end_seconds), delta)
+
+    assert (start is not None and end is not None)\
+        or start_seconds <= end_seconds, "expected start to be less than end"
+
+    seconds = seconds_timeline(int(start_seconds), int(end_seconds), delta)
+
+    return (
+        dates_from_seconds_since_reference_date(
+            seconds,
+            TIMEZONE_REF_TIME.tzinfo if start_date.tzinfo else None
+        ),
+        seconds
+    )
+
+
 def subtracting(starts, ends, values,
                 other_starts, other_ends, other_values,
                 effect_interval
@@ -432,6 +526,58 @@ def subtracting(starts, ends, values,
     return (subtracted_starts, subtracted_values)
 
 
+def summed_effects(dates, values, other_dates, other_values):
+    """ Adds two timelines of (cumulative) glucose effects; before its first
+        date and after its last date, each timeline keeps its first and
+        last value
+
+    Arguments:
+    dates -- times of the first effect (datetime), in ascending order
+    values -- values (mg/dL) of the first effect
+    other_dates -- times of the effect to add (datetime), in ascending order
+    other_values -- values (mg/dL) of the effect to add
+
+    Output:
+    The summed effects at the dates of both timelines in the form
+    (dates, values)
+    """
+    assert len(dates) == len(values),\
+        "expected input shapes to match"
+    assert len(other_dates) == len(other_values),\
+        "expected input shapes to match"
+
+    if not other_dates:
+        return (list(dates), list(values))
+    if not dates:
+        return (list(other_dates), list(other_values))
+
+    (summed_dates, summed_values) = ([], [])
+    (index, other_index) = (0, 0)
+
+    while index < len(dates) or other_index < len(other_dates):
+        if (other_index == len(other_dates)
+                or (index < len(dates)
+                    and dates[index] <= other_dates[other_index])):
+            date = dates[index]
+        else:
+            date = other_dates[other_index]
+
+        # the latest values at or before the date
+        while index < len(dates) and dates[index] <= date:
+            index += 1
+        while (other_index < len(other_dates)
+               and other_dates[other_index] <= date):
+            other_index += 1
+
+        summed_dates.append(date)
+        summed_values.append(
+            values[max(0, index - 1)]
+            + other_values[max(0, other_index - 1)]
+        )
+
+    return (summed_dates, summed_values)
+
+
 def filter_date_range(
         starts, ends, values,
         start_date,
@@ -544,34 +690,42 @@ def combined_sums(
     starts = list(reversed(starts))
     ends = list(reversed(ends))
     values = list(reversed(values))
-    last_valid_index = 0
 
+    effect_ends = [ends[i] if ends else starts[i] for i in range(0, len(starts))]
+
+    # compare the dates as integer seconds since the reference date (or as
+    # datetimes, if any of them aren't on a whole second)
+    if all(date.microsecond == 0 for date in starts + effect_ends):
+        start_times = seconds_since_reference_date(starts).tolist()
+        end_times = seconds_since_reference_date(effect_ends).tolist()
+        window = duration * 60
+    else:
+        (start_times, end_times) = (starts, effect_ends)
+        window = timedelta(minutes=duration)
+
+    # a sum can only include (older) effects that start and end no more
+    # than duration before the sum ends
+    limits = [
+        min(end_times[i], start_times[i]) + window
+        for i in range(0, len(starts))
+    ]
+
+    # going back in time, each sum stops at the first effect it can't
+    # include, and that effect can only be later for a later sum
+    last_index = 0
     for i in range(0, len(starts)):
-        sum_starts.append(starts[i])
-        sum_ends.append(ends[i] if ends else starts[i])
-        sum_values.append(values[i])
-
-        for sums_index in range(last_valid_index, len(sum_starts)-1):
-            if (ends
-                    and sum_ends[sums_index]
-                    and (sum_ends[sums_index]
-                         > ends[i] + timedelta(minutes=duration)
-                         )
-               ):
-                last_valid_index += 1
-                continue
-
-            elif (sum_ends[sums_index]
-                  and sum_ends[sums_index]
-                  > starts[i] + timedelta(minutes=duration)
-                  ):
-                last_valid_index += 1
-                continue
-
-            sum_starts[sums_index] = starts[i]
-            if not sum_ends[sums_index]:
-                sum_ends[sums_index] = ends[i] if ends else starts[i]
-            sum_values[sums_index] += values[i]
+        last_index = max(last_index, i)
+        while (last_index + 1 < len(starts)
+               and end_times[i] <= limits[last_index + 1]):
+            last_index += 1
+
+        value = values[i]
+        for j in range(i + 1, last_index + 1):
+            value += values[j]
+
+        sum_starts.append(starts[last_index])
+        sum_ends.append(effect_ends[i])
+        sum_values.append(value)
 
     assert len(sum_starts) == len(sum_ends) == len(sum_values),\
         "expected output shapes to match"
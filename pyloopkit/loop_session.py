@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 18:05:51 2026
+
+Run the Loop algorithm cycle after cycle (like Loop does every 5 minutes),
+appending new glucose, dose, and carb data between cycles instead of
+rebuilding the input every time.
+
+Each dose's insulin effect is kept between cycles, and the counteraction
+effects and momentum are extended from the glucose that arrived since the
+previous cycle. The carb effects, retrospective correction, and prediction
+are recalculated in full every cycle, since a carb entry that arrives late
+changes them back in time.
+"""
+from bisect import bisect_left
+from datetime import timedelta
+
+from pyloopkit.compiled_schedule import get_compiled_schedule
+from pyloopkit.dose_effect_cache import DoseEffectCache
+from pyloopkit.dose_store import get_glucose_effects
+from pyloopkit.glucose_store import (get_recent_momentum_effects,
+                                     get_counteraction_effects)
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
+from pyloopkit.loop_data_manager import update
+
+# input keys holding index-matched lists that grow as data is added
+GLUCOSE_KEYS = ["glucose_dates", "glucose_values"]
+DOSE_KEYS = [
+    "dose_types", "dose_start_times", "dose_end_times", "dose_values",
+    "dose_delivered_units"
+]
+CARB_KEYS = ["carb_dates", "carb_values", "carb_absorption_times"]
+
+
+class LoopSession:
+    """ A series of loop cycles over the same settings
+
+        The insulin effect of each dose is kept between cycles, so a cycle
+        only calculates the effects of new (or newly trimmed) doses and of
+        dates that weren't in the previous cycle's timeline. The dose
+        effects are only kept by the "python" insulin effect engine; the
+        "numpy" engine recalculates them every cycle.
+
+        The counteraction effects of the previous cycle are kept, and a
+        cycle only finds the ones from the end of the last of them on, with
+        the insulin effects of that part of the timeline. The momentum is
+        fit to the glucose in the momentum window. If a dose that started
+        before the previous cycle was added, the counteraction effects are
+        recalculated in full, as they are if there weren't any last cycle.
+        The carb entries don't affect either of them.
+
+        The output of every cycle is the same as calling update() on the
+        full input, except for the counteraction effects that were kept:
+        once doses leave the window of the cycle (or a temp basal is cut
+        short by a later one), a full recalculation of them can differ by
+        rounding, and with irregularly timed glucose samples it can pair up
+        the samples at the start of the window differently.
+
+        Each cycle's output holds on to the data lists it was run with, so
+        a list is only copied when data is added to it after a cycle.
+
+    Arguments:
+    input_dict -- dictionary in the format expected by
+                  loop_data_manager.update; the data lists are copied
+    """
+    def __init__(self, input_dict):
+        self.input_dict = dict(input_dict)
+        for key in GLUCOSE_KEYS + DOSE_KEYS + CARB_KEYS:
+            self.input_dict[key] = list(input_dict.get(key) or [])
+
+        if (len(self.input_dict["dose_delivered_units"])
+                != len(self.input_dict["dose_types"])):
+            self.input_dict["dose_delivered_units"] = [
+                None for type_ in self.input_dict["dose_types"]
+            ]
+
+        self.effect_cache = DoseEffectCache()
+        self.recommendations = None
+        # whether a dose that started before the previous cycle was added
+        self.backdated_doses = False
+        # data lists that are part of a cycle's output, which have to be
+        # copied before they are added to
+        self.shared_keys = set()
+
+    def extend(self, key, values):
+        """ Add values to one of the data lists, copying the list first if a
+            cycle's output holds on to it
+        """
+        if not values:
+            return
+
+        if key in self.shared_keys:
+            self.input_dict[key] = list(self.input_dict[key])
+            self.shared_keys.discard(key)
+
+        self.input_dict[key].extend(values)
+
+    def add_glucose(self, glucose_dates, glucose_values):
+        """ Add glucose measurements taken after the existing ones
+
+        Arguments:
+        glucose_dates -- times of glucose measurements (datetime)
+        glucose_values -- glucose measurements (mg/dL)
+        """
+        assert len(glucose_dates) == len(glucose_values),\
+            "expected input shapes to match"
+
+        existing_dates = self.input_dict["glucose_dates"]
+        assert not glucose_dates or not existing_dates\
+            or glucose_dates[0] > existing_dates[-1],\
+            "expected glucose to be added in chronological order"
+
+        self.extend("glucose_dates", glucose_dates)
+        self.extend("glucose_values", glucose_values)
+
+    def add_doses(
+            self,
+            dose_types, dose_start_times, dose_end_times, dose_values,
+            dose_delivered_units=None
+        ):
+        """ Add insulin doses
+
+        Arguments:
+        dose_types -- types of dose (tempBasal, bolus, etc)
+        dose_start_times -- start times of insulin delivery (datetime)
+        dose_end_times -- end times of insulin delivery (datetime)
+        dose_values -- amounts of insulin (U/hr if a basal, U if a bolus)
+        dose_delivered_units -- absolute Units of insulin delivered by the
+                                doses (can be None)
+        """
+        assert len(dose_types) == len(dose_start_times)\
+            == len(dose_end_times) == len(dose_values),\
+            "expected input shapes to match"
+
+        if (self.recommendations and dose_start_times
+                and min(dose_start_times)
+                < self.input_dict["time_to_calculate_at"]
+           ):
+            self.backdated_doses = True
+
+        self.extend("dose_types", dose_types)
+        self.extend("dose_start_times", dose_start_times)
+        self.extend("dose_end_times", dose_end_times)
+        self.extend("dose_values", dose_values)
+        self.extend(
+            "dose_delivered_units",
+            dose_delivered_units or [None for type_ in dose_types]
+        )
+
+    def add_carbs(self, carb_dates, carb_values, carb_absorption_times):
+        """ Add carbohydrate entries
+
+        Arguments:
+        carb_dates -- times of carbohydrate entries (datetime)
+        carb_values -- grams of carbohydrate eaten
+        carb_absorption_times -- absorption times of the entries (mins)
+        """
+        assert len(carb_dates) == len(carb_values)\
+            == len(carb_absorption_times), "expected input shapes to match"
+
+        self.extend("carb_dates", carb_dates)
+        self.extend("carb_values", carb_values)
+        self.extend("carb_absorption_times", carb_absorption_times)
+
+    def counteraction_effects(self, time_to_calculate_at):
+        """ Extend the previous cycle's counteraction effects with the
+            glucose that has been added since
+
+        Arguments:
+        time_to_calculate_at -- the "now" time of the cycle
+
+        Output:
+        Counteraction effects in the format (start dates, end dates,
+        velocities), or None if they have to be recalculated in full
+        """
+        if (not self.recommendations
+                or self.backdated_doses
+                or self.input_dict.get("previous_counteraction_effect_dates")
+                or time_to_calculate_at
+                < self.input_dict["time_to_calculate_at"]
+           ):
+            return None
+
+        previous_starts = self.recommendations[
+            "counteraction_effect_start_times"
+        ]
+        previous_ends = self.recommendations["counteraction_effect_end_times"]
+        previous_values = self.recommendations["counteraction_effect_values"]
+
+        # the cycle calculates a maximum of 24 hours of effects
+        earliest_effect_date = time_to_calculate_at - timedelta(hours=24)
+        if not previous_ends or previous_ends[-1] <= earliest_effect_date:
+            return None
+
+        # the next counteraction effect starts at the sample that the last
+        # one ended at
+        tail_start = previous_ends[-1]
+
+        input_dict = self.input_dict
+        settings = input_dict["settings_dictionary"]
+        insulin_delay = settings.get("insulin_delay") or 10
+
+        # the insulin effects from the start of the tail, with the doses of
+        # the cycle's whole effect window
+        (effect_dates,
+         effect_values
+         ) = get_glucose_effects(
+             input_dict["dose_types"], input_dict["dose_start_times"],
+             input_dict["dose_end_times"], input_dict["dose_values"],
+             input_dict["dose_delivered_units"],
+             tail_start,
+             input_dict.get("basal_rate_start_times"),
+             input_dict.get("basal_rate_values"),
+             input_dict.get("basal_rate_minutes"),
+             input_dict.get("sensitivity_ratio_start_times"),
+             input_dict.get("sensitivity_ratio_end_times"),
+             input_dict.get("sensitivity_ratio_values"),
+             settings.get("model"),
+             delay=insulin_delay,
+             engine=settings.get("insulin_effect_engine") or "python",
+             curve_table=(
+                 get_insulin_curve_table(settings.get("model"), insulin_delay)
+                 if settings.get("use_insulin_curve_tables") else None
+             ),
+             sensitivity_schedule=get_compiled_schedule(
+                 input_dict.get("sensitivity_ratio_start_times"),
+                 input_dict.get("sensitivity_ratio_end_times"),
+                 input_dict.get("sensitivity_ratio_values")
+             ),
+             effect_cache=self.effect_cache,
+             history_start_date=earliest_effect_date
+             )
+        if not effect_dates:
+            return None
+
+        glucose_dates = input_dict["glucose_dates"]
+        first_glucose = bisect_left(glucose_dates, tail_start)
+        (starts,
+         ends,
+         values
+         ) = get_counteraction_effects(
+             glucose_dates[first_glucose:],
+             input_dict["glucose_values"][first_glucose:],
+             tail_start,
+             effect_dates, effect_values
+             )
+
+        first_kept = bisect_left(previous_starts, earliest_effect_date)
+        return (
+            previous_starts[first_kept:] + starts,
+            previous_ends[first_kept:] + ends,
+            previous_values[first_kept:] + values
+        )
+
+    def momentum_effects(self, time_to_calculate_at):
+        """ Find the momentum effects from the glucose in the momentum window
+
+        Arguments:
+        time_to_calculate_at -- the "now" time of the cycle
+
+        Output:
+        Momentum effects in the format (dates, values)
+        """
+        settings = self.input_dict["settings_dictionary"]
+        momentum_data_interval = settings.get("momentum_data_interval") or 15
+
+        glucose_dates = self.input_dict["glucose_dates"]
+        first_glucose = bisect_left(
+            glucose_dates,
+            time_to_calculate_at - timedelta(minutes=momentum_data_interval)
+        )
+
+        return get_recent_momentum_effects(
+            glucose_dates[first_glucose:],
+            self.input_dict["glucose_values"][first_glucose:],
+            time_to_calculate_at - timedelta(hours=24),
+            time_to_calculate_at,
+            momentum_data_interval,
+            5,
+            settings_dictionary=settings
+        )
+
+    def update(self, time_to_calculate_at, last_temporary_basal=None):
+        """ Run a loop cycle with all of the data added so far
+
+        Arguments:
+        time_to_calculate_at -- the "now" time of the cycle
+        last_temporary_basal -- the last temporary basal in the format
+                                [type, start time, end time, basal rate];
+                                if None, the previous one is kept
+
+        Output:
+        The output of loop_data_manager.update for the cycle
+        """
+        input_dict = dict(self.input_dict)
+        input_dict["time_to_calculate_at"] = time_to_calculate_at
+        if last_temporary_basal is not None:
+            input_dict["last_temporary_basal"] = last_temporary_basal
+
+        counteraction_effects = self.counteraction_effects(
+            time_to_calculate_at
+        )
+        if counteraction_effects:
+            (input_dict["counteraction_starts"],
+             input_dict["counteraction_ends"],
+             input_dict["counteraction_values"]
+             ) = counteraction_effects
+
+        (input_dict["momentum_effect_dates"],
+         input_dict["momentum_effect_values"]
+         ) = self.momentum_effects(time_to_calculate_at)
+
+        self.input_dict["time_to_calculate_at"] = time_to_calculate_at
+        self.input_dict["last_temporary_basal"] = input_dict.get(
+            "last_temporary_basal"
+        )
+
+        # the output holds on to its input, so the lists are copied the
+        # next time they are added to
+        self.recommendations = update(
+            input_dict,
+            effect_cache=self.effect_cache
+        )
+        self.shared_keys = set(GLUCOSE_KEYS + DOSE_KEYS + CARB_KEYS)
+        self.backdated_doses = False
+
+        # the doses that weren't part of this cycle's effects (because
+        # they are too old, or were trimmed differently) won't be again
+        self.effect_cache.retain_used()
+
+        return self.recommendations
+
+    def next_update(self, delta=5, last_temporary_basal=None):
+        """ Run the loop cycle that follows the previous one
+
+        Arguments:
+        delta -- minutes since the previous cycle
+        last_temporary_basal -- see update()
+
+        Output:
+        The output of loop_data_manager.update for the cycle
+        """
+        return self.update(
+            self.input_dict["time_to_calculate_at"] + timedelta(minutes=delta),
+            last_temporary_basal
+        )
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 00:27:53 2026
+
+Glucose momentum from running regression sums over a sliding window of
+glucose samples, instead of filtering the glucose history and refitting
+the regression every cycle.
+"""
+from collections import deque
+from datetime import timedelta
+
+from pyloopkit.date import time_interval_since
+from pyloopkit.glucose_math import momentum_effect_from_slope, regression_slope
+
+# how far the window can move past the origin of the regression times
+# before the sums are recalculated around the window (seconds)
+REBASE_INTERVAL = 60 * 60
+
+
+class MomentumEstimator:
+    """ Keeps the momentum window of a stream of glucose samples, along with
+        the regression sums and the calibration and provenance counts of the
+        samples in it
+
+        Samples are added in chronological order, and leave the window as
+        the "now" time moves forward, so each cycle takes constant time
+        however long the glucose history is. The regression times are
+        measured from an origin that only moves once an hour, so the
+        momentum effect is the same as get_recent_momentum_effects' when the
+        glucose dates are whole seconds and the values are whole numbers,
+        and the same up to rounding otherwise.
+
+    Arguments:
+    momentum_data_interval -- minutes of glucose data to use for momentum
+    delta -- the time differential for the momentum effects (mins)
+    settings_dictionary -- optional settings; the slope is clamped to the
+                           "max_physiologic_slope", if there is one
+    """
+    def __init__(
+            self,
+            momentum_data_interval=15,
+            delta=5,
+            settings_dictionary=None
+        ):
+        self.momentum_data_interval = momentum_data_interval
+        self.delta = delta
+        self.settings_dictionary = settings_dictionary
+
+        # samples in the window, as (date, time since the origin (s),
+        # glucose value, display only, provenance)
+        self.samples = deque()
+        self.origin = None
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_x_squared = 0.0
+
+        self.display_count = 0
+        self.provenance_counts = {}
+        self.last_date = None
+
+    def add_glucose(
+            self, dates, glucose_values,
+            displays=None,
+            provenances=None
+        ):
+        """ Add glucose samples taken at or after the existing ones
+
+        Arguments:
+        dates -- list of datetime objects of dates of glucose values
+        glucose_values -- list of glucose values (unit: mg/dL)
+        displays -- list of display_only booleans (all False if not given)
+        provenances -- list of provenances (Strings); all "PyLoop" if not
+                       given
+        """
+        displays = displays or [False for date in dates]
+        provenances = provenances or ["PyLoop" for date in dates]
+
+        assert len(dates) == len(glucose_values) == len(displays)\
+            == len(provenances), "expected input shapes to match"
+        assert not dates or self.last_date is None\
+            or dates[0] >= self.last_date,\
+            "expected glucose to be added in chronological order"
+
+        for (date, value, display, provenance) in zip(
+                dates, glucose_values, displays, provenances
+            ):
+            if self.origin is None:
+                self.origin = date
+
+            x = time_interval_since(date, self.origin)
+            self.samples.append((date, x, value, display, provenance))
+            self.add_to_sums(x, value, 1)
+
+            self.display_count += int(display)
+            self.provenance_counts[provenance] = (
+                self.provenance_counts.get(provenance, 0) + 1
+            )
+            self.last_date = date
+
+    def add_to_sums(self, x, y, sign):
+        """ Add a sample to (or, with a sign of -1, remove it from) the
+            regression sums
+        """
+        self.sum_x += sign * x
+        self.sum_y += sign * y
+        self.sum_xy += sign * (x * y)
+        self.sum_x_squared += sign * (x * x)
+
+    def remove_samples_before(self, start_date):
+        """ Remove the samples dated before the start of the window """
+        while self.samples and self.samples[0][0] < start_date:
+            (date, x, value, display, provenance) = self.samples.popleft()
+            self.add_to_sums(x, value, -1)
+
+            self.display_count -= int(display)
+            self.provenance_counts[provenance] -= 1
+            if not self.provenance_counts[provenance]:
+                del self.provenance_counts[provenance]
+
+        if not self.samples:
+            (self.origin,
+             self.sum_x,
+             self.sum_y,
+             self.sum_xy,
+             self.sum_x_squared
+             ) = (None, 0.0, 0.0, 0.0, 0.0)
+
+        elif (time_interval_since(self.samples[0][0], self.origin)
+              > REBASE_INTERVAL):
+            self.rebase()
+
+    def rebase(self):
+        """ Move the origin of the regression times to the first sample in
+            the window, recalculating the sums
+        """
+        self.origin = self.samples[0][0]
+        self.sum_x = self.sum_y = self.sum_xy = self.sum_x_squared = 0.0
+
+        samples = self.samples
+        self.samples = deque()
+        for (date, _, value, display, provenance) in samples:
+            x = time_interval_since(date, self.origin)
+            self.samples.append((date, x, value, display, provenance))
+            self.add_to_sums(x, value, 1)
+
+    def momentum_effect(self, now_date):
+        """ Get the momentum effect at a time (see
+            glucose_store.get_recent_momentum_effects); now_date must not
+            be earlier than the one in the previous call
+
+        Arguments:
+        now_date -- the date to assume as the "now" time
+
+        Output:
+        Momentum effects in format (date_of_effect, value_of_effect)
+        """
+        self.remove_samples_before(
+            now_date - timedelta(minutes=self.momentum_data_interval)
+        )
+
+        count = len(self.samples)
+        if count <= 2:
+            return ([], [])
+
+        first_date = self.samples[0][0]
+        last_date = self.samples[-1][0]
+
+        # like glucose_math.is_continuous, is_calibrated, and
+        # has_single_provenance
+        if (abs(time_interval_since(first_date, last_date)) >= 5 * count * 60
+                or self.display_count
+                or len(self.provenance_counts) != 1
+           ):
+            return ([], [])
+
+        slope = regression_slope(
+            count, self.sum_x, self.sum_y, self.sum_xy, self.sum_x_squared
+        )
+
+        return momentum_effect_from_slope(
+            last_date, slope,
+            self.momentum_data_interval,
+            self.delta,
+            self.settings_dictionary
+        )
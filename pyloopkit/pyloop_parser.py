@@ -555,14 +555,27 @@ def parse_report_and_run_with_name(data_path_and_name):
         run PyLoopKit
 
     Arguments:
-    path -- the path to the issue report
-    name -- the name of the file, with the .json extension
+    data_path_and_name -- the path to the issue report, including the name
+                          of the file
 
     Output:
     A dictionary of all 4 effects, the predicted glucose values, and the
     recommended basal and bolus
     """
+    return update(parse_report_with_name(data_path_and_name))
 
+
+def parse_report_with_name(data_path_and_name):
+    """ Get relevent information from a Loop issue report, without running
+        it through PyLoopKit
+
+    Arguments:
+    data_path_and_name -- the path to the issue report, including the name
+                          of the file
+
+    Output:
+    The input dictionary for loop_data_manager.update
+    """
     with open(data_path_and_name, "r") as file:
         issue_dict = json.load(file)
     input_dict = {}
@@ -832,11 +845,7 @@ def parse_report_and_run_with_name(data_path_and_name):
 
     input_dict["last_temporary_basal"] = last_temp_basal
 
-    recommendations = update(
-        input_dict
-        )
-
-    return recommendations
+    return input_dict
 
 
 def parse_dictionary_from_previous_run(path, name):
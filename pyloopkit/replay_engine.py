@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 21:06:50 2026
+
+Replay what Loop would have recommended every few minutes over a long
+history of glucose, dose, and carb data
+"""
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from pyloopkit.dose import DoseType
+from pyloopkit.dose_effect_cache import DoseEffectCache
+from pyloopkit.loop_data_manager import update
+from pyloopkit.loop_session import GLUCOSE_KEYS, DOSE_KEYS, CARB_KEYS
+from pyloopkit.momentum_estimator import MomentumEstimator
+
+
+def sorted_lists(lists, sort_list):
+    """ Sort index-matched lists by one of them (stable, so entries with
+        the same date keep their order)
+    """
+    order = sorted(range(0, len(sort_list)), key=lambda i: sort_list[i])
+    return [[list_[i] for i in order] for list_ in lists]
+
+
+class ReplayEngine:
+    """ Run the Loop algorithm at every tick of a long history, passing each
+        cycle a sliding window of the data
+
+        The history is sorted once, and each window is found with a binary
+        search instead of filtering the whole history. The insulin effects
+        of the doses (in a DoseEffectCache) and the compiled schedules are
+        reused from tick to tick. Every cycle gives the same output as
+        calling update() on window_input() for that time.
+
+    Arguments:
+    input_dict -- dictionary in the format expected by
+                  loop_data_manager.update, holding the whole history of
+                  glucose, dose, and carb data
+    window_hours -- hours of glucose and carb data before each tick to pass
+                    to the cycle; doses go back another duration of insulin
+                    action, so the window's insulin effects are complete
+    incremental_momentum -- whether to keep the glucose momentum up to date
+                            with a MomentumEstimator instead of refitting it
+                            every cycle (the momentum effects are the same up
+                            to rounding; see momentum_estimator.py)
+    """
+    def __init__(self, input_dict, window_hours=24, incremental_momentum=False):
+        self.input_dict = dict(input_dict)
+        self.incremental_momentum = incremental_momentum
+
+        if (len(input_dict.get("dose_delivered_units") or [])
+                != len(input_dict.get("dose_types") or [])):
+            self.input_dict["dose_delivered_units"] = [
+                None for type_ in input_dict.get("dose_types") or []
+            ]
+
+        for (keys, date_key) in [
+                (GLUCOSE_KEYS, "glucose_dates"),
+                (DOSE_KEYS, "dose_start_times"),
+                (CARB_KEYS, "carb_dates")
+            ]:
+            lists = [list(self.input_dict.get(key) or []) for key in keys]
+            for (key, list_) in zip(
+                    keys, sorted_lists(lists, lists[keys.index(date_key)])
+                ):
+                self.input_dict[key] = list_
+
+        model = self.input_dict["settings_dictionary"].get("model")
+        self.window = timedelta(hours=window_hours)
+        self.dose_window = self.window + (
+            timedelta(hours=model[0]) if len(model) == 1  # Walsh model
+            else timedelta(minutes=model[0])
+        )
+
+        # the temp basals (and basals), to find the last one at each tick
+        self.temp_basal_indexes = [
+            i for (i, type_) in enumerate(self.input_dict["dose_types"])
+            if type_ in [DoseType.tempbasal, DoseType.basal]
+        ]
+        self.temp_basal_starts = [
+            self.input_dict["dose_start_times"][i]
+            for i in self.temp_basal_indexes
+        ]
+
+        self.effect_cache = DoseEffectCache()
+
+    def window_slice(self, date_key, start, end):
+        """ Find the indexes of the entries dated from start through end """
+        dates = self.input_dict[date_key]
+        return slice(bisect_left(dates, start), bisect_right(dates, end))
+
+    def last_temporary_basal(self, time_to_calculate_at):
+        """ Find the last temp basal that started by a time
+
+        Output:
+        Temp basal in format [type, start time, end time, basal rate], or
+        None if there isn't one
+        """
+        index = bisect_right(self.temp_basal_starts, time_to_calculate_at)
+        if not index:
+            return None
+
+        dose_index = self.temp_basal_indexes[index - 1]
+        return [
+            self.input_dict["dose_types"][dose_index],
+            self.input_dict["dose_start_times"][dose_index],
+            self.input_dict["dose_end_times"][dose_index],
+            self.input_dict["dose_values"][dose_index],
+        ]
+
+    def window_input(self, time_to_calculate_at):
+        """ Get the input of the cycle at a time
+
+        Arguments:
+        time_to_calculate_at -- the "now" time of the cycle
+
+        Output:
+        Dictionary in the format expected by loop_data_manager.update
+        """
+        input_dict = dict(self.input_dict)
+        input_dict["time_to_calculate_at"] = time_to_calculate_at
+        input_dict["last_temporary_basal"] = self.last_temporary_basal(
+            time_to_calculate_at
+        )
+
+        for (keys, date_key, window) in [
+                (GLUCOSE_KEYS, "glucose_dates", self.window),
+                (DOSE_KEYS, "dose_start_times", self.dose_window),
+                (CARB_KEYS, "carb_dates", self.window)
+            ]:
+            indexes = self.window_slice(
+                date_key, time_to_calculate_at - window, time_to_calculate_at
+            )
+            for key in keys:
+                input_dict[key] = self.input_dict[key][indexes]
+
+        return input_dict
+
+    def replay(self, start_time, end_time, delta=5):
+        """ Run a loop cycle every delta minutes from start_time through
+            end_time
+
+        Arguments:
+        start_time -- time of the first cycle
+        end_time -- latest time of a cycle
+        delta -- minutes between cycles
+
+        Output:
+        Generator of the output of loop_data_manager.update for each cycle,
+        in chronological order
+        """
+        settings = self.input_dict["settings_dictionary"]
+        momentum_data_interval = settings.get("momentum_data_interval") or 15
+        momentum_estimator = (
+            MomentumEstimator(momentum_data_interval, 5, settings)
+            if self.incremental_momentum else None
+        )
+        glucose_dates = self.input_dict["glucose_dates"]
+        next_glucose = bisect_left(
+            glucose_dates,
+            start_time - timedelta(minutes=momentum_data_interval)
+        )
+
+        time_to_calculate_at = start_time
+        while time_to_calculate_at <= end_time:
+            input_dict = self.window_input(time_to_calculate_at)
+
+            if momentum_estimator:
+                new_glucose = slice(
+                    next_glucose,
+                    bisect_right(glucose_dates, time_to_calculate_at)
+                )
+                momentum_estimator.add_glucose(
+                    glucose_dates[new_glucose],
+                    self.input_dict["glucose_values"][new_glucose]
+                )
+                next_glucose = new_glucose.stop
+
+                (input_dict["momentum_effect_dates"],
+                 input_dict["momentum_effect_values"]
+                 ) = momentum_estimator.momentum_effect(time_to_calculate_at)
+
+            recommendations = update(input_dict, effect_cache=self.effect_cache)
+            # forget the doses that have left the window
+            self.effect_cache.retain_used()
+
+            yield recommendations
+
+            time_to_calculate_at += timedelta(minutes=delta)
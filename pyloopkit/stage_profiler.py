@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 22:03:19 2026
+
+Opt-in timing of the stages of a loop cycle (and of key inner functions),
+to find out which part of a slow cycle is slow
+"""
+from contextlib import contextmanager, nullcontext
+import cProfile
+import os
+import pstats
+from time import perf_counter
+
+# inner functions timed when profiling functions, as "module.function"
+KEY_FUNCTIONS = [
+    "dose_store.prepare_doses",
+    "dose_store.prepare_dose_timeline",
+    "insulin_math.glucose_effects",
+    "vectorized_insulin_math.glucose_effects",
+    "insulin_math.glucose_effect",
+    "glucose_math.linear_momentum_effect",
+    "glucose_math.counteraction_effects",
+    "carb_math.map_",
+    "carb_math.carb_glucose_effects",
+    "carb_math.dynamic_glucose_effects",
+    "carb_math.carbs_on_board",
+    "carb_math.dynamic_carbs_on_board",
+    "loop_math.combined_sums",
+    "loop_math.predict_glucose",
+    "dose_math.insulin_correction",
+    "insulin_math.find_ratio_at_time",
+]
+
+# what a disabled profiler's stages are timed with
+NO_STAGE = nullcontext()
+
+
+def no_stage(name):  # pylint: disable=W0613
+    """ Stand-in for StageProfiler.stage when profiling is disabled """
+    return NO_STAGE
+
+
+class StageProfiler:
+    """ Records the wall time and number of calls of each stage of a loop
+        cycle
+
+        Pass the profiler to loop_data_manager.update; the cycle's report is
+        added to the output under "profile" and sent to the sink (if there
+        is one).
+
+    Arguments:
+    sink -- optional function that is called with the report of each cycle
+    profile_functions -- whether to also time the KEY_FUNCTIONS (this uses
+                         cProfile, so it slows down the whole cycle)
+    """
+    def __init__(self, sink=None, profile_functions=False):
+        self.sink = sink
+        self.profile_functions = profile_functions
+        self.stages = {}
+        self.function_profile = None
+        self.cycle_start = None
+
+    @contextmanager
+    def stage(self, name):
+        """ Time a stage of the cycle; stages with the same name add up
+
+        Arguments:
+        name -- name of the stage
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            (calls, seconds) = self.stages.get(name, (0, 0))
+            self.stages[name] = (calls + 1, seconds + perf_counter() - start)
+
+    def start_cycle(self):
+        """ Start timing a cycle """
+        if self.function_profile:
+            # the previous cycle didn't finish (it raised an exception)
+            self.function_profile.disable()
+
+        self.stages = {}
+        self.function_profile = None
+        if self.profile_functions:
+            self.function_profile = cProfile.Profile()
+            self.function_profile.enable()
+
+        self.cycle_start = perf_counter()
+
+    def finish_cycle(self):
+        """ Finish timing a cycle
+
+        Output:
+        Report of the cycle in the format {
+            "seconds": wall time of the cycle,
+            "stages": {name: {"calls": number of calls, "seconds": time}},
+            "functions": {"module.function": {"calls": number of calls,
+                          "seconds": cumulative time}} (if profiling
+                          functions)
+        }
+        """
+        report = {
+            "seconds": perf_counter() - self.cycle_start,
+            "stages": {
+                name: {"calls": calls, "seconds": seconds}
+                for (name, (calls, seconds)) in self.stages.items()
+            },
+        }
+
+        if self.function_profile:
+            self.function_profile.disable()
+            report["functions"] = function_report(self.function_profile)
+            self.function_profile = None
+
+        if self.sink:
+            self.sink(report)
+
+        return report
+
+
+def function_report(profile):
+    """ Get the number of calls and cumulative time of the KEY_FUNCTIONS
+        from a cProfile profile
+
+    Output:
+    Dictionary of {"module.function": {"calls": number of calls,
+                                       "seconds": cumulative time}}
+    """
+    report = {}
+    stats = pstats.Stats(profile).stats  # pylint: disable=E1101
+    for (function_key, values) in stats.items():
+        (file_name, function) = (function_key[0], function_key[2])
+        name = "{}.{}".format(
+            os.path.splitext(os.path.basename(file_name))[0], function
+        )
+        if name in KEY_FUNCTIONS and "pyloopkit" in file_name:
+            # values are (primitive calls, calls, total time, cumulative time)
+            report[name] = {"calls": values[1], "seconds": values[3]}
+
+    return report
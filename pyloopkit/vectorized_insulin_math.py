@@ -0,0 +1,717 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:12:41 2026
+
+NumPy implementations of the insulin effect timelines in insulin_math.py.
+
+Every dose is expanded into one or more "impulses" (a bolus is one impulse,
+a continuous delivery is one impulse per delta-long segment), and the whole
+impulse x timeline matrix is evaluated at once. Given an insulin curve
+table, continuous doses are instead evaluated whole from the table's running
+sums. Times are int64 seconds since the reference date; values are float64.
+"""
+# pylint: disable=R0913, R0914
+import numpy
+
+from pyloopkit.date import seconds_since_reference_date
+from pyloopkit.dose_timeline import DoseTimeline
+from pyloopkit.exponential_insulin_model import (
+    vectorized_percent_effect_remaining)
+from pyloopkit.insulin_math import find_ratio_at_time, is_matching_curve_table
+from pyloopkit.loop_math import simulation_timeline_for_samples
+from pyloopkit.walsh_insulin_model import (
+    vectorized_walsh_percent_effect_remaining)
+
+# maximum number of impulse rows evaluated against the timeline at once
+IMPULSE_BLOCK_SIZE = 2048
+
+
+def percent_effect_remaining_for_model(minutes, model):
+    """ Evaluate the insulin model's percent effect remaining over an array
+
+    Arguments:
+    minutes -- array of minutes after insulin delivery
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+
+    Output:
+    numpy array of percent effect remaining
+    """
+    if len(model) == 1:  # if walsh model
+        return vectorized_walsh_percent_effect_remaining(minutes, model[0])
+
+    return vectorized_percent_effect_remaining(minutes, model[0], model[1])
+
+
+def dose_impulses(
+        dose_starts, dose_ends,
+        delta
+    ):
+    """ Split doses into the impulses used by the reference implementation:
+        doses within 1.05x the delta are momentary, and longer doses are
+        split into delta-long segments
+
+    Arguments:
+    dose_starts -- int64 array of dose start times (seconds)
+    dose_ends -- int64 array of dose end times (seconds)
+    delta -- the differential between timeline entries (seconds)
+
+    Output:
+    Tuple of arrays in format (dose index, segment offset from dose start
+    (seconds), fraction of the dose in the segment, whether the dose is
+    continuous)
+    """
+    durations = dose_ends - dose_starts
+    continuous = durations > 1.05 * delta
+
+    # a momentary dose is a single impulse at its start
+    counts = numpy.where(
+        continuous,
+        numpy.maximum(durations, 0) // delta + 1,
+        1
+    )
+
+    dose_indexes = numpy.repeat(numpy.arange(len(dose_starts)), counts)
+    first_impulse = numpy.cumsum(counts) - counts
+    offsets = (
+        numpy.arange(len(dose_indexes))
+        - numpy.repeat(first_impulse, counts)
+    ) * delta
+
+    impulse_durations = durations[dose_indexes]
+    impulse_continuous = continuous[dose_indexes]
+    fractions = numpy.ones(len(dose_indexes))
+    fractions[impulse_continuous] = (
+        numpy.maximum(
+            0,
+            numpy.minimum(offsets + delta, impulse_durations) - offsets
+        )[impulse_continuous]
+        / impulse_durations[impulse_continuous]
+    )
+
+    return (dose_indexes, offsets, fractions, impulse_continuous)
+
+
+def glucose_effects(
+        dose_types,
+        dose_start_dates,
+        dose_end_dates,
+        dose_values,
+        scheduled_basal_rates,
+        delivered_units,
+        model,
+        sensitivity_start_times,
+        sensitivity_end_times,
+        sensitivity_values,
+        delay=10,
+        delta=5,
+        start=None,
+        end=None,
+        curve_table=None,
+        sensitivity_schedule=None,
+        effect_cache=None
+        ):
+    """ Calculates the timeline of glucose effects for a collection of doses
+        in one batched NumPy evaluation; see insulin_math.glucose_effects
+        for the reference implementation
+
+    Arguments:
+    dose_types -- list of types of doses (basal, bolus, etc)
+    dose_start_dates -- list of datetime objects representing the dates
+                       the doses started at
+    dose_end_dates -- list of datetime objects representing the dates
+                       the doses ended at
+    dose_values -- list of insulin values for doses
+    scheduled_basal_rates -- basal rates scheduled during the times of doses
+    delivered_units -- units actually delivered by the doses
+
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+
+    sensitivity_start_times -- list of time objects of start times of
+                               given insulin sensitivity values
+    sensitivity_end_times -- list of time objects of start times of
+                             given insulin sensitivity values
+    sensitivity_values -- list of sensitivities (mg/dL/U)
+
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+
+    start -- datetime to start calculating the effects at
+    end -- datetime to end calculation of effects
+
+    curve_table -- optional InsulinCurveTable built for the same model, delay
+                   and delta, used instead of evaluating the model directly
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+    effect_cache -- accepted for compatibility with insulin_math; the batched
+                    evaluation doesn't keep per-dose effects
+
+    Output:
+    Tuple in format (times_glucose_effect_was_calculated_at,
+                     glucose_effect_values (mg/dL))
+    """
+    assert len(dose_types) == len(dose_start_dates) == len(dose_end_dates)\
+        == len(dose_values) == len(scheduled_basal_rates) == len(delivered_units),\
+        "expected input shapes to match"
+
+    return timeline_glucose_effects(
+        DoseTimeline.from_lists(
+            dose_types, dose_start_dates, dose_end_dates, dose_values,
+            scheduled_basal_rates, delivered_units
+        ),
+        model,
+        sensitivity_start_times, sensitivity_end_times, sensitivity_values,
+        delay=delay,
+        delta=delta,
+        start=start,
+        end=end,
+        curve_table=curve_table,
+        sensitivity_schedule=sensitivity_schedule
+    )
+
+
+def timeline_glucose_effects(
+        timeline,
+        model,
+        sensitivity_start_times,
+        sensitivity_end_times,
+        sensitivity_values,
+        delay=10,
+        delta=5,
+        start=None,
+        end=None,
+        curve_table=None,
+        sensitivity_schedule=None
+        ):
+    """ Calculates the timeline of glucose effects for a DoseTimeline of
+        prepared doses, without converting them back to lists
+
+    Arguments:
+    timeline -- DoseTimeline of the doses, annotated with the scheduled basal
+                rates
+
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+
+    sensitivity_start_times -- list of time objects of start times of
+                               given insulin sensitivity values
+    sensitivity_end_times -- list of time objects of start times of
+                             given insulin sensitivity values
+    sensitivity_values -- list of sensitivities (mg/dL/U)
+
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+
+    start -- datetime to start calculating the effects at
+    end -- datetime to end calculation of effects
+
+    curve_table -- optional InsulinCurveTable built for the same model, delay
+                   and delta, used instead of evaluating the model directly
+    sensitivity_schedule -- optional CompiledSchedule of the sensitivities
+
+    Output:
+    Tuple in format (times_glucose_effect_was_calculated_at,
+                     glucose_effect_values (mg/dL))
+    """
+    assert is_matching_curve_table(curve_table, model, delay, delta),\
+        "expected curve table to match the model, delay, and delta"
+
+    if not len(timeline) and not (start is not None and end is not None):
+        return ([], [])
+
+    dose_start_dates = timeline.start_dates()
+    (effect_dates,
+     effect_seconds
+     ) = simulation_timeline_for_samples(
+         start_times=dose_start_dates,
+         end_times=(
+             timeline.end_dates() if start is None or end is None else []
+         ),
+         duration=model[0] * 60 if len(model) == 1 else model[0],
+         delay=delay,
+         delta=delta,
+         start=start,
+         end=end
+         )
+
+    if not len(timeline) or not effect_dates:
+        return (effect_dates, [0 for date in effect_dates])
+
+    effect_values = glucose_effect_values(
+        effect_seconds,
+        timeline.starts,
+        timeline.ends,
+        timeline.net_basal_units(),
+        sensitivity_schedule.values_at(dose_start_dates).astype(numpy.float64)
+        if sensitivity_schedule
+        else numpy.array([
+            find_ratio_at_time(
+                sensitivity_start_times,
+                sensitivity_end_times,
+                sensitivity_values,
+                dose_start_date
+            ) for dose_start_date in dose_start_dates
+        ], dtype=numpy.float64),
+        model,
+        delay,
+        delta,
+        curve_table
+    )
+
+    assert len(effect_dates) == len(effect_values),\
+        "expected output shapes to match"
+    return (effect_dates, effect_values.tolist())
+
+
+def glucose_effect_values(
+        times,
+        dose_starts, dose_ends, dose_units, dose_sensitivities,
+        model,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Sum the glucose effects of doses at the requested times
+
+    Arguments:
+    times -- int64 array of times to calculate the effect at (seconds)
+    dose_starts -- int64 array of dose start times (seconds)
+    dose_ends -- int64 array of dose end times (seconds)
+    dose_units -- float array of net units delivered by the doses
+    dose_sensitivities -- float array of sensitivities at the dose start
+                          times (mg/dL/U)
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    delay -- the time to delay the dose effect (mins)
+    delta -- the differential between timeline entries (mins)
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    numpy array of glucose effects (mg/dL) at each time
+    """
+    if curve_table:
+        return curve_table_glucose_effect_values(
+            times,
+            dose_starts, dose_ends, dose_units, dose_sensitivities,
+            curve_table
+        )
+
+    delay *= 60
+    delta *= 60
+
+    (dose_indexes,
+     offsets,
+     fractions,
+     continuous
+     ) = dose_impulses(dose_starts, dose_ends, delta)
+
+    coefficients = -dose_units[dose_indexes] * dose_sensitivities[dose_indexes]
+    impulse_starts = dose_starts[dose_indexes]
+
+    effect_values = numpy.zeros(len(times))
+
+    for block in range(0, len(dose_indexes), IMPULSE_BLOCK_SIZE):
+        rows = slice(block, block + IMPULSE_BLOCK_SIZE)
+        time = times[numpy.newaxis, :] - impulse_starts[rows, numpy.newaxis]
+        offset = offsets[rows, numpy.newaxis]
+
+        activity = fractions[rows, numpy.newaxis] * (
+            1 - percent_effect_remaining_for_model(
+                (time - delay - offset) / 60,
+                model
+            )
+        )
+
+        # segments of a continuous dose are only counted once the timeline
+        # has reached them
+        included = (time >= 0) & (
+            ~continuous[rows, numpy.newaxis]
+            | (offset <= numpy.floor((time + delay) / delta) * delta)
+        )
+
+        effect_values += numpy.dot(
+            coefficients[rows],
+            numpy.where(included, activity, 0)
+        )
+
+    return effect_values
+
+
+def curve_table_glucose_effect_values(
+        times,
+        dose_starts, dose_ends, dose_units, dose_sensitivities,
+        curve_table
+    ):
+    """ Sum the glucose effects of doses at the requested times, using the
+        curve table's running sums for continuous doses instead of
+        splitting them into impulses
+
+    Arguments:
+    times -- int64 array of times to calculate the effect at (seconds)
+    dose_starts -- int64 array of dose start times (seconds)
+    dose_ends -- int64 array of dose end times (seconds)
+    dose_units -- float array of net units delivered by the doses
+    dose_sensitivities -- float array of sensitivities at the dose start
+                          times (mg/dL/U)
+    curve_table -- InsulinCurveTable for the model, delay and delta
+
+    Output:
+    numpy array of glucose effects (mg/dL) at each time
+    """
+    durations = dose_ends - dose_starts
+    continuous = durations > 1.05 * curve_table.delta * 60
+    coefficients = -dose_units * dose_sensitivities
+
+    effect_values = numpy.zeros(len(times))
+
+    for block in range(0, len(dose_starts), IMPULSE_BLOCK_SIZE):
+        rows = slice(block, block + IMPULSE_BLOCK_SIZE)
+        time = times[numpy.newaxis, :] - dose_starts[rows, numpy.newaxis]
+
+        activity = numpy.where(
+            continuous[rows, numpy.newaxis],
+            curve_table.continuous_delivery_effect(
+                time,
+                # momentary doses are masked out; keep their durations
+                # positive so the division is defined
+                numpy.where(continuous, durations, 1)[rows, numpy.newaxis]
+            )[1],
+            1 - curve_table.percent_effect_remaining(time)
+        )
+
+        effect_values += numpy.dot(
+            coefficients[rows],
+            numpy.where(time >= 0, activity, 0)
+        )
+
+    return effect_values
+
+
+def insulin_on_board(
+        dose_types, start_dates, end_dates, values, scheduled_basal_rates,
+        delivered_units,
+        model,
+        start=None,
+        end=None,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Calculates the timeline of insulin remaining for a collection of
+        doses in one batched NumPy evaluation; see
+        insulin_math.insulin_on_board for the reference implementation
+
+    Arguments:
+    dose_types -- list of types of doses (basal, bolus, etc)
+    start_dates -- list of datetime objects representing the dates
+                   the doses started at
+    end_dates -- list of datetime objects representing the dates
+                   the doses ended at
+    values -- list of insulin values for doses
+    scheduled_basal_rates -- basal rates scheduled during the times of doses
+    delivered_units -- units actually delivered by dose
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    start -- datetime object of time to start calculating the IOB timeline
+    end -- datetime object of time to end the IOB timeline
+           (the timeline covers all of the doses unless both are given)
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable built for the same model, delay
+                   and delta, used instead of evaluating the model directly
+
+    Output:
+    Tuple in format (times_iob_was_calculated_at, iob_values (U of insulin))
+    """
+    assert len(dose_types) == len(start_dates) == len(end_dates) ==\
+        len(values) == len(scheduled_basal_rates) == len(delivered_units),\
+        "expected input shapes to match"
+
+    return timeline_insulin_on_board(
+        DoseTimeline.from_lists(
+            dose_types, start_dates, end_dates, values,
+            scheduled_basal_rates, delivered_units
+        ),
+        model,
+        start=start,
+        end=end,
+        delay=delay,
+        delta=delta,
+        curve_table=curve_table
+    )
+
+
+def timeline_insulin_on_board(
+        timeline,
+        model,
+        start=None,
+        end=None,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Calculates the timeline of insulin remaining for a DoseTimeline of
+        prepared doses
+
+    Arguments:
+    timeline -- DoseTimeline of the doses, annotated with the scheduled basal
+                rates
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    start -- datetime object of time to start calculating the IOB timeline
+    end -- datetime object of time to end the IOB timeline
+           (the timeline covers all of the doses unless both are given)
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    Tuple in format (times_iob_was_calculated_at, iob_values (U of insulin))
+    """
+    assert is_matching_curve_table(curve_table, model, delay, delta),\
+        "expected curve table to match the model, delay, and delta"
+
+    if not len(timeline) and not (start is not None and end is not None):
+        return ([], [])
+
+    (iob_dates,
+     iob_seconds
+     ) = simulation_timeline_for_samples(
+         start_times=timeline.start_dates(),
+         end_times=timeline.end_dates(),
+         duration=model[0] * 60 if len(model) == 1 else model[0],
+         delay=delay,
+         delta=delta,
+         start=start,
+         end=end
+         )
+
+    iob_values = (
+        insulin_on_board_values(
+            iob_seconds,
+            timeline.starts,
+            timeline.ends,
+            timeline.net_basal_units(),
+            model,
+            delay,
+            delta,
+            curve_table
+        ).tolist() if len(timeline) else [0 for date in iob_dates]
+    )
+
+    assert len(iob_dates) == len(iob_values), "expected output shape to match"
+    return (iob_dates, iob_values)
+
+
+def iob_at(
+        dose_types, start_dates, end_dates, values, scheduled_basal_rates,
+        delivered_units,
+        model,
+        times,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Calculates the insulin on board at only the requested times (for
+        example, now and a few points after it), instead of over a whole
+        timeline
+
+    Arguments:
+    dose_types -- list of types of doses (basal, bolus, etc)
+    start_dates -- list of datetime objects representing the dates
+                   the doses started at
+    end_dates -- list of datetime objects representing the dates
+                   the doses ended at
+    values -- list of insulin values for doses
+    scheduled_basal_rates -- basal rates scheduled during the times of doses
+    delivered_units -- units actually delivered by dose
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    times -- list of datetime objects to calculate the IOB at
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    List of IOB values (U of insulin), one per time
+    """
+    assert len(dose_types) == len(start_dates) == len(end_dates) ==\
+        len(values) == len(scheduled_basal_rates) == len(delivered_units),\
+        "expected input shapes to match"
+
+    return timeline_iob_at(
+        DoseTimeline.from_lists(
+            dose_types, start_dates, end_dates, values,
+            scheduled_basal_rates, delivered_units
+        ),
+        model,
+        times,
+        delay=delay,
+        delta=delta,
+        curve_table=curve_table
+    )
+
+
+def timeline_iob_at(
+        timeline,
+        model,
+        times,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Calculates the insulin on board of a DoseTimeline at the requested
+        times
+
+    Arguments:
+    timeline -- DoseTimeline of the doses, annotated with the scheduled basal
+                rates
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    times -- list of datetime objects to calculate the IOB at
+    delay -- the time to delay the dose effect
+    delta -- the differential between timeline entries
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    List of IOB values (U of insulin), one per time
+    """
+    assert is_matching_curve_table(curve_table, model, delay, delta),\
+        "expected curve table to match the model, delay, and delta"
+
+    if not len(timeline):
+        return [0 for time in times]
+
+    return insulin_on_board_values(
+        seconds_since_reference_date(times),
+        timeline.starts,
+        timeline.ends,
+        timeline.net_basal_units(),
+        model,
+        delay,
+        delta,
+        curve_table
+    ).tolist()
+
+
+def insulin_on_board_values(
+        times,
+        dose_starts, dose_ends, dose_units,
+        model,
+        delay=10,
+        delta=5,
+        curve_table=None
+    ):
+    """ Sum the insulin remaining from doses at the requested times
+
+    Arguments:
+    times -- int64 array of times to calculate the IOB at (seconds)
+    dose_starts -- int64 array of dose start times (seconds)
+    dose_ends -- int64 array of dose end times (seconds)
+    dose_units -- float array of net units delivered by the doses
+    model -- list of insulin model parameters in format [DIA, peak_time] if
+             exponential model, or [DIA] if Walsh model
+    delay -- the time to delay the dose effect (mins)
+    delta -- the differential between timeline entries (mins)
+    curve_table -- optional InsulinCurveTable for the model, delay and delta
+
+    Output:
+    numpy array of IOB (U of insulin) at each time
+    """
+    # doses that end before they start don't have any insulin on board
+    dose_units = numpy.where(dose_starts <= dose_ends, dose_units, 0)
+
+    if curve_table:
+        return curve_table_insulin_on_board_values(
+            times, dose_starts, dose_ends, dose_units, curve_table
+        )
+
+    delay *= 60
+    delta *= 60
+
+    (dose_indexes,
+     offsets,
+     fractions,
+     continuous
+     ) = dose_impulses(dose_starts, dose_ends, delta)
+
+    coefficients = dose_units[dose_indexes]
+    impulse_starts = dose_starts[dose_indexes]
+
+    iob_values = numpy.zeros(len(times))
+
+    for block in range(0, len(dose_indexes), IMPULSE_BLOCK_SIZE):
+        rows = slice(block, block + IMPULSE_BLOCK_SIZE)
+        time = times[numpy.newaxis, :] - impulse_starts[rows, numpy.newaxis]
+        offset = offsets[rows, numpy.newaxis]
+
+        remaining = fractions[rows, numpy.newaxis] * (
+            percent_effect_remaining_for_model(
+                (time - delay - offset) / 60,
+                model
+            )
+        )
+
+        # segments of a continuous dose are only counted once the timeline
+        # has reached them
+        included = (time >= 0) & (
+            ~continuous[rows, numpy.newaxis]
+            | (offset <= numpy.floor((time + delay) / delta) * delta)
+        )
+
+        iob_values += numpy.dot(
+            coefficients[rows],
+            numpy.where(included, remaining, 0)
+        )
+
+    return iob_values
+
+
+def curve_table_insulin_on_board_values(
+        times,
+        dose_starts, dose_ends, dose_units,
+        curve_table
+    ):
+    """ Sum the insulin remaining from doses at the requested times, using
+        the curve table's running sums for continuous doses
+
+    Arguments:
+    times -- int64 array of times to calculate the IOB at (seconds)
+    dose_starts -- int64 array of dose start times (seconds)
+    dose_ends -- int64 array of dose end times (seconds)
+    dose_units -- float array of net units delivered by the doses
+    curve_table -- InsulinCurveTable for the model, delay and delta
+
+    Output:
+    numpy array of IOB (U of insulin) at each time
+    """
+    durations = dose_ends - dose_starts
+    continuous = durations > 1.05 * curve_table.delta * 60
+
+    iob_values = numpy.zeros(len(times))
+
+    for block in range(0, len(dose_starts), IMPULSE_BLOCK_SIZE):
+        rows = slice(block, block + IMPULSE_BLOCK_SIZE)
+        time = times[numpy.newaxis, :] - dose_starts[rows, numpy.newaxis]
+
+        (delivered,
+         activity
+         ) = curve_table.continuous_delivery_effect(
+             time,
+             # momentary doses are masked out; keep their durations
+             # positive so the division is defined
+             numpy.where(continuous, durations, 1)[rows, numpy.newaxis]
+         )
+        remaining = numpy.where(
+            continuous[rows, numpy.newaxis],
+            delivered - activity,
+            curve_table.percent_effect_remaining(time)
+        )
+
+        iob_values += numpy.dot(
+            dose_units[rows],
+            numpy.where(time >= 0, remaining, 0)
+        )
+
+    return iob_values
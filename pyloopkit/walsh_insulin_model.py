@@ -9,6 +9,15 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 57a9f2ba65ae3765ef7baafe66b883e654e08391/LoopKit/InsulinKit/
 WalshInsulinModel.swift
 """
+import numpy
+
+# polynomial coefficients (highest power first) for each clamped DIA (hours)
+WALSH_COEFFICIENTS = {
+    3: [-3.2030e-9, 1.354e-6, -1.759e-4, 9.255e-4, 0.99951],
+    4: [-3.310e-10, 2.530e-7, -5.510e-5, -9.086e-4, 0.99950],
+    5: [-2.950e-10, 2.320e-7, -5.550e-5, 4.490e-4, 0.99300],
+    6: [-1.493e-10, 1.413e-7, -4.095e-5, 6.365e-4, 0.99700],
+}
 
 
 def walsh_percent_effect_remaining(minutes, action_duration):
@@ -47,3 +56,26 @@ def walsh_percent_effect_remaining(minutes, action_duration):
             - 4.095e-5 * pow(minutes, 2) + 6.365e-4 * minutes + 0.99700
 
     raise RuntimeError
+
+
+def vectorized_walsh_percent_effect_remaining(minutes, action_duration):
+    """ Array version of walsh_percent_effect_remaining
+
+        Arguments:
+        minutes -- array of minutes after insulin delivery
+        action_duration -- duration of insulin action, in hours
+
+        Output:
+        numpy array of the percent of insulin remaining at each time
+    """
+    minutes = numpy.asarray(minutes, dtype=numpy.float64)
+
+    dia = min(6, max(3, round(action_duration)))
+    (c_4, c_3, c_2, c_1, c_0) = WALSH_COEFFICIENTS[dia]
+
+    scaled = minutes * dia / action_duration
+    remaining = (c_4 * numpy.power(scaled, 4) + c_3 * numpy.power(scaled, 3)
+                 + c_2 * numpy.power(scaled, 2) + c_1 * scaled + c_0)
+
+    remaining = numpy.where(minutes <= 0, 1.0, remaining)
+    return numpy.where(minutes >= action_duration * 60, 0.0, remaining)
@@ -11,6 +11,8 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 import json
 import os
 
+from pyloopkit.pyloop_parser import parse_report_with_name
+
 
 def load_fixture(resource_name, extension):
     """ Load file given name and extension
@@ -76,3 +78,16 @@ def find_root_path(resource_name, extension):
 
     print("No file found for that key")
     return ""
+
+
+def load_report_input(resource_name):
+    """ Load the input of an issue report, without running it through the
+        Loop algorithm
+
+    Arguments:
+    resource_name -- name of the issue report without the ".json" extension
+
+    Output:
+    input dictionary in the format expected by loop_data_manager.update
+    """
+    return parse_report_with_name(find_full_path(resource_name, ".json"))
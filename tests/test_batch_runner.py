@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 20:41:05 2026
+"""
+# pylint: disable=C0111, R0201
+import os
+import unittest
+
+from pyloopkit.batch_runner import (curve_tables_used, run_many,
+                                    run_reports, update_many)
+from pyloopkit.pyloop_parser import parse_report_and_run_with_name
+from .loop_kit_tests import find_root_path
+
+
+def exit_on_odd(item):
+    """ Kill the worker process if the item is odd """
+    if item % 2:
+        os._exit(1)  # pylint: disable=W0212
+    return item
+
+
+class TestBatchRunner(unittest.TestCase):
+    """ unittest class to run tests of the batch runner """
+    REPORT_NAMES = [
+        "basal_and_bolus_report",
+        "high_bg_recommended_basal_and_bolus_report",
+        "loop_issue_report",
+    ]
+
+    def report_paths(self):
+        return [
+            os.path.join(find_root_path(name, ".json"), name + ".json")
+            for name in self.REPORT_NAMES
+        ]
+
+    def assert_same_output(self, expected, output):
+        self.assertEqual(
+            {key: value for (key, value) in expected.items()
+             if key != "input_data"},
+            {key: value for (key, value) in output.items()
+             if key != "input_data"}
+        )
+
+    def test_run_reports(self):
+        paths = self.report_paths()
+        missing_path = os.path.join(os.path.dirname(paths[0]), "missing.json")
+
+        results = {
+            path: (output, error) for (path, output, error)
+            in run_reports(paths + [missing_path], workers=2, chunksize=1)
+        }
+
+        self.assertEqual(len(paths) + 1, len(results))
+        for path in paths:
+            (output, error) = results[path]
+            self.assertIsNone(error)
+            self.assert_same_output(
+                parse_report_and_run_with_name(path), output
+            )
+
+        # a failing report doesn't stop the batch
+        (output, error) = results[missing_path]
+        self.assertIsNone(output)
+        self.assertIn("FileNotFoundError", error)
+
+    def test_update_many_in_process(self):
+        inputs = [
+            parse_report_and_run_with_name(path).get("input_data")
+            for path in self.report_paths()
+        ]
+
+        results = sorted(
+            update_many(inputs + [{}], workers=0),
+            key=lambda result: result[0]
+        )
+
+        self.assertEqual(len(inputs) + 1, len(results))
+        for (index, output, error) in results[:-1]:
+            self.assertIsNone(error)
+            self.assert_same_output(
+                parse_report_and_run_with_name(self.report_paths()[index]),
+                output
+            )
+        self.assertIsNotNone(results[-1][2])
+
+    def test_run_many_crashed_worker(self):
+        results = {
+            key: (output, error) for (key, output, error)
+            in run_many(exit_on_odd, [(i, i) for i in range(0, 4)],
+                        workers=1, chunksize=1)
+        }
+
+        # the items of the chunks that didn't finish are reported as errors
+        # instead of ending the batch
+        self.assertEqual([0, 1, 2, 3], sorted(results))
+        (output, error) = results[1]
+        self.assertIsNone(output)
+        self.assertIn("BrokenProcessPool", error)
+        for (output, error) in results.values():
+            self.assertTrue(error is None or "BrokenProcessPool" in error)
+
+    def test_curve_tables_used(self):
+        inputs = [
+            parse_report_and_run_with_name(path).get("input_data")
+            for path in self.report_paths()
+        ]
+        self.assertEqual([], curve_tables_used(inputs + [{}]))
+
+        for input_dict in inputs:
+            input_dict["settings_dictionary"] = dict(
+                input_dict["settings_dictionary"],
+                use_insulin_curve_tables=True
+            )
+        self.assertEqual(
+            sorted(set(
+                (tuple(input_dict["settings_dictionary"]["model"]),
+                 input_dict["settings_dictionary"].get("insulin_delay") or 10)
+                for input_dict in inputs
+            )),
+            sorted(curve_tables_used(inputs))
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
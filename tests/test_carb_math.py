@@ -14,8 +14,10 @@ from datetime import datetime, time, timedelta
 
 #from . import path_grabber  # pylint: disable=unused-import
 from .loop_kit_tests import load_fixture
+from pyloopkit import carb_status
 from pyloopkit.carb_math import (map_, carb_glucose_effects, carbs_on_board,
-                       dynamic_carbs_on_board, dynamic_glucose_effects)
+                       dynamic_carbs_on_board, dynamic_glucose_effects,
+                       active_entries)
 
 
 class TestCarbKitFunctions(unittest.TestCase):
@@ -193,6 +195,109 @@ class TestCarbKitFunctions(unittest.TestCase):
         self.assertEqual(len(absorptions), 1)
         self.assertEqual(absorptions[0][6], 0)
 
+    def test_active_entries(self):
+        start = datetime.fromisoformat("2015-10-15T18:00:00")
+        entry_starts = [
+            start + timedelta(minutes=minutes)
+            for minutes in [60, 0, 30, 30, 200]
+        ]
+        entry_end_dates = [
+            entry_start + timedelta(minutes=minutes)
+            for (entry_start, minutes)
+            in zip(entry_starts, [90, 300, 30, 5, 60])
+        ]
+        effect_starts = [
+            start + timedelta(minutes=minutes)
+            for minutes in range(-10, 320, 5)
+        ]
+
+        def expected_entries(effect_start):
+            return [
+                j for j in range(0, len(entry_starts))
+                if entry_starts[j] <= effect_start < entry_end_dates[j]
+            ]
+
+        # sorted effects use the sweep; unsorted ones check every entry
+        for effects in [effect_starts, list(reversed(effect_starts))]:
+            active = list(
+                active_entries(effects, entry_starts, entry_end_dates)
+            )
+
+            self.assertEqual(len(effects), len(active))
+            for (effect_start, entries) in zip(effects, active):
+                self.assertEqual(expected_entries(effect_start), entries)
+
+        self.assertEqual(
+            [[], []],
+            list(active_entries(effect_starts[0:2], [], []))
+        )
+
+    def test_observed_absorption_sums(self):
+        (carb_starts,
+         carb_values,
+         carb_absorptions
+         ) = self.load_carb_entry_fixture()
+        default_absorption_times = self.DEFAULT_ABSORPTION_TIMES
+
+        # fully and partially observed absorption
+        for (fixture_name, entry_index) in [("ice_1_hour_input", 0),
+                                            ("ice_35_min_input", 0)]:
+            input_ice = self.load_ice_input_fixture(fixture_name)
+            entry = (
+                carb_starts[entry_index],
+                carb_values[entry_index],
+                carb_absorptions[entry_index]
+            )
+
+            (absorptions,
+             timelines,
+             entries  # pylint: disable=W0612
+             ) = map_(
+                 [entry[0]], [entry[1]], [entry[2]],
+                 *input_ice,
+                 *self.load_schedules(),
+                 self.INSULIN_SENSITIVITY_START_DATES,
+                 self.INSULIN_SENSITIVITY_END_DATES,
+                 self.INSULIN_SENSITIVITY_VALUES,
+                 default_absorption_times[1] / default_absorption_times[0],
+                 default_absorption_times[1],
+                 0
+                 )
+
+            observed_sums = carb_status.observed_absorption_sums(timelines[0])
+            self.assertIsNotNone(observed_sums)
+
+            for minutes in range(-10, 360, 5):
+                at_date = input_ice[0][0] + timedelta(minutes=minutes)
+                absorbed_args = (
+                    *entry[0:2], absorptions[0], timelines[0], at_date,
+                    entry[2], 10, 5
+                )
+                cob_args = (
+                    *entry[0:2], absorptions[0], timelines[0], at_date,
+                    default_absorption_times[1], 10, 5, entry[2]
+                )
+
+                self.assertAlmostEqual(
+                    carb_status.dynamic_absorbed_carbs(*absorbed_args),
+                    carb_status.dynamic_absorbed_carbs(
+                        *absorbed_args, observed_sums=observed_sums
+                    ),
+                    9
+                )
+                self.assertAlmostEqual(
+                    carb_status.dynamic_carbs_on_board_helper(*cob_args),
+                    carb_status.dynamic_carbs_on_board_helper(
+                        *cob_args, observed_sums=observed_sums
+                    ),
+                    9
+                )
+
+        self.assertIsNone(carb_status.observed_absorption_sums([]))
+        self.assertIsNone(
+            carb_status.observed_absorption_sums([[None, None, None]])
+        )
+
     """ Tests for carb_glucose_effects """
     def test_carb_effect_from_history(self):
         input_ = self.load_history_fixture("carb_effect_from_history_input")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 01:40:52 2026
+"""
+# pylint: disable=C0111, R0201
+from copy import deepcopy
+from datetime import timedelta
+import unittest
+
+from pyloopkit.counterfactual import counterfactual_update
+from pyloopkit.dose import DoseType
+from pyloopkit.loop_data_manager import update
+from .loop_kit_tests import load_report_input
+
+
+class TestCounterfactual(unittest.TestCase):
+    """ unittest class to run tests of counterfactual updates """
+    def assert_same_cycle(self, expected, actual):
+        for key in ["predicted_glucose_dates",
+                    "recommended_temp_basal",
+                    "recommended_bolus",
+                    "recommended_autobolus",
+                    "carbs_on_board"]:
+            self.assertEqual(expected.get(key), actual.get(key))
+
+        for (expected_value, value) in zip(
+                expected.get("predicted_glucose_values"),
+                actual.get("predicted_glucose_values")
+            ):
+            self.assertAlmostEqual(expected_value, value, 8)
+
+    def test_hypothetical_bolus(self):
+        input_dict = load_report_input("basal_and_bolus_report")
+        recommendations = update(deepcopy(input_dict))
+        bolus_time = input_dict.get("time_to_calculate_at")
+
+        counterfactual = counterfactual_update(
+            recommendations,
+            [DoseType.bolus], [bolus_time], [bolus_time], [1.5]
+        )
+
+        for (key, value) in [("dose_types", DoseType.bolus),
+                             ("dose_start_times", bolus_time),
+                             ("dose_end_times", bolus_time),
+                             ("dose_values", 1.5),
+                             ("dose_delivered_units", None)]:
+            input_dict[key] = list(input_dict[key]) + [value]
+        self.assert_same_cycle(update(input_dict), counterfactual)
+
+        # the original cycle is unchanged
+        self.assertEqual(
+            recommendations.get("predicted_glucose_values"),
+            update(deepcopy(recommendations.get("input_data")))
+            .get("predicted_glucose_values")
+        )
+
+    def test_hypothetical_carbs(self):
+        input_dict = load_report_input("basal_and_bolus_report")
+        input_dict["settings_dictionary"][
+            "dynamic_carb_absorption_enabled"
+        ] = False
+        recommendations = update(deepcopy(input_dict))
+        carb_time = (
+            input_dict.get("time_to_calculate_at") + timedelta(minutes=10)
+        )
+
+        counterfactual = counterfactual_update(
+            recommendations,
+            carb_dates=[carb_time],
+            carb_values=[45],
+            carb_absorption_times=[180]
+        )
+
+        for (key, value) in [("carb_dates", carb_time),
+                             ("carb_values", 45),
+                             ("carb_absorption_times", 180)]:
+            input_dict[key] = list(input_dict[key]) + [value]
+        self.assert_same_cycle(update(input_dict), counterfactual)
+
+    def test_no_hypotheticals(self):
+        recommendations = update(
+            load_report_input("basal_and_bolus_report")
+        )
+
+        self.assert_same_cycle(
+            recommendations, counterfactual_update(recommendations)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,8 +10,14 @@ from datetime import datetime, time, timedelta
 import unittest
 
 #from . import path_grabber  # pylint: disable=unused-import
-from pyloopkit.carb_store import get_carb_glucose_effects, get_carbs_on_board
-from pyloopkit.dose_store import get_glucose_effects
+from pyloopkit.carb_store import (CarbAbsorptionState, get_carb_glucose_effects,
+                                  get_carbs_on_board)
+from pyloopkit.dose_effect_cache import DoseEffectCache
+from pyloopkit.dose_store import (
+    get_glucose_effects, get_timeline_glucose_effects, prepare_doses,
+    prepare_dose_timeline
+)
+from pyloopkit.dose_timeline import DoseTimeline
 from pyloopkit.dose import DoseType
 from pyloopkit.glucose_store import (
     get_recent_momentum_effects, get_counteraction_effects
@@ -433,6 +439,141 @@ class TestDataStoreFunctions(unittest.TestCase):
                 expected_values[i], effect_values[i], delta=3
             )
 
+    def test_glucose_effects_numpy_engine(self):
+        time_to_calculate = datetime(2016, 2, 15, 14, 55, 0)
+        inputs = (
+            *self.load_insulin_data("reconcile_history"),
+            time_to_calculate,
+            *self.load_scheduled_basals("basal_schedule"),
+            *self.load_sensitivities("insulin_sensitivity_schedule"),
+            self.load_settings("walsh_settings").get("model")
+        )
+
+        (expected_dates,
+         expected_values
+         ) = get_glucose_effects(*inputs)
+        (effect_dates,
+         effect_values
+         ) = get_glucose_effects(*inputs, engine="numpy")
+
+        self.assertEqual(expected_dates, effect_dates)
+        for i in range(0, len(expected_dates)):
+            self.assertAlmostEqual(
+                expected_values[i], effect_values[i], 9
+            )
+
+        with self.assertRaises(NotImplementedError):
+            get_glucose_effects(*inputs, engine="fortran")
+
+    def test_glucose_effects_shared_effect_cache(self):
+        time_to_calculate = datetime(2016, 2, 15, 14, 55, 0)
+        dose_inputs = self.load_insulin_data("reconcile_history")
+        other_inputs = (
+            *self.load_scheduled_basals("basal_schedule"),
+            *self.load_sensitivities("insulin_sensitivity_schedule"),
+            self.load_settings("walsh_settings").get("model")
+        )
+
+        effect_cache = DoseEffectCache()
+        for start_date in [
+                time_to_calculate - timedelta(hours=3), time_to_calculate
+            ]:
+            expected = get_glucose_effects(
+                *dose_inputs, start_date, *other_inputs
+            )
+            effects = get_glucose_effects(
+                *dose_inputs, start_date, *other_inputs,
+                effect_cache=effect_cache
+            )
+
+            self.assertEqual(expected, effects)
+
+    def test_glucose_effects_bounded_effect_cache(self):
+        time_to_calculate = datetime(2016, 2, 15, 14, 55, 0)
+        dose_inputs = self.load_insulin_data("reconcile_history")
+        other_inputs = (
+            *self.load_scheduled_basals("basal_schedule"),
+            *self.load_sensitivities("insulin_sensitivity_schedule"),
+            self.load_settings("walsh_settings").get("model")
+        )
+
+        # a cache that can't hold all of the doses gives the same effects
+        effect_cache = DoseEffectCache(max_doses=3)
+        for start_date in [
+                time_to_calculate - timedelta(hours=3), time_to_calculate
+            ]:
+            self.assertEqual(
+                get_glucose_effects(*dose_inputs, start_date, *other_inputs),
+                get_glucose_effects(
+                    *dose_inputs, start_date, *other_inputs,
+                    effect_cache=effect_cache
+                )
+            )
+            self.assertEqual(3, len(effect_cache))
+
+    def test_dose_effect_cache_least_recently_used(self):
+        effect_cache = DoseEffectCache(max_doses=2)
+        effect_cache.dose_effects("a")[0] = 1.0
+        effect_cache.dose_effects("b")[0] = 2.0
+        effect_cache.dose_effects("a")
+        effect_cache.dose_effects("c")
+
+        self.assertEqual(["a", "c"], list(effect_cache.effects))
+        self.assertEqual({0: 1.0}, effect_cache.dose_effects("a"))
+        self.assertEqual({}, effect_cache.dose_effects("b"))
+
+        effect_cache.retain_used()
+        effect_cache.dose_effects("b")
+        effect_cache.retain_used()
+        self.assertEqual(["b"], list(effect_cache.effects))
+
+    def test_glucose_effects_dose_timeline(self):
+        schedules = (
+            *self.load_scheduled_basals("basal_schedule"),
+            *self.load_sensitivities("insulin_sensitivity_schedule")
+        )
+
+        for (resource_name, settings_name) in [
+                ("bolus_dose", "walsh_settings"),
+                ("short_basal_dose", "exponential_settings"),
+                ("long_basal_dose", "exponential_settings"),
+                ("reconcile_history", "walsh_settings")
+            ]:
+            dose_inputs = self.load_insulin_data(resource_name)
+            timeline = DoseTimeline.from_lists(
+                *dose_inputs[0:4], delivered_units=dose_inputs[4]
+            )
+            model = self.load_settings(settings_name).get("model")
+            start_date = max(dose_inputs[1]) - timedelta(hours=1)
+
+            self.assertEqual(
+                list(prepare_doses(
+                    *dose_inputs, start_date, *schedules[0:3], model
+                )),
+                list(prepare_dose_timeline(
+                    timeline, start_date, *schedules[0:3], model
+                ).to_lists())
+            )
+
+            for engine in ["python", "numpy"]:
+                self.assertEqual(
+                    get_glucose_effects(
+                        *dose_inputs, start_date, *schedules, model,
+                        engine=engine
+                    ),
+                    get_timeline_glucose_effects(
+                        timeline, start_date, *schedules, model,
+                        engine=engine
+                    ),
+                    resource_name
+                )
+
+        with self.assertRaises(NotImplementedError):
+            get_timeline_glucose_effects(
+                timeline, start_date, *schedules, model,
+                engine="fortran"
+            )
+
     """ Tests for get_recent_momentum_effects """
     def test_momentum_bouncing_glucose(self):
         glucose_data = self.load_glucose_data(
@@ -928,6 +1069,34 @@ class TestDataStoreFunctions(unittest.TestCase):
                 expected_values[i], effect_values[i], 2
             )
 
+    def test_carb_absorption_state(self):
+        input_ice = self.load_glucose_velocities("ice_35_min_input")
+        carb_inputs = (
+            *self.load_carb_data("carb_entry_input"),
+            datetime.fromisoformat("2015-10-15T21:35:00"),
+            *input_ice,
+            *self.load_carb_ratios(),
+            self.INSULIN_SENSITIVITY_START_DATES,
+            self.INSULIN_SENSITIVITY_END_DATES,
+            self.INSULIN_SENSITIVITY_VALUES,
+            self.DEFAULT_ABSORPTION_TIMES
+        )
+        end_date = datetime.fromisoformat("2015-10-16T03:35:00")
+
+        absorption_state = CarbAbsorptionState()
+        for function in [get_carb_glucose_effects, get_carbs_on_board]:
+            expected = function(*carb_inputs, end_date=end_date)
+            output = function(
+                *carb_inputs,
+                end_date=end_date,
+                absorption_state=absorption_state
+            )
+
+            self.assertEqual(expected, output)
+
+        # both functions map the same carb entries
+        self.assertEqual(1, len(absorption_state.absorptions))
+
     def test_dynamic_cob_edge_cases(self):
         input_ice = self.load_glucose_velocities("ice_slow_absorption")
 
@@ -14,7 +14,13 @@ from datetime import time, datetime, timedelta
 
 #from . import path_grabber  # pylint: disable=unused-import
 from .loop_kit_tests import load_fixture
-from pyloopkit.dose_math import recommended_temp_basal, recommended_bolus
+from pyloopkit.dose_math import (recommended_temp_basal, recommended_bolus,
+                                 recommended_autobolus, glucose_correction,
+                                 insulin_correction,
+                                 vectorized_insulin_correction,
+                                 recommend_grid)
+from pyloopkit.insulin_curve_table import get_insulin_curve_table
+from pyloopkit.insulin_math import find_ratio_at_time
 from pyloopkit.dose import DoseType
 
 
@@ -712,5 +718,213 @@ class TestDoseMathFunctions(unittest.TestCase):
         self.assertEqual(0, dose[0])
 
 
+    """ Tests for recommendations using an insulin curve table """
+    def test_recommendations_with_curve_table(self):
+        for name in ["recommend_temp_basal_flat_and_high",
+                     "recommend_temp_basal_high_and_falling",
+                     "recommend_temp_basal_start_very_low_end_high",
+                     "recommend_temp_basal_very_low_end_in_range"]:
+            glucose = self.load_glucose_value_fixture(name)
+
+            for model in [self.MODEL, self.WALSH_MODEL]:
+                arguments = (
+                    *glucose,
+                    *self.TARGET_RANGE,
+                    glucose[0][0],
+                    self.SUSPEND_THRESHOLD,
+                    *self.SENSITIVITY,
+                    model
+                )
+                table = get_insulin_curve_table(model)
+
+                self.assertEqual(
+                    recommended_temp_basal(
+                        *arguments,
+                        *self.basal_rate_schedule(),
+                        self.MAX_BASAL_RATE,
+                        None
+                    ),
+                    recommended_temp_basal(
+                        *arguments,
+                        *self.basal_rate_schedule(),
+                        self.MAX_BASAL_RATE,
+                        None,
+                        curve_table=table
+                    )
+                )
+                self.assertEqual(
+                    recommended_bolus(
+                        *arguments, 0, self.MAX_BOLUS, 0.025
+                    ),
+                    recommended_bolus(
+                        *arguments, 0, self.MAX_BOLUS, 0.025,
+                        curve_table=table
+                    )
+                )
+
+    """ Tests for recommendations from a shared glucose correction """
+    def test_recommendations_from_glucose_correction(self):
+        for name in ["recommend_temp_basal_flat_and_high",
+                     "recommend_temp_basal_high_and_falling",
+                     "recommend_temp_basal_start_very_low_end_high",
+                     "recommend_temp_basal_very_low_end_in_range"]:
+            glucose = self.load_glucose_value_fixture(name)
+
+            arguments = (
+                *glucose,
+                *self.TARGET_RANGE,
+                glucose[0][0],
+                self.SUSPEND_THRESHOLD,
+                *self.SENSITIVITY,
+                self.MODEL
+            )
+            correction = glucose_correction(*arguments)
+
+            self.assertEqual(
+                recommended_temp_basal(
+                    *arguments,
+                    *self.basal_rate_schedule(),
+                    self.MAX_BASAL_RATE,
+                    None
+                ),
+                recommended_temp_basal(
+                    *arguments,
+                    *self.basal_rate_schedule(),
+                    self.MAX_BASAL_RATE,
+                    None,
+                    correction=correction
+                )
+            )
+            self.assertEqual(
+                recommended_bolus(*arguments, 0, self.MAX_BOLUS, 0.025),
+                recommended_bolus(
+                    *arguments, 0, self.MAX_BOLUS, 0.025,
+                    correction=correction
+                )
+            )
+            self.assertEqual(
+                recommended_autobolus(
+                    *arguments, 0, self.MAX_BOLUS,
+                    partial_application_factor=0.4
+                ),
+                recommended_autobolus(
+                    *arguments, 0, self.MAX_BOLUS,
+                    partial_application_factor=0.4,
+                    correction=correction
+                )
+            )
+
+        self.assertIsNone(
+            glucose_correction(
+                [], [],
+                *self.TARGET_RANGE,
+                datetime.now(),
+                self.SUSPEND_THRESHOLD,
+                *self.SENSITIVITY,
+                self.MODEL
+            )
+        )
+
+    """ Tests for vectorized_insulin_correction """
+    def test_vectorized_insulin_correction(self):
+        for name in ["recommend_temp_basal_no_change_glucose",
+                     "recommend_temp_basal_start_high_end_low",
+                     "recommend_temp_basal_start_low_end_high",
+                     "recommend_temp_basal_correct_low_at_min",
+                     "recommend_temp_basal_dropping_then_rising",
+                     "recommend_temp_basal_flat_and_high",
+                     "recommend_temp_basal_high_and_falling",
+                     "recommend_temp_basal_in_range_and_rising",
+                     "recommend_temp_basal_very_low_end_in_range"]:
+            glucose = self.load_glucose_value_fixture(name)
+
+            for model in [self.MODEL, self.WALSH_MODEL]:
+                for table in [None, get_insulin_curve_table(model)]:
+                    arguments = (
+                        *glucose,
+                        *self.TARGET_RANGE,
+                        glucose[0][0],
+                        self.SUSPEND_THRESHOLD,
+                        self.INSULIN_SENSITIVITY_VALUES[0],
+                        model,
+                        table
+                    )
+                    expected = insulin_correction(*arguments)
+                    correction = vectorized_insulin_correction(*arguments)
+
+                    self.assertEqual(expected[:-1], correction[:-1])
+                    self.assertAlmostEqual(expected[-1], correction[-1], 10)
+
+        self.assertIsNone(
+            vectorized_insulin_correction(
+                [], [],
+                *self.TARGET_RANGE,
+                datetime.now(),
+                self.SUSPEND_THRESHOLD,
+                self.INSULIN_SENSITIVITY_VALUES[0],
+                self.MODEL
+            )
+        )
+
+    """ Tests for recommend_grid """
+    def test_recommend_grid(self):
+        variants = [
+            {"sensitivity": sensitivity,
+             "target_min": target_min,
+             "target_max": target_min + 30,
+             "max_basal_rate": max_basal_rate,
+             "max_bolus": self.MAX_BOLUS}
+            for sensitivity in [30, 60, 90]
+            for target_min in [80, 100]
+            for max_basal_rate in [1, self.MAX_BASAL_RATE]
+        ]
+        variants.append(dict(variants[0], suspend_threshold=70))
+
+        for name in ["recommend_temp_basal_no_change_glucose",
+                     "recommend_temp_basal_start_high_end_low",
+                     "recommend_temp_basal_start_low_end_high",
+                     "recommend_temp_basal_flat_and_high",
+                     "recommend_temp_basal_high_and_falling",
+                     "recommend_temp_basal_very_low_end_in_range"]:
+            glucose = self.load_glucose_value_fixture(name)
+            grid = recommend_grid(
+                *glucose,
+                glucose[0][0],
+                self.MODEL,
+                variants,
+                find_ratio_at_time(
+                    self.basal_rate_schedule()[0], [],
+                    self.basal_rate_schedule()[1],
+                    glucose[0][0]
+                ),
+                volume_rounder=0.025
+            )
+
+            for (i, variant) in enumerate(variants):
+                arguments = (
+                    *glucose,
+                    [time(0)], [time(0)],
+                    [variant["target_min"]], [variant["target_max"]],
+                    glucose[0][0],
+                    variant.get("suspend_threshold"),
+                    [time(0)], [time(0)], [variant["sensitivity"]],
+                    self.MODEL
+                )
+                self.assertEqual(
+                    recommended_temp_basal(
+                        *arguments,
+                        *self.basal_rate_schedule(),
+                        variant["max_basal_rate"],
+                        None
+                    ),
+                    grid["recommended_temp_basals"][i]
+                )
+                self.assertEqual(
+                    recommended_bolus(
+                        *arguments, 0, variant["max_bolus"], 0.025
+                    ),
+                    grid["recommended_boluses"][i]
+                )
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 23:41:09 2026
+"""
+# pylint: disable=C0111, R0201
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import numpy
+
+from pyloopkit.dose import DoseType
+from pyloopkit.dose_entry import net_basal_units
+from pyloopkit.dose_math import filter_date_range_for_doses
+from pyloopkit.dose_timeline import DoseTimeline
+from pyloopkit.insulin_math import trim
+
+
+class TestDoseTimeline(unittest.TestCase):
+    """ unittest class to run tests of the dose timeline """
+    START = datetime(2019, 8, 15, 12, 0, tzinfo=timezone.utc)
+
+    def dose_lists(self):
+        starts = [
+            self.START + timedelta(minutes=minutes)
+            for minutes in [0, 10, 10, 40, 45, 90]
+        ]
+        return (
+            [DoseType.tempbasal, DoseType.bolus, DoseType.tempbasal,
+             DoseType.suspend, DoseType.basal, DoseType.bolus],
+            starts,
+            [starts[0] + timedelta(minutes=30),
+             starts[1],
+             starts[2] + timedelta(minutes=30),
+             starts[3] + timedelta(minutes=20),
+             starts[4] + timedelta(minutes=45),
+             starts[5]],
+            [1.5, 2.0, 0.0, 0.0, 0.8, 0.5],
+            [0.8, 0, 0.8, 0.8, 0.8, 0],
+            [0.7, None, 0, None, None, 0.45]
+        )
+
+    def test_round_trip(self):
+        lists = self.dose_lists()
+        timeline = DoseTimeline.from_lists(*lists)
+
+        self.assertEqual(6, len(timeline))
+        self.assertEqual(numpy.int8, timeline.types.dtype)
+        self.assertEqual(numpy.int64, timeline.starts.dtype)
+        self.assertEqual(
+            [DoseType.bolus.value], timeline.types[1:2].tolist()
+        )
+        self.assertEqual(list(lists), list(timeline.to_lists()))
+
+        # without annotations or delivered units
+        unannotated = DoseTimeline.from_lists(*lists[0:4])
+        self.assertEqual([0] * 6, unannotated.scheduled_rates.tolist())
+        self.assertEqual([None] * 6, unannotated.delivered_unit_list())
+
+    def test_slices_are_views(self):
+        timeline = DoseTimeline.from_lists(*self.dose_lists())
+
+        sliced = timeline[1:3]
+        self.assertEqual(2, len(sliced))
+        self.assertTrue(numpy.shares_memory(sliced.starts, timeline.starts))
+        self.assertEqual(timeline.start_dates()[1:3], sliced.start_dates())
+
+        self.assertIs(timeline, timeline.sorted())
+
+        unsorted = timeline[[3, 1, 2, 0]]
+        self.assertEqual(
+            [DoseType.tempbasal, DoseType.bolus, DoseType.tempbasal,
+             DoseType.suspend],
+            unsorted.sorted().dose_types()
+        )
+
+    def seconds(self, date):
+        return int(
+            (date - datetime(2001, 1, 1, tzinfo=timezone.utc)).total_seconds()
+        )
+
+    def test_between(self):
+        lists = self.dose_lists()
+        timeline = DoseTimeline.from_lists(*lists)
+        (start, end) = (lists[1][2], lists[1][4])
+
+        self.assertIs(timeline, timeline.between())
+        self.assertEqual(
+            list(filter_date_range_for_doses(
+                *lists[0:4], lists[5], start, end
+            )),
+            [
+                column for (i, column) in enumerate(
+                    timeline.between(
+                        self.seconds(start), self.seconds(end)
+                    ).to_lists()
+                ) if i != 4
+            ]
+        )
+
+    def test_trimmed(self):
+        lists = self.dose_lists()
+        (start, end) = (
+            self.START + timedelta(minutes=15),
+            self.START + timedelta(minutes=50)
+        )
+
+        trimmed = DoseTimeline.from_lists(*lists).trimmed(
+            self.seconds(start), self.seconds(end)
+        )
+
+        expected = [
+            trim(*dose, start_interval=start, end_interval=end)
+            for dose in zip(*lists)
+        ]
+        self.assertEqual(
+            [list(column) for column in zip(*expected)],
+            list(trimmed.to_lists())
+        )
+
+    def test_net_basal_units(self):
+        lists = self.dose_lists()
+
+        self.assertEqual(
+            [net_basal_units(*dose) for dose in zip(
+                lists[0], lists[3], lists[1], lists[2], lists[4], lists[5]
+            )],
+            DoseTimeline.from_lists(*lists).net_basal_units().tolist()
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
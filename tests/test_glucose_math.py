@@ -11,11 +11,13 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 # pylint: disable=C0111, C0411, R0201, W0105, W0612, C0200
 # diable pylint warnings for too many arguments/variables and missing docstring
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 
 #from . import path_grabber  # pylint: disable=unused-import
 from .loop_kit_tests import load_fixture
+from pyloopkit.counteraction_tracker import CounteractionTracker
 from pyloopkit.glucose_math import linear_momentum_effect, counteraction_effects
+from pyloopkit.momentum_estimator import MomentumEstimator
 
 
 class TestGlucoseKitFunctions(unittest.TestCase):
@@ -399,6 +401,52 @@ class TestGlucoseKitFunctions(unittest.TestCase):
             0, len(glucose_effect_dates)
         )
 
+    """ Tests for MomentumEstimator """
+    def test_momentum_estimator(self):
+        for resource_name in [
+                "momentum_effect_bouncing_glucose_input",
+                "momentum_effect_display_only_glucose_input",
+                "momentum_effect_duplicate_glucose_input",
+                "momentum_effect_falling_glucose_duplicate_input",
+                "momentum_effect_falling_glucose_input",
+                "momentum_effect_incomplete_glucose_input",
+                "momentum_effect_mixed_provenance_glucose_input",
+                "momentum_effect_rising_glucose_double_entries_input",
+                "momentum_effect_rising_glucose_input",
+                "momentum_effect_stable_glucose_input"
+            ]:
+            glucose = self.load_input_fixture(resource_name)
+            estimator = MomentumEstimator(15, 5)
+
+            # a cycle after each sample, and a few after the last one
+            nows = glucose[0] + [
+                glucose[0][-1] + timedelta(minutes=minutes)
+                for minutes in range(5, 25, 5)
+            ]
+            for (i, now) in enumerate(nows):
+                if i < len(glucose[0]):
+                    estimator.add_glucose(*[[list_[i]] for list_ in glucose])
+
+                window = [
+                    j for j in range(0, len(glucose[0]))
+                    if now - timedelta(minutes=15) <= glucose[0][j] <= now
+                ]
+                (expected_dates,
+                 expected_values
+                 ) = linear_momentum_effect(
+                     *[[list_[j] for j in window] for list_ in glucose],
+                     15,
+                     5
+                     )
+
+                (dates,
+                 values
+                 ) = estimator.momentum_effect(now)
+
+                self.assertEqual(expected_dates, dates, resource_name)
+                for (expected, value) in zip(expected_values, values):
+                    self.assertAlmostEqual(expected, value, 9)
+
     """ Tests for counteraction_effects """
     def test_counteraction_effects_for_falling_glucose(self):
         (i_dates,
@@ -555,5 +603,87 @@ class TestGlucoseKitFunctions(unittest.TestCase):
         )
 
 
+    """ Tests for CounteractionTracker """
+    def test_counteraction_tracker(self):
+        (effect_dates,
+         effect_glucoses
+         ) = self.load_output_fixture(
+             "counteraction_effect_falling_glucose_insulin"
+             )
+
+        for resource_name in [
+                "counteraction_effect_falling_glucose_input",
+                "counteraction_effect_falling_glucose_double_entries_input",
+                "counteraction_effect_falling_glucose_almost_duplicates_input"
+            ]:
+            glucose = self.load_input_fixture(resource_name)
+            expected = counteraction_effects(
+                *glucose, effect_dates, effect_glucoses
+            )
+
+            # the effects arrive up to 15 minutes ahead of the samples
+            tracker = CounteractionTracker()
+            added = ([], [], [])
+            effect_index = 0
+            for i in range(0, len(glucose[0])):
+                while (effect_index < len(effect_dates)
+                       and effect_dates[effect_index]
+                       <= glucose[0][i] + timedelta(minutes=15)):
+                    for (list_, new) in zip(added, tracker.add_effects(
+                            effect_dates[effect_index:effect_index + 1],
+                            effect_glucoses[effect_index:effect_index + 1]
+                        )):
+                        list_.extend(new)
+                    effect_index += 1
+
+                for (list_, new) in zip(added, tracker.add_glucose(
+                        *[[list_[i]] for list_ in glucose]
+                    )):
+                    list_.extend(new)
+
+            self.assertEqual(expected, tracker.counteraction_effects())
+            self.assertEqual(expected, added)
+
+    def test_counteraction_tracker_waits_for_effects(self):
+        (dates,
+         glucoses,
+         displays,
+         provenances
+         ) = self.load_input_fixture(
+             "counteraction_effect_falling_glucose_input"
+             )
+        (effect_dates,
+         effect_glucoses
+         ) = self.load_output_fixture(
+             "counteraction_effect_falling_glucose_insulin"
+             )
+
+        tracker = CounteractionTracker()
+        self.assertEqual(
+            ([], [], []),
+            tracker.add_glucose(dates, glucoses, displays, provenances)
+        )
+
+        (start_dates,
+         end_dates,
+         velocities
+         ) = tracker.add_effects(effect_dates, effect_glucoses)
+        self.assertEqual(
+            counteraction_effects(
+                dates, glucoses, displays, provenances,
+                effect_dates, effect_glucoses
+            ),
+            (start_dates, end_dates, velocities)
+        )
+
+        self.assertEqual(
+            (start_dates[2:], end_dates[2:], velocities[2:]),
+            tracker.counteraction_effects(start_dates[2])
+        )
+
+        with self.assertRaises(AssertionError):
+            tracker.add_glucose([dates[0]], [glucoses[0]])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -13,14 +13,23 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 # has no effect, unused variable (for tuple unpacking), enumerate instead
 # of range
 import unittest
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import numpy
 
+from pyloopkit import vectorized_insulin_math
+from pyloopkit.compiled_schedule import (
+    CompiledSchedule, clear_compiled_schedules, get_compiled_schedule)
 from pyloopkit.dose import DoseType
-from pyloopkit.exponential_insulin_model import percent_effect_remaining
+from pyloopkit.exponential_insulin_model import (
+    percent_effect_remaining, vectorized_percent_effect_remaining)
+from pyloopkit.insulin_curve_table import (
+    InsulinCurveTable, clear_insulin_curve_tables, get_insulin_curve_table)
 from pyloopkit.insulin_math import (dose_entries, is_continuous, insulin_on_board,
                           glucose_effects, annotated, reconciled,
+                          find_ratio_at_time,
                           total_delivery, trim, overlay_basal_schedule)
+from pyloopkit.walsh_insulin_model import (
+    walsh_percent_effect_remaining, vectorized_walsh_percent_effect_remaining)
 from .loop_kit_tests import load_fixture
 
 
@@ -1287,6 +1296,382 @@ class TestInsulinKitFunctions(unittest.TestCase):
             0, len(effect_dates)
         )
 
+    """ Tests for vectorized_insulin_math.glucose_effects """
+    def assert_vectorized_glucose_effects_match(self, resource_name, model):
+        doses = self.load_dose_fixture(resource_name)
+        schedule = (
+            self.MULTIPLE_INSULIN_SENSITIVITY_START_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_END_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_VALUES
+        )
+
+        (expected_dates,
+         expected_values
+         ) = glucose_effects(*doses, model, *schedule)
+        (effect_dates,
+         effect_values
+         ) = vectorized_insulin_math.glucose_effects(*doses, model, *schedule)
+
+        self.assertEqual(expected_dates, effect_dates)
+        for i in range(0, len(expected_dates)):
+            self.assertAlmostEqual(
+                expected_values[i], effect_values[i], 9
+            )
+
+    def test_vectorized_glucose_effect_from_bolus(self):
+        self.assert_vectorized_glucose_effects_match(
+            "bolus_dose", self.WALSH_MODEL
+        )
+        self.assert_vectorized_glucose_effects_match(
+            "bolus_dose", self.MODEL
+        )
+
+    def test_vectorized_glucose_effect_from_temp_basal(self):
+        self.assert_vectorized_glucose_effects_match(
+            "basal_dose", self.WALSH_MODEL
+        )
+        self.assert_vectorized_glucose_effects_match(
+            "short_basal_dose", self.MODEL
+        )
+
+    def test_vectorized_glucose_effect_from_history(self):
+        self.assert_vectorized_glucose_effects_match(
+            "normalized_doses", self.WALSH_MODEL
+        )
+        self.assert_vectorized_glucose_effects_match(
+            "normalized_doses", self.MODEL
+        )
+
+    def test_vectorized_glucose_effect_from_no_doses(self):
+        (effect_dates,
+         effect_values
+         ) = vectorized_insulin_math.glucose_effects(
+             [], [], [], [], [], [],
+             self.MODEL,
+             self.INSULIN_SENSITIVITY_START_DATES,
+             self.INSULIN_SENSITIVITY_END_DATES,
+             self.INSULIN_SENSITIVITY_VALUES
+             )
+
+        self.assertEqual(0, len(effect_dates))
+        self.assertEqual(0, len(effect_values))
+
+    """ Tests for vectorized_insulin_math.insulin_on_board and iob_at """
+    def test_vectorized_iob_from_doses(self):
+        for resource_name in ["normalized_doses", "basal_dose",
+                              "short_basal_dose",
+                              "suspend_dose_reconciled_normalized"]:
+            doses = self.load_dose_fixture(resource_name)
+            for model in [self.MODEL, self.WALSH_MODEL]:
+                for curve_table in [None, get_insulin_curve_table(model)]:
+                    (expected_dates,
+                     expected_values
+                     ) = insulin_on_board(
+                         *doses, model, curve_table=curve_table
+                         )
+                    (dates,
+                     insulin_values
+                     ) = vectorized_insulin_math.insulin_on_board(
+                         *doses, model, curve_table=curve_table
+                         )
+
+                    self.assertEqual(expected_dates, dates)
+                    for i in range(0, len(expected_dates)):
+                        self.assertAlmostEqual(
+                            expected_values[i], insulin_values[i], 9
+                        )
+
+    def test_vectorized_iob_from_no_doses(self):
+        self.assertEqual(
+            ([], []),
+            vectorized_insulin_math.insulin_on_board(
+                [], [], [], [], [], [], self.MODEL
+            )
+        )
+        self.assertEqual(
+            [0, 0],
+            vectorized_insulin_math.iob_at(
+                [], [], [], [], [], [], self.MODEL,
+                [datetime.fromisoformat("2015-10-15T21:30:12"),
+                 datetime.fromisoformat("2015-10-15T21:35:12")]
+            )
+        )
+
+    def test_iob_at(self):
+        doses = self.load_dose_fixture("normalized_doses")
+
+        for model in [self.MODEL, self.WALSH_MODEL]:
+            (expected_dates,
+             expected_values
+             ) = insulin_on_board(*doses, model)
+            # before the first dose, and a few points within the timeline
+            indexes = [0, 7, 50, len(expected_dates) - 1]
+            times = [expected_dates[0] - timedelta(minutes=30)] + [
+                expected_dates[i] for i in indexes
+            ]
+
+            insulin_values = vectorized_insulin_math.iob_at(
+                *doses, model, times
+            )
+
+            self.assertEqual(len(times), len(insulin_values))
+            self.assertEqual(0, insulin_values[0])
+            for (i, index) in enumerate(indexes):
+                self.assertAlmostEqual(
+                    expected_values[index], insulin_values[i + 1], 9
+                )
+
+    def test_vectorized_percent_effect_remaining(self):
+        minutes = numpy.arange(-10, 500, 0.5)
+
+        exponential = vectorized_percent_effect_remaining(minutes, 360, 75)
+        walsh = vectorized_walsh_percent_effect_remaining(minutes, 4)
+
+        for i in range(0, len(minutes)):
+            self.assertAlmostEqual(
+                percent_effect_remaining(minutes[i], 360, 75),
+                exponential[i], 12
+            )
+            self.assertAlmostEqual(
+                walsh_percent_effect_remaining(minutes[i], 4),
+                walsh[i], 12
+            )
+
+    """ Tests for insulin_curve_table """
+    def test_insulin_curve_table_matches_model(self):
+        for model in [self.MODEL, self.WALSH_MODEL]:
+            table = InsulinCurveTable(model)
+            duration = model[0] * 60 if len(model) == 1 else model[0]
+
+            def expected(seconds):
+                minutes = (seconds - 10 * 60) / 60
+                if len(model) == 1:
+                    return walsh_percent_effect_remaining(minutes, model[0])
+                return percent_effect_remaining(minutes, *model)
+
+            for seconds in range(-60, int(duration + 20) * 60, 7):
+                self.assertAlmostEqual(
+                    expected(seconds), table.percent_effect_remaining(seconds),
+                    12
+                )
+                # between samples, the table interpolates
+                self.assertAlmostEqual(
+                    expected(seconds + 0.5),
+                    table.percent_effect_remaining(seconds + 0.5),
+                    7
+                )
+
+            self.assertTrue(numpy.allclose(
+                table.percent_effect_remaining(numpy.arange(-60, 30000, 7.5)),
+                [table.percent_effect_remaining(seconds)
+                 for seconds in numpy.arange(-60, 30000, 7.5).tolist()]
+            ))
+
+    def test_insulin_curve_table_continuous_delivery(self):
+        for model in [self.MODEL, self.WALSH_MODEL]:
+            table = get_insulin_curve_table(model)
+            delay = table.delay * 60
+            delta = table.delta * 60
+
+            for dose_duration in [400, 1800, 1830.5, 7200]:
+                seconds = numpy.arange(-900, 30000, 61.25)
+                (delivered,
+                 activity
+                 ) = table.continuous_delivery_effect(seconds, dose_duration)
+
+                for i in range(0, len(seconds)):
+                    # the segmented sum from insulin_math
+                    (expected_delivered, expected_activity) = (0, 0)
+                    dose_date = 0
+                    while dose_date <= min(
+                            (seconds[i] + delay) // delta * delta,
+                            dose_duration):
+                        segment = max(
+                            0,
+                            min(dose_date + delta, dose_duration) - dose_date
+                        ) / dose_duration
+                        expected_delivered += segment
+                        expected_activity += segment * (
+                            1 - table.percent_effect_remaining(
+                                float(seconds[i] - dose_date)
+                            )
+                        )
+                        dose_date += delta
+
+                    self.assertAlmostEqual(
+                        expected_delivered, delivered[i], 12
+                    )
+                    self.assertAlmostEqual(
+                        expected_activity, activity[i], 12
+                    )
+                    (scalar_delivered,
+                     scalar_activity
+                     ) = table.continuous_delivery_effect(
+                         float(seconds[i]), dose_duration
+                         )
+                    self.assertAlmostEqual(
+                        expected_delivered, scalar_delivered, 12
+                    )
+                    self.assertAlmostEqual(
+                        expected_activity, scalar_activity, 12
+                    )
+
+    def test_insulin_curve_table_cache(self):
+        table = get_insulin_curve_table(self.MODEL)
+
+        self.assertIs(table, get_insulin_curve_table(list(self.MODEL)))
+        self.assertIsNot(table, get_insulin_curve_table(self.MODEL, 15))
+        self.assertIsNot(table, get_insulin_curve_table(self.WALSH_MODEL))
+
+        clear_insulin_curve_tables()
+        self.assertIsNot(table, get_insulin_curve_table(self.MODEL))
+
+    def test_glucose_effect_with_curve_table(self):
+        schedule = (
+            self.MULTIPLE_INSULIN_SENSITIVITY_START_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_END_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_VALUES
+        )
+
+        for (model, name) in [(self.MODEL, "normalized_doses"),
+                              (self.MODEL, "basal_dose"),
+                              (self.WALSH_MODEL, "normalized_doses"),
+                              (self.WALSH_MODEL, "basal_dose")]:
+            doses = self.load_dose_fixture(name)
+            table = get_insulin_curve_table(model)
+
+            (expected_dates,
+             expected_values
+             ) = glucose_effects(*doses, model, *schedule)
+
+            for engine in [glucose_effects,
+                           vectorized_insulin_math.glucose_effects]:
+                (effect_dates,
+                 effect_values
+                 ) = engine(*doses, model, *schedule, curve_table=table)
+
+                self.assertEqual(expected_dates, effect_dates)
+                for i in range(0, len(expected_dates)):
+                    self.assertAlmostEqual(
+                        expected_values[i], effect_values[i], 9
+                    )
+
+            with self.assertRaises(AssertionError):
+                glucose_effects(
+                    *doses, model, *schedule,
+                    delay=15,
+                    curve_table=table
+                )
+
+    def test_iob_with_curve_table(self):
+        doses = self.load_dose_fixture("normalized_doses")
+
+        for model in [self.MODEL, self.WALSH_MODEL]:
+            (expected_dates,
+             expected_values
+             ) = insulin_on_board(*doses, model)
+            (dates,
+             insulin_values
+             ) = insulin_on_board(
+                 *doses, model,
+                 curve_table=get_insulin_curve_table(model)
+                 )
+
+            self.assertEqual(expected_dates, dates)
+            for i in range(0, len(expected_dates)):
+                self.assertAlmostEqual(
+                    expected_values[i], insulin_values[i], 9
+                )
+
+    """ Tests for CompiledSchedule """
+    def test_compiled_schedule(self):
+        schedules = [
+            (self.MULTIPLE_INSULIN_SENSITIVITY_START_DATES,
+             self.MULTIPLE_INSULIN_SENSITIVITY_END_DATES,
+             self.MULTIPLE_INSULIN_SENSITIVITY_VALUES),
+            # implicit end times, with the last entry wrapping past midnight
+            ([time(0, 0), time(6, 30), time(22, 0)], [], [1, 2, 3]),
+            ([time(3, 0), time(12, 0)], [], [1, 2]),
+            # explicit end times that cross midnight and overlap
+            ([time(21, 0), time(8, 0), time(7, 0)],
+             [time(7, 30), time(20, 0), time(23, 0)],
+             [1, 2, 3]),
+            # a gap in the schedule
+            ([time(1, 0)], [time(2, 0)], [5]),
+            ([], [], [])
+        ]
+
+        for (starts, ends, values) in schedules:
+            schedule = CompiledSchedule(starts, ends, values)
+
+            dates = [
+                datetime(2019, 7, 1) + timedelta(minutes=minutes)
+                for minutes in range(0, 24 * 60, 7)
+            ]
+            for boundary in starts + ends:
+                date = datetime.combine(datetime(2019, 7, 1), boundary)
+                dates += [
+                    date - timedelta(microseconds=1),
+                    date,
+                    date + timedelta(microseconds=1)
+                ]
+
+            expected = [
+                find_ratio_at_time(starts, ends, values, date)
+                for date in dates
+            ]
+            self.assertEqual(
+                expected,
+                [schedule.value_at(date) for date in dates]
+            )
+            self.assertEqual(expected, schedule.values_at(dates).tolist())
+
+    def test_compiled_schedule_cache(self):
+        schedule = (
+            self.MULTIPLE_INSULIN_SENSITIVITY_START_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_END_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_VALUES
+        )
+        compiled_schedule = get_compiled_schedule(*schedule)
+
+        self.assertIs(
+            compiled_schedule,
+            get_compiled_schedule(*[tuple(entries) for entries in schedule])
+        )
+        self.assertIsNot(
+            compiled_schedule, get_compiled_schedule(schedule[0], [], schedule[2])
+        )
+
+        clear_compiled_schedules()
+        self.assertIsNot(compiled_schedule, get_compiled_schedule(*schedule))
+
+    def test_glucose_effect_with_compiled_schedule(self):
+        doses = self.load_dose_fixture("normalized_doses")
+        schedule = (
+            self.MULTIPLE_INSULIN_SENSITIVITY_START_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_END_DATES,
+            self.MULTIPLE_INSULIN_SENSITIVITY_VALUES
+        )
+        compiled_schedule = CompiledSchedule(*schedule)
+
+        expected = glucose_effects(*doses, self.MODEL, *schedule)
+        self.assertEqual(
+            expected,
+            glucose_effects(
+                *doses, self.MODEL, *schedule,
+                sensitivity_schedule=compiled_schedule
+            )
+        )
+        self.assertEqual(
+            vectorized_insulin_math.glucose_effects(
+                *doses, self.MODEL, *schedule
+            ),
+            vectorized_insulin_math.glucose_effects(
+                *doses, self.MODEL, *schedule,
+                sensitivity_schedule=compiled_schedule
+            )
+        )
+
     """ Tests for total_delivery """
     def test_total_delivery(self):
         (i_types,
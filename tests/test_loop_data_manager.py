@@ -17,6 +17,8 @@ from pyloopkit.loop_data_manager import (
     update_retrospective_glucose_effect,
     update,
 )
+from pyloopkit.loop_session import (LoopSession, GLUCOSE_KEYS, DOSE_KEYS,
+                                    CARB_KEYS)
 from .loop_kit_tests import load_fixture, find_root_path
 from pyloopkit.pyloop_parser import (
     load_momentum_effects,
@@ -36,7 +38,6 @@ from pyloopkit.pyloop_parser import (
 
 class TestLoopDataManagerFunctions(unittest.TestCase):
     """ unittest class to run integrated tests of LoopDataManager uses."""
-
     def load_report_glucose_values(self, report_name):
         """ Load the cached glucose values from an issue report """
         report = load_fixture(report_name, ".json")
@@ -263,6 +264,103 @@ class TestLoopDataManagerFunctions(unittest.TestCase):
             )
         self.assertIsNone(recommendation.get("recommended_temp_basal"))
 
+    """ Tests for LoopSession """
+    def test_loop_session_matches_update(self):
+        full_input = self.run_report_through_runner(
+            "basal_and_bolus_report"
+        )["input_data"]
+
+        def input_between(start, end):
+            """ The data in full_input from after start until end """
+            input_dict = dict(full_input)
+            for (date_key, keys) in [
+                    ("glucose_dates", ["glucose_dates", "glucose_values"]),
+                    ("dose_start_times",
+                     ["dose_types", "dose_start_times", "dose_end_times",
+                      "dose_values", "dose_delivered_units"]),
+                    ("carb_dates",
+                     ["carb_dates", "carb_values", "carb_absorption_times"])
+            ]:
+                indexes = [
+                    i for i in range(0, len(full_input[date_key]))
+                    if (start is None or full_input[date_key][i] > start)
+                    and full_input[date_key][i] <= end
+                ]
+                for key in keys:
+                    input_dict[key] = [full_input[key][i] for i in indexes]
+            input_dict["time_to_calculate_at"] = end
+            return input_dict
+
+        # the cycles cover a carb entry and two boluses
+        now = full_input["time_to_calculate_at"] - timedelta(minutes=70)
+        session = LoopSession(input_between(None, now))
+        session.update(now)
+
+        for cycle in range(0, 6):
+            previous_input = session.recommendations["input_data"]
+            previous_lengths = {
+                key: len(value) for (key, value) in previous_input.items()
+                if isinstance(value, list)
+            }
+            new_data = input_between(now, now + timedelta(minutes=5))
+            session.add_glucose(
+                new_data["glucose_dates"], new_data["glucose_values"]
+            )
+            session.add_doses(
+                new_data["dose_types"],
+                new_data["dose_start_times"],
+                new_data["dose_end_times"],
+                new_data["dose_values"],
+                new_data["dose_delivered_units"]
+            )
+            session.add_carbs(
+                new_data["carb_dates"],
+                new_data["carb_values"],
+                new_data["carb_absorption_times"]
+            )
+            now += timedelta(minutes=5)
+
+            # no earlier doses were added, so the counteraction effects are
+            # extended from the previous cycle's
+            self.assertIsNotNone(session.counteraction_effects(now))
+
+            result = session.next_update()
+            expected = update(input_between(None, now))
+
+            for key in expected:
+                if key != "input_data":
+                    self.assertEqual(expected[key], result[key])
+
+            # the previous cycle's input isn't changed by the new data, and
+            # the lists that no data was added to aren't copied
+            for key in GLUCOSE_KEYS + DOSE_KEYS + CARB_KEYS:
+                self.assertEqual(
+                    previous_lengths[key], len(previous_input[key])
+                )
+                if len(result["input_data"][key]) == previous_lengths[key]:
+                    self.assertIs(previous_input[key], result["input_data"][key])
+
+        # a dose that started before the previous cycle changes the insulin
+        # effects back in time, so the counteraction effects are
+        # recalculated
+        session.add_doses(
+            [DoseType.bolus], [now - timedelta(minutes=30)],
+            [now - timedelta(minutes=30)], [1.5]
+        )
+        now += timedelta(minutes=5)
+        self.assertIsNone(session.counteraction_effects(now))
+
+        result = session.next_update()
+        expected_input = dict(result["input_data"])
+        del expected_input["momentum_effect_dates"]
+        del expected_input["momentum_effect_values"]
+        self.assertNotIn("counteraction_starts", expected_input)
+
+        expected = update(expected_input)
+        for key in expected:
+            if key != "input_data":
+                self.assertEqual(expected[key], result[key])
+
     """ Tests for get_pending_insulin """
 
     def test_negative_pending_insulin(self):
@@ -10,12 +10,15 @@ Github URL: https://github.com/tidepool-org/LoopKit/blob/
 """
 # pylint: disable=C0111, C0200, R0201, W0105
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 #from . import path_grabber  # pylint: disable=unused-import
 from .loop_kit_tests import load_fixture
 from pyloopkit.loop_math import predict_glucose, decay_effect, subtracting, combined_sums
-from pyloopkit.date import time_interval_since
+from pyloopkit.loop_math import summed_effects
+from pyloopkit.loop_math import (simulation_date_range_for_samples,
+                                 simulation_timeline_for_samples)
+from pyloopkit.date import time_interval_since, seconds_since_reference_date
 
 
 class TestLoopMathFunctions(unittest.TestCase):
@@ -588,5 +591,112 @@ class TestLoopMathFunctions(unittest.TestCase):
             )
 
 
+    def test_combined_sums_with_ends(self):
+        (input_starts,
+         input_values
+         ) = self.load_glucose_effect_fixture_normal_time(
+            "ice_minus_carb_effect_with_gaps_output"
+        )
+
+        self.assertEqual(
+            combined_sums(input_starts, [], input_values, 30),
+            combined_sums(input_starts, input_starts, input_values, 30)
+        )
+
+        # an effect that ends within the duration still can't be included
+        # if it starts too early
+        input_ends = [start + timedelta(minutes=5) for start in input_starts]
+        (starts,
+         ends,
+         values
+         ) = combined_sums(input_starts, input_ends, input_values, 30)
+
+        self.assertEqual(input_ends, ends)
+        for i in range(0, len(starts)):
+            self.assertLessEqual(ends[i] - starts[i], timedelta(minutes=30))
+
+        # dates that aren't on a whole second are summed the same way
+        offset = timedelta(milliseconds=500)
+        (offset_starts,
+         offset_ends,
+         offset_values
+         ) = combined_sums(
+             [start + offset for start in input_starts],
+             [end + offset for end in input_ends],
+             input_values, 30
+             )
+
+        self.assertEqual([start + offset for start in starts], offset_starts)
+        self.assertEqual([end + offset for end in ends], offset_ends)
+        self.assertEqual(values, offset_values)
+
+
+    def test_summed_effects(self):
+        start = datetime(2015, 10, 25, 12, 0)
+        dates = [start + timedelta(minutes=5 * i) for i in range(0, 5)]
+        other_dates = [start + timedelta(minutes=10 + 5 * i)
+                       for i in range(0, 5)]
+
+        (summed_dates,
+         summed_values
+         ) = summed_effects(
+             dates, [0, 1, 2, 3, 4],
+             other_dates, [10, 20, 30, 40, 50]
+             )
+
+        self.assertEqual(
+            [start + timedelta(minutes=5 * i) for i in range(0, 7)],
+            summed_dates
+        )
+        # each timeline keeps its first value before it starts and its last
+        # value after it ends
+        self.assertEqual([10, 11, 12, 23, 34, 44, 54], summed_values)
+
+        self.assertEqual(
+            (dates, [0, 1, 2, 3, 4]),
+            summed_effects(dates, [0, 1, 2, 3, 4], [], [])
+        )
+
+    def test_simulation_timeline_for_samples(self):
+        for tzinfo in [None, timezone(timedelta(hours=-7))]:
+            start = datetime(2019, 7, 1, 8, 2, 30, tzinfo=tzinfo)
+            starts = [start, start + timedelta(minutes=42)]
+            ends = [start + timedelta(minutes=30), starts[1]]
+
+            for (arguments, keywords) in [
+                    ((starts, ends, 360, 5), {"delay": 10}),
+                    ((starts, [], 360, 5), {}),
+                    ((starts, ends, 360, 5),
+                     {"start": start, "end": start + timedelta(hours=2)}),
+                    ((starts, ends, 360, 5), {"start": start}),
+                    # dates that aren't on a whole second
+                    ((starts, ends, 360, 5),
+                     {"end": start + timedelta(hours=2, microseconds=5)}),
+                    ((starts, ends, 360.5, 2.25), {})
+                ]:
+                (range_start,
+                 range_end
+                 ) = simulation_date_range_for_samples(*arguments, **keywords)
+                expected = []
+                date = range_start
+                while date <= range_end:
+                    expected.append(date)
+                    date += timedelta(minutes=arguments[3])
+
+                (dates,
+                 seconds
+                 ) = simulation_timeline_for_samples(*arguments, **keywords)
+
+                self.assertEqual(expected, dates)
+                self.assertEqual(
+                    [date.tzinfo for date in expected],
+                    [date.tzinfo for date in dates]
+                )
+                self.assertEqual(
+                    seconds_since_reference_date(expected).tolist(),
+                    seconds.tolist()
+                )
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,8 +10,15 @@ import unittest
 from datetime import datetime, timedelta
 
 #from . import path_grabber  # pylint: disable=unused-import
+import numpy
+
 from pyloopkit.date import (date_floored_to_time_interval, date_ceiled_to_time_interval,
-                  time_interval_since_reference_date, time_interval_since)
+                  time_interval_since_reference_date, time_interval_since,
+                  seconds_since_reference_date,
+                  dates_from_seconds_since_reference_date,
+                  seconds_floored_to_time_interval,
+                  seconds_ceiled_to_time_interval, seconds_offset,
+                  seconds_timeline)
 
 REF_DATE = datetime(2001, 1, 1, 0, 0, 0)
 
@@ -95,6 +102,55 @@ class TestDateFunctions(unittest.TestCase):
                          time_interval_since(date, date +
                                              timedelta(seconds=86400)))
 
+    """ Tests for the integer-seconds helpers """
+    def test_seconds_match_dates(self):
+        calendar = datetime.now().replace(microsecond=0)
+        dates = [
+            calendar.replace(hour=hour, minute=minute, second=second)
+            for (hour, minute, second) in [
+                (5, 0, 0), (5, 0, 1), (5, 47, 58), (5, 59, 0), (23, 59, 0)
+            ]
+        ]
+        seconds = seconds_since_reference_date(dates)
+
+        self.assertEqual(
+            dates, dates_from_seconds_since_reference_date(seconds)
+        )
+        for interval in [0, 5, 60]:
+            self.assertEqual(
+                [date_floored_to_time_interval(date, interval)
+                 for date in dates],
+                dates_from_seconds_since_reference_date(
+                    seconds_floored_to_time_interval(seconds, interval)
+                )
+            )
+            self.assertEqual(
+                [date_ceiled_to_time_interval(date, interval)
+                 for date in dates],
+                dates_from_seconds_since_reference_date(
+                    seconds_ceiled_to_time_interval(seconds, interval)
+                )
+            )
+            # scalars work too
+            self.assertEqual(
+                seconds_floored_to_time_interval(seconds, interval)[1],
+                seconds_floored_to_time_interval(int(seconds[1]), interval)
+            )
+
+    def test_seconds_offset_and_timeline(self):
+        seconds = numpy.array([0, 300, 371], dtype=numpy.int64)
+
+        self.assertEqual(
+            [600, 900, 971], seconds_offset(seconds, 10).tolist()
+        )
+        self.assertEqual(
+            [-90, 210, 281], seconds_offset(seconds, -1.5).tolist()
+        )
+        self.assertEqual(
+            [0, 300, 600, 900], seconds_timeline(0, 900, 5).tolist()
+        )
+        self.assertEqual([0, 300, 600], seconds_timeline(0, 899, 5).tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 21:38:27 2026
+"""
+# pylint: disable=C0111, R0201
+from datetime import timedelta
+import unittest
+
+from pyloopkit.dose import DoseType
+from pyloopkit.loop_data_manager import update
+from pyloopkit.replay_engine import ReplayEngine
+from .loop_kit_tests import load_report_input
+
+
+class TestReplayEngine(unittest.TestCase):
+    """ unittest class to run tests of the replay engine """
+    def test_window_input(self):
+        history = load_report_input("basal_and_bolus_report")
+        engine = ReplayEngine(history, window_hours=6)
+        now = history.get("time_to_calculate_at") - timedelta(hours=1)
+
+        window = engine.window_input(now)
+
+        self.assertEqual(now, window.get("time_to_calculate_at"))
+        self.assertEqual(
+            [date for date in sorted(history.get("glucose_dates"))
+             if now - timedelta(hours=6) <= date <= now],
+            window.get("glucose_dates")
+        )
+        # doses go back another duration of insulin action (6 hours)
+        self.assertEqual(
+            [date for date in sorted(history.get("dose_start_times"))
+             if now - timedelta(hours=12) <= date <= now],
+            window.get("dose_start_times")
+        )
+
+        temp_basal_starts = [
+            start for (type_, start) in zip(
+                history.get("dose_types"), history.get("dose_start_times")
+            )
+            if type_ in [DoseType.tempbasal, DoseType.basal] and start <= now
+        ]
+        self.assertEqual(
+            max(temp_basal_starts), window.get("last_temporary_basal")[1]
+        )
+
+    def test_replay_matches_update(self):
+        history = load_report_input("basal_and_bolus_report")
+        engine = ReplayEngine(history, window_hours=6)
+        end_time = history.get("time_to_calculate_at")
+        start_time = end_time - timedelta(minutes=25)
+
+        outputs = list(engine.replay(start_time, end_time))
+
+        self.assertEqual(6, len(outputs))
+        for (i, output) in enumerate(outputs):
+            expected = update(
+                engine.window_input(start_time + timedelta(minutes=5 * i))
+            )
+            for key in expected:
+                if key == "input_data":
+                    continue
+                self.assertEqual(expected[key], output[key], key)
+
+
+    def test_replay_with_incremental_momentum(self):
+        history = load_report_input("basal_and_bolus_report")
+        end_time = history.get("time_to_calculate_at")
+        start_time = end_time - timedelta(minutes=25)
+
+        expected_outputs = ReplayEngine(history, window_hours=6).replay(
+            start_time, end_time
+        )
+        outputs = ReplayEngine(
+            history, window_hours=6, incremental_momentum=True
+        ).replay(start_time, end_time)
+
+        for (expected, output) in zip(expected_outputs, outputs):
+            for key in expected:
+                if key == "input_data":
+                    continue
+                self.assertEqual(expected[key], output[key], key)
+
+
+if __name__ == '__main__':
+    unittest.main()
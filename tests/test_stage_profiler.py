@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 22:31:42 2026
+"""
+# pylint: disable=C0111, R0201
+import unittest
+
+from pyloopkit.loop_data_manager import update
+from pyloopkit.stage_profiler import StageProfiler
+from .loop_kit_tests import load_report_input
+
+
+class TestStageProfiler(unittest.TestCase):
+    """ unittest class to run tests of the stage profiler """
+    def test_profiled_update(self):
+        input_dict = load_report_input("basal_and_bolus_report")
+        reports = []
+        profiler = StageProfiler(sink=reports.append, profile_functions=True)
+
+        output = update(input_dict, profiler=profiler)
+        expected = update(input_dict)
+
+        report = output.pop("profile")
+        self.assertEqual([report], reports)
+        for key in expected:
+            if key == "input_data":
+                continue
+            self.assertEqual(expected[key], output[key], key)
+
+        stages = report.get("stages")
+        for name in ["validation", "momentum", "counteraction",
+                     "carb_effects", "carbs_on_board", "temp_basal",
+                     "bolus"]:
+            self.assertEqual(1, stages[name]["calls"], name)
+        # the report doesn't use retrospective correction
+        self.assertNotIn("retrospective_correction", stages)
+        # with and without the temp basal
+        self.assertEqual(2, stages["insulin_effects"]["calls"])
+        self.assertEqual(2, stages["prediction"]["calls"])
+        self.assertLessEqual(
+            sum(stage["seconds"] for stage in stages.values()),
+            report.get("seconds")
+        )
+
+        functions = report.get("functions")
+        self.assertGreaterEqual(
+            functions["loop_math.predict_glucose"]["calls"], 2
+        )
+        self.assertIn("glucose_math.counteraction_effects", functions)
+
+    def test_profiles_each_cycle(self):
+        input_dict = load_report_input("basal_and_bolus_report")
+        profiler = StageProfiler()
+
+        first = update(input_dict, profiler=profiler).get("profile")
+        second = update(input_dict, profiler=profiler).get("profile")
+
+        self.assertNotIn("functions", first)
+        self.assertEqual(first.get("stages").keys(),
+                         second.get("stages").keys())
+        self.assertEqual(2, second["stages"]["prediction"]["calls"])
+
+    def test_invalid_input(self):
+        reports = []
+        input_dict = load_report_input("basal_and_bolus_report")
+        input_dict["settings_dictionary"]["default_absorption_times"] = [0]
+
+        with self.assertWarns(UserWarning):
+            self.assertEqual(
+                [], update(input_dict, profiler=StageProfiler(reports.append))
+            )
+        self.assertEqual(["validation"], list(reports[0].get("stages")))
+
+
+if __name__ == '__main__':
+    unittest.main()